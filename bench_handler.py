@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Load test: drive handler() against the fake ComfyUI server and measure the worker's own overhead.
+
+Reports throughput, p50/p95/p99 latency, peak RSS and time per handler stage, and
+writes them to a JSON file. Pass --compare with an earlier result to flag regressions.
+
+  python bench_handler.py --jobs 50 --concurrency 3 --out bench.json
+  python bench_handler.py --jobs 50 --concurrency 3 --compare bench.json
+"""
+
+import io
+import sys
+import math
+import json
+import time
+import uuid
+import base64
+import logging
+import argparse
+import resource
+import platform
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from comfy_client import ComfyClient
+from fake_comfyui import FakeComfyUI
+
+# Metrics compared against a baseline; True when a higher value is better
+COMPARED = {"throughput": True, "latency.p50": False, "latency.p95": False, "latency.p99": False}
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of ``values`` (0 < q <= 100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def sample_image(width, height):
+    """Base64 JPEG of the given size with enough detail that decoding is not trivially cheap"""
+    image = Image.effect_noise((width, height), 64).convert("RGB")
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=90)
+    return base64.b64encode(out.getvalue()).decode()
+
+
+def make_jobs(count, image_base64, workflow, output_mode, extra=None):
+    """Jobs with distinct seeds, so the result cache (if enabled) never short-circuits them"""
+    return [{"input": dict({"image_base64": image_base64, "workflow": workflow, "output_mode": output_mode,
+                            "seed": index, "steps": 4, "length": 17}, **(extra or {}))}
+            for index in range(count)]
+
+
+def summarize(latencies, results, seconds, concurrency):
+    stages = {}
+    for result in results:
+        for stage, value in result.get("timings", {}).items():
+            if stage != "total":
+                stages.setdefault(stage, []).append(value)
+    return {
+        "jobs": len(results),
+        "errors": sum("error" in r for r in results),
+        "concurrency": concurrency,
+        "seconds": round(seconds, 3),
+        "throughput": round(len(results) / seconds, 3) if seconds else None,
+        "latency": {
+            "mean": round(sum(latencies) / len(latencies), 4) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else None,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": {stage: {"mean": round(sum(v) / len(v), 4), "p95": percentile(v, 95)}
+                   for stage, v in sorted(stages.items())},
+    }
+
+
+def run_benchmark(jobs=20, concurrency=3, node_delay=0.0, execution_delay=0.05, output_size=1024 * 1024,
+                  image_size=(1280, 720), workflow="i2v", output_mode="base64", warmup=1):
+    """Run ``jobs`` handler calls at ``concurrency`` against a fresh fake server; returns the report"""
+    import handler
+
+    fake = FakeComfyUI(node_delay=node_delay, execution_delay=execution_delay, output_size=output_size).start()
+    client = ComfyClient("127.0.0.1", fake.port, str(uuid.uuid4()))
+    input_dir = tempfile.mkdtemp(prefix="bench_input_")
+    saved = {name: getattr(handler, name) for name in ("comfy", "COMFYUI_INPUT_DIR", "result_cache")}
+    handler.comfy, handler.COMFYUI_INPUT_DIR, handler.result_cache = client, input_dir, None
+    try:
+        image = sample_image(*image_size)
+        # Warm-up jobs pay for connection setup and first-time imports; they are not measured
+        for job in make_jobs(warmup, image, workflow, output_mode, {"seed": -1}):
+            handler.handler(job)
+
+        def timed(job):
+            start = time.perf_counter()
+            result = handler.handler(job)
+            return time.perf_counter() - start, result
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(timed, make_jobs(jobs, image, workflow, output_mode)))
+        seconds = time.perf_counter() - start
+    finally:
+        for name, value in saved.items():
+            setattr(handler, name, value)
+        client.close()
+        fake.stop()
+
+    latencies = [round(latency, 4) for latency, _ in outcomes]
+    report = summarize(latencies, [result for _, result in outcomes], seconds, concurrency)
+    report["config"] = {"node_delay": node_delay, "execution_delay": execution_delay, "output_size": output_size,
+                        "image_size": list(image_size), "workflow": workflow, "output_mode": output_mode}
+    return report
+
+
+def _lookup(report, path):
+    value = report
+    for part in path.split('.'):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def compare(report, baseline, threshold=0.1):
+    """Relative change per compared metric and stage mean; returns (rows, regressions)"""
+    metrics = dict(COMPARED)
+    metrics.update({f"stages.{stage}.mean": False for stage in report.get("stages", {})})
+    rows, regressions = [], []
+    for path, higher_is_better in metrics.items():
+        new, old = _lookup(report, path), _lookup(baseline, path)
+        if not new or not old:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        # Sub-millisecond stages are noise; only flag them when they grow by a visible amount
+        regressed = worse > threshold and (higher_is_better or new - old > 0.001)
+        rows.append((path, old, new, change, regressed))
+        if regressed:
+            regressions.append(path)
+    return rows, regressions
+
+
+def print_report(report):
+    latency = report["latency"]
+    print(f"=== {report['jobs']} jobs at concurrency {report['concurrency']} ({report['errors']} errors) ===")
+    print(f"throughput  {report['throughput']} jobs/s")
+    print(f"latency     p50 {latency['p50']}s  p95 {latency['p95']}s  p99 {latency['p99']}s  max {latency['max']}s")
+    print(f"peak RSS    {report['peak_rss_mb']} MB")
+    print(f"{'stage':<18}{'mean (ms)':>12}{'p95 (ms)':>12}")
+    for stage, values in report["stages"].items():
+        print(f"{stage:<18}{values['mean'] * 1000:>12.2f}{values['p95'] * 1000:>12.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark handler() against a simulated ComfyUI server")
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=3)
+    parser.add_argument("--node-delay", type=float, default=0.0, help="seconds per executed node")
+    parser.add_argument("--execution-delay", type=float, default=0.05, help="extra seconds per prompt")
+    parser.add_argument("--output-size", type=int, default=1024 * 1024, help="bytes per output video")
+    parser.add_argument("--image-size", default="1280x720", help="input image WIDTHxHEIGHT")
+    parser.add_argument("--workflow", default="i2v")
+    parser.add_argument("--output-mode", default="base64")
+    parser.add_argument("--out", help="write the report to this JSON file")
+    parser.add_argument("--compare", help="earlier report to compare against; exits 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    width, height = (int(v) for v in args.image_size.lower().split('x'))
+    report = run_benchmark(args.jobs, args.concurrency, args.node_delay, args.execution_delay, args.output_size,
+                           (width, height), args.workflow, args.output_mode)
+    print_report(report)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(report, baseline, args.threshold)
+        print(f"=== Compared with {args.compare} ===")
+        for path, old, new, change, regressed in rows:
+            print(f"{path:<28}{old:>10.4f}{new:>10.4f}{change:>+9.1%}{'  REGRESSION' if regressed else ''}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
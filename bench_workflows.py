@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-job workflow overhead of re-parsing from disk vs. the compiled template registry
+"""
+
+import os
+import sys
+import time
+
+from workflows import TEMPLATE_FILES, WORKFLOW_DIR, load_workflow, get_template, dumps
+
+PARAMS = {"text": "A beautiful scene with natural motion", "noise_seed": 42, "steps": 20, "cfg": 7.5}
+
+
+def patch_targets(graph):
+    """Pick the nodes a job would touch: text encoders, samplers and image loaders"""
+    targets = []
+    for node_id, node in graph.items():
+        for name in PARAMS:
+            if name in node['inputs'] and not isinstance(node['inputs'][name], (list, tuple)):
+                targets.append((node_id, name))
+    return targets
+
+
+def per_job_before(path, targets):
+    prompt = load_workflow(path)
+    for node_id, name in targets:
+        prompt[node_id]['inputs'][name] = PARAMS[name]
+    return dumps(prompt)
+
+
+def per_job_after(template, targets):
+    prompt = template.overlay()
+    for node_id, name in targets:
+        prompt.set_input(node_id, name, PARAMS[name])
+    return dumps(prompt.materialize())
+
+
+def timeit(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    print(f"=== Per-job workflow overhead ({iterations} iterations) ===")
+    print(f"{'workflow':<24}{'before (us)':>14}{'after (us)':>14}{'speedup':>10}")
+    for filename in TEMPLATE_FILES:
+        name = os.path.splitext(filename)[0]
+        template = get_template(name)
+        if template is None:
+            print(f"{name:<24}{'missing':>14}")
+            continue
+        path = os.path.join(WORKFLOW_DIR, filename)
+        targets = patch_targets(template.graph)
+        before = timeit(lambda: per_job_before(path, targets), iterations)
+        after = timeit(lambda: per_job_after(template, targets), iterations)
+        print(f"{name:<24}{before:>14.1f}{after:>14.1f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
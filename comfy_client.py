@@ -0,0 +1,395 @@
+import os
+import json
+import queue
+import random
+import time
+import logging
+import threading
+import collections
+import http.client
+import urllib.parse
+
+import websocket
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean a pooled keep-alive connection went stale and the request can be retried once
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                            http.client.BadStatusLine, ConnectionResetError, BrokenPipeError)
+# Prompt ids whose late events are dropped after unsubscribe, and how long events for a prompt
+# nobody subscribes to are kept before their buffer is discarded
+FINISHED_PROMPTS_KEPT = 4096
+UNCLAIMED_EVENTS_TTL = 300.0
+
+
+class ComfyAPIError(Exception):
+    """Non-2xx response from the ComfyUI HTTP API"""
+
+    def __init__(self, status, body):
+        super().__init__(f"ComfyUI API Error {status}: {body}")
+        self.status = status
+        self.body = body
+
+
+def backoff_delays(base=0.1, cap=5.0):
+    """Yield exponentially growing delays with full jitter"""
+    attempt = 0
+    while True:
+        yield random.uniform(0, min(cap, base * (2 ** attempt)))
+        attempt += 1
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # A zombie child still answers kill(0); reap it to tell it apart from a live process
+    try:
+        return os.waitpid(pid, os.WNOHANG) == (0, 0)
+    except ChildProcessError:
+        return True
+
+
+class ComfyClient:
+    """Process-wide connection manager for one ComfyUI server.
+
+    Keeps a pool of keep-alive HTTP connections for /prompt, /history and /view
+    and a single long-lived WebSocket bound to ``client_id``. Readiness is
+    established once and published as an event, so ``ready`` is a flag read;
+    the socket is only re-established when it drops.
+    """
+
+    def __init__(self, host, port, client_id, pool_size=4, http_timeout=30):
+        self.host = host
+        self.port = int(port)
+        self.client_id = client_id
+        self.http_timeout = http_timeout
+        self.system_stats = None
+        self._ready = threading.Event()
+        self._ready_lock = threading.Lock()
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._ws = None
+        self._ws_lock = threading.Lock()
+        self._dispatcher = None
+        self._dispatcher_lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def ws_url(self):
+        return f"ws://{self.host}:{self.port}/ws?clientId={self.client_id}"
+
+    # HTTP
+
+    def _get_connection(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.http_timeout)
+
+    def _release_connection(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method, path, body=None, headers=None, timeout=None):
+        """Send a request over a pooled connection and return (status, body bytes)"""
+        headers = dict(headers or {})
+        for attempt in range(2):
+            conn = self._get_connection()
+            if timeout is not None:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except _STALE_CONNECTION_ERRORS:
+                conn.close()
+                if attempt == 1:
+                    raise
+                continue
+            except Exception:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                if timeout is not None:
+                    conn.timeout = self.http_timeout
+                    if conn.sock is not None:
+                        conn.sock.settimeout(self.http_timeout)
+                self._release_connection(conn)
+            return response.status, data
+
+    def request_json(self, method, path, payload=None):
+        body = None
+        headers = {}
+        if payload is not None:
+            body = payload if isinstance(payload, (bytes, str)) else json.dumps(payload)
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        status, data = self.request(method, path, body=body, headers=headers)
+        if status >= 400:
+            raise ComfyAPIError(status, data.decode('utf-8', errors='replace'))
+        return json.loads(data) if data else None
+
+    def queue_prompt(self, prompt_json):
+        """Queue an already serialized API graph and return ComfyUI's response"""
+        payload = f'{{"prompt": {prompt_json}, "client_id": {json.dumps(self.client_id)}}}'
+        return self.request_json('POST', '/prompt', payload)
+
+    def get_history(self, prompt_id):
+        return self.request_json('GET', f"/history/{prompt_id}")
+
+    def get_queue(self):
+        return self.request_json('GET', '/queue')
+
+    def cancel_prompt(self, prompt_id):
+        """Drop a prompt from ComfyUI's queue, interrupting it if it is executing; True when interrupted"""
+        self.request_json('POST', '/queue', {"delete": [prompt_id]})
+        running = [entry[1] for entry in (self.get_queue() or {}).get("queue_running", [])]
+        if prompt_id not in running:
+            return False
+        # With prompt_id, ComfyUI only interrupts that prompt, so a job started in between is safe
+        self.request_json('POST', '/interrupt', {"prompt_id": prompt_id})
+        return True
+
+    def get_system_stats(self):
+        """Current system and per-device memory figures (VRAM total and free)"""
+        return self.request_json('GET', '/system_stats')
+
+    def get_object_info(self):
+        """Input schema of every installed node class"""
+        return self.request_json('GET', '/object_info')
+
+    def get_image(self, filename, subfolder, folder_type):
+        query = urllib.parse.urlencode({"filename": filename, "subfolder": subfolder, "type": folder_type})
+        status, data = self.request('GET', f"/view?{query}")
+        if status >= 400:
+            raise ComfyAPIError(status, data.decode('utf-8', errors='replace'))
+        return data
+
+    # Readiness
+
+    def wait_until_ready(self, timeout=180, max_interval=1.0, process_id=None):
+        """Block until /system_stats answers and the WebSocket handshake succeeds; returns True on success.
+
+        Probes back off exponentially from 10 ms up to ``max_interval``. One
+        thread probes while concurrent callers wait for its result. When
+        ``process_id`` is given, waiting stops as soon as that process exits.
+        """
+        if self._ready.is_set():
+            return True
+        with self._ready_lock:
+            if self._ready.is_set():
+                return True
+            start = time.monotonic()
+            deadline = start + timeout
+            error = None
+            for attempt, delay in enumerate(backoff_delays(base=0.01, cap=max_interval), start=1):
+                try:
+                    status, body = self.request('GET', '/system_stats', timeout=5)
+                    if status == 200:
+                        self.system_stats = json.loads(body)
+                        with self._ws_lock:
+                            self._ensure_ws()
+                        self._ready.set()
+                        logger.info(f"✅ ComfyUI ready at {self.base_url} after {time.monotonic() - start:.2f}s ({attempt} probes)")
+                        return True
+                    error = f"HTTP {status}"
+                except Exception as e:
+                    error = e
+                logger.debug(f"ComfyUI not ready (probe {attempt}): {error}")
+                if process_id is not None and not process_alive(process_id):
+                    logger.error(f"❌ ComfyUI process {process_id} exited before becoming ready")
+                    return False
+                if time.monotonic() + delay > deadline:
+                    logger.error(f"❌ ComfyUI did not become ready within {timeout}s: {error}")
+                    return False
+                time.sleep(delay)
+
+    # WebSocket
+
+    def _ensure_ws(self):
+        if self._ws is not None and self._ws.connected:
+            return self._ws
+        ws = websocket.WebSocket()
+        ws.connect(self.ws_url, timeout=10)
+        ws.settimeout(None)
+        self._ws = ws
+        logger.info(f"WebSocket connected: {self.ws_url}")
+        return ws
+
+    def reconnect(self, max_wait=180):
+        """Re-establish the WebSocket with jittered exponential backoff"""
+        with self._ws_lock:
+            if self._ws is not None:
+                try:
+                    self._ws.close()
+                except Exception:
+                    pass
+                self._ws = None
+            deadline = time.monotonic() + max_wait
+            for attempt, delay in enumerate(backoff_delays(), start=1):
+                try:
+                    return self._ensure_ws()
+                except Exception as e:
+                    if time.monotonic() + delay > deadline:
+                        raise ConnectionError(f"WebSocket reconnect failed after {attempt} attempts: {e}")
+                    logger.warning(f"WebSocket reconnect failed (attempt {attempt}), retrying in {delay:.2f}s: {e}")
+                    time.sleep(delay)
+
+    def recv(self):
+        """Receive the next WebSocket message, reconnecting once if the socket dropped"""
+        with self._ws_lock:
+            ws = self._ensure_ws()
+        try:
+            return ws.recv()
+        except (websocket.WebSocketConnectionClosedException, ConnectionError, OSError) as e:
+            logger.warning(f"WebSocket dropped: {e}")
+            return self.reconnect().recv()
+
+    # Per-prompt event routing
+
+    def subscribe(self, prompt_id):
+        """Return the queue of decoded WebSocket events for one prompt.
+
+        Starts the background dispatcher on first use; once it runs, ``recv()``
+        must not be called directly since the dispatcher owns the socket.
+        """
+        with self._dispatcher_lock:
+            if self._dispatcher is None or not self._dispatcher.is_alive():
+                self._dispatcher = EventDispatcher(self)
+                self._dispatcher.start()
+            return self._dispatcher.subscribe(prompt_id)
+
+    def unsubscribe(self, prompt_id):
+        with self._dispatcher_lock:
+            if self._dispatcher is not None:
+                self._dispatcher.unsubscribe(prompt_id)
+
+    def close(self):
+        with self._dispatcher_lock:
+            if self._dispatcher is not None:
+                self._dispatcher.stop()
+                self._dispatcher = None
+        with self._ws_lock:
+            if self._ws is not None:
+                self._ws.close()
+                self._ws = None
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+        self._ready.clear()
+
+
+class EventDispatcher(threading.Thread):
+    """Reads the shared WebSocket and routes events to per-prompt queues by ``prompt_id``.
+
+    Events for a prompt that nobody has subscribed to yet are buffered, since
+    ComfyUI may start executing before ``/prompt`` has returned the prompt id;
+    buffers nobody claims within ``unclaimed_ttl`` seconds are discarded. Events
+    arriving after ``unsubscribe`` are dropped.
+    If the socket cannot be re-established every queue receives ``None``.
+    """
+
+    def __init__(self, client, finished_kept=FINISHED_PROMPTS_KEPT, unclaimed_ttl=UNCLAIMED_EVENTS_TTL):
+        super().__init__(name="comfy-events", daemon=True)
+        self.client = client
+        self.error = None
+        self.unclaimed_ttl = unclaimed_ttl
+        self._queues = {}
+        # Buffers created for events before anyone subscribed: prompt id -> creation time
+        self._unclaimed = {}
+        # Recently unsubscribed prompt ids, oldest first
+        self._finished = collections.OrderedDict()
+        self._finished_kept = finished_kept
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def subscribe(self, prompt_id):
+        with self._lock:
+            self._unclaimed.pop(prompt_id, None)
+            self._finished.pop(prompt_id, None)
+            if prompt_id not in self._queues:
+                self._queues[prompt_id] = queue.Queue()
+            return self._queues[prompt_id]
+
+    def unsubscribe(self, prompt_id):
+        with self._lock:
+            self._queues.pop(prompt_id, None)
+            self._unclaimed.pop(prompt_id, None)
+            self._finished[prompt_id] = None
+            while len(self._finished) > self._finished_kept:
+                self._finished.popitem(last=False)
+
+    def _deliver(self, prompt_id, message):
+        now = time.monotonic()
+        with self._lock:
+            # Unclaimed buffers are created in order, so expired ones sit at the front
+            for stale, created in list(self._unclaimed.items()):
+                if now - created < self.unclaimed_ttl:
+                    break
+                del self._unclaimed[stale]
+                self._queues.pop(stale, None)
+            if prompt_id in self._finished:
+                return
+            q = self._queues.get(prompt_id)
+            if q is None:
+                q = self._queues[prompt_id] = queue.Queue()
+                self._unclaimed[prompt_id] = now
+        q.put(message)
+
+    def stop(self):
+        self._stopped.set()
+
+    def _fail(self, error):
+        logger.error(f"❌ Event dispatcher stopped: {error}")
+        self.error = error
+        with self._lock:
+            queues = list(self._queues.values())
+        for q in queues:
+            q.put(None)
+
+    def run(self):
+        client = self.client
+        while True:
+            try:
+                # Taking the socket under the client's lock means close() either sees this
+                # recv in flight and closes its socket, or the loop sees the stop flag first
+                with client._ws_lock:
+                    if self._stopped.is_set():
+                        return
+                    ws = client._ensure_ws()
+                out = ws.recv()
+            except (websocket.WebSocketException, ConnectionError, OSError) as e:
+                if self._stopped.is_set():
+                    return
+                logger.warning(f"WebSocket dropped: {e}")
+                try:
+                    client.reconnect()
+                except Exception as e:
+                    return self._fail(e)
+                continue
+            if not isinstance(out, str):
+                # Binary frames carry latent previews, which are not used
+                continue
+            try:
+                message = json.loads(out)
+            except ValueError:
+                continue
+            prompt_id = (message.get('data') or {}).get('prompt_id')
+            if prompt_id is not None:
+                self._deliver(prompt_id, message)
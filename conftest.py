@@ -0,0 +1,31 @@
+import uuid
+
+import pytest
+
+from comfy_client import ComfyClient
+from fake_comfyui import FakeComfyUI
+from lora_cache import LoraCache
+
+
+@pytest.fixture
+def fake():
+    server = FakeComfyUI().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def worker(fake, tmp_path, monkeypatch):
+    """The handler module wired to the fake ComfyUI server with a temporary input directory"""
+    import handler
+
+    client = ComfyClient("127.0.0.1", fake.port, str(uuid.uuid4()))
+    monkeypatch.setattr(handler, "comfy", client)
+    monkeypatch.setattr(handler, "COMFYUI_INPUT_DIR", str(tmp_path / "input"))
+    # Every job really executes unless a test installs its own result cache
+    monkeypatch.setattr(handler, "result_cache", None)
+    monkeypatch.setattr(handler, "lora_cache", LoraCache(str(tmp_path / "lora_cache"), str(tmp_path / "volume_loras"),
+                                                         fetcher=handler.fetcher))
+    monkeypatch.chdir(tmp_path)
+    yield handler
+    client.close()
@@ -0,0 +1,65 @@
+"""
+CachedCLIPTextEncode: CLIPTextEncode backed by a process-wide conditioning cache.
+
+The handler swaps CLIPTextEncode nodes for this one and passes the encoder file
+name. On a cache hit the lazy `clip` input is never requested, so the text
+encoder is neither loaded nor run.
+"""
+
+import os
+
+from .embedding_cache import EmbeddingCache, cache_key
+
+CACHE = EmbeddingCache(
+    max_bytes=int(float(os.getenv('TEXT_CACHE_MB', '1024')) * 1024 * 1024),
+    spill_dir=os.getenv('TEXT_CACHE_DIR') or None,
+)
+
+
+class CachedCLIPTextEncode:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "text": ("STRING", {"multiline": True, "dynamicPrompts": True}),
+                "encoder": ("STRING", {"default": ""}),
+                "clip": ("CLIP", {"lazy": True}),
+            }
+        }
+
+    RETURN_TYPES = ("CONDITIONING",)
+    FUNCTION = "encode"
+    CATEGORY = "conditioning"
+
+    def check_lazy_status(self, text, encoder, clip=None):
+        key = cache_key(encoder, text)
+        # ComfyUI asks again once `clip` is evaluated; reuse the first lookup, which encode() counts once
+        lookup = getattr(self, '_lookup', None)
+        if lookup is None or lookup[0] != key:
+            conditioning, source = CACHE.get(key, count=False)
+            # Kept so encode() does not lose a hit to a concurrent eviction
+            lookup = self._lookup = (key, conditioning, source)
+        return [] if lookup[1] is not None else ["clip"]
+
+    def encode(self, text, encoder, clip=None):
+        key = cache_key(encoder, text)
+        lookup = getattr(self, '_lookup', None)
+        if lookup is not None and lookup[0] == key:
+            conditioning, source = lookup[1], lookup[2]
+            CACHE.record(source)
+        else:
+            conditioning, source = CACHE.get(key)
+        self._lookup = None
+        if conditioning is None:
+            if clip is None:
+                raise RuntimeError("Text encoder input was not evaluated for an uncached prompt")
+            from nodes import CLIPTextEncode
+            conditioning = CLIPTextEncode().encode(clip, text)[0]
+            CACHE.put(key, conditioning)
+            source = "miss"
+        ui = {"text_cache": [dict(CACHE.stats(), source=source)]}
+        return {"ui": ui, "result": (conditioning,)}
+
+
+NODE_CLASS_MAPPINGS = {"CachedCLIPTextEncode": CachedCLIPTextEncode}
+NODE_DISPLAY_NAME_MAPPINGS = {"CachedCLIPTextEncode": "CLIP Text Encode (Cached)"}
@@ -0,0 +1,135 @@
+import os
+import pickle
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(encoder, text):
+    """Stable key for a (text encoder file, prompt text) pair"""
+    return hashlib.sha256(f"{encoder}\0{text}".encode('utf-8')).hexdigest()
+
+
+def nbytes(value):
+    """Approximate memory held by a conditioning value (tensors nested in lists/tuples/dicts)"""
+    if hasattr(value, 'element_size') and hasattr(value, 'nelement'):
+        return value.element_size() * value.nelement()
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(nbytes(v) for v in value.values())
+    return 0
+
+
+def _save(value, path):
+    tmp_path = f"{path}.tmp"
+    try:
+        import torch
+        torch.save(value, tmp_path)
+    except ImportError:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f)
+    os.replace(tmp_path, path)
+
+
+def _load(path):
+    try:
+        import torch
+        return torch.load(path, map_location="cpu", weights_only=False)
+    except ImportError:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+class EmbeddingCache:
+    """LRU cache of text-encoder conditioning with a byte budget and optional on-disk spill.
+
+    Entries evicted from memory are written to ``spill_dir`` (when set) and
+    promoted back on the next hit.
+    """
+
+    def __init__(self, max_bytes, spill_dir=None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.pt")
+
+    def get(self, key, count=True):
+        """Return (value, source) where source is 'memory', 'disk' or None on a miss.
+
+        With ``count=False`` the lookup is left out of the statistics (see ``record``).
+        """
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += int(count)
+                return self.entries[key], "memory"
+        if self.spill_dir and os.path.exists(self._spill_path(key)):
+            try:
+                value = _load(self._spill_path(key))
+            except Exception as e:
+                logger.warning(f"Dropping unreadable spilled conditioning {key}: {e}")
+                os.remove(self._spill_path(key))
+            else:
+                with self._lock:
+                    self.disk_hits += int(count)
+                self.put(key, value)
+                return value, "disk"
+        with self._lock:
+            self.misses += int(count)
+        return None, None
+
+    def record(self, source):
+        """Count a lookup made with ``count=False``"""
+        with self._lock:
+            if source == "memory":
+                self.hits += 1
+            elif source == "disk":
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+
+    def contains(self, key):
+        with self._lock:
+            if key in self.entries:
+                return True
+        return bool(self.spill_dir) and os.path.exists(self._spill_path(key))
+
+    def put(self, key, value):
+        size = nbytes(value)
+        evicted = []
+        with self._lock:
+            if key in self.entries:
+                self.bytes -= self.sizes[key]
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            self.sizes[key] = size
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, old_value = self.entries.popitem(last=False)
+                self.bytes -= self.sizes.pop(old_key)
+                evicted.append((old_key, old_value))
+        for old_key, old_value in evicted:
+            if self.spill_dir and not os.path.exists(self._spill_path(old_key)):
+                try:
+                    _save(old_value, self._spill_path(old_key))
+                except Exception as e:
+                    logger.warning(f"Could not spill conditioning {old_key}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self.entries), "bytes": self.bytes, "hits": self.hits,
+                    "disk_hits": self.disk_hits, "misses": self.misses}
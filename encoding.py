@@ -0,0 +1,162 @@
+import os
+import shutil
+import logging
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# ffmpeg used to re-encode outputs of graphs whose save node cannot apply the requested settings
+FFMPEG_PATH = os.getenv('FFMPEG_PATH') or None
+TRANSCODE_TIMEOUT = float(os.getenv('TRANSCODE_TIMEOUT', '600'))
+
+
+class EncodingError(Exception):
+    """The job's `encoding` input names an unknown profile, codec or out-of-range setting"""
+
+
+# Software encoders only, so every setting works without a GPU encoder
+CODECS = {
+    "h264": {"vhs_format": "video/h264-mp4", "encoder": "libx264", "extension": "mp4", "max_crf": 51},
+    "h265": {"vhs_format": "video/h265-mp4", "encoder": "libx265", "extension": "mp4", "max_crf": 51},
+    "vp9": {"vhs_format": "video/webm", "encoder": "libvpx-vp9", "extension": "webm", "max_crf": 63},
+    "av1": {"vhs_format": "video/av1-webm", "encoder": "libsvtav1", "extension": "webm", "max_crf": 63},
+}
+X264_PRESETS = ("ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow")
+PIX_FMTS = ("yuv420p", "yuv420p10le")
+
+# Named settings; explicit keys in the job's `encoding` object override them
+PROFILES = {
+    # Small and quick to transfer: for drafts and thumbnails
+    "preview": {"codec": "h264", "crf": 30, "preset": "veryfast", "pix_fmt": "yuv420p"},
+    # Visually lossless for delivery, about a third of the size of the graphs' CRF 15
+    "final": {"codec": "h264", "crf": 19, "preset": "slow", "pix_fmt": "yuv420p"},
+}
+SETTINGS = ("codec", "crf", "preset", "fps", "pix_fmt")
+
+# Empirical bits per pixel per frame at CRF 23 for Wan-style footage; each +6 CRF roughly halves the size
+BASE_BITS_PER_PIXEL = {"h264": 0.09, "h265": 0.055, "vp9": 0.06, "av1": 0.045}
+
+
+def parse_encoding(value):
+    """Normalize the `encoding` job input (profile name or object) to a settings dict; None when absent"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = {"profile": value}
+    if not isinstance(value, dict):
+        raise EncodingError("'encoding' must be a profile name or an object")
+    unknown = set(value) - set(SETTINGS) - {"profile"}
+    if unknown:
+        raise EncodingError(f"Unknown encoding settings: {', '.join(sorted(unknown))}")
+    settings = {}
+    profile = value.get("profile")
+    if profile is not None:
+        if profile not in PROFILES:
+            raise EncodingError(f"Unknown encoding profile '{profile}'. Available: {', '.join(PROFILES)}")
+        settings.update(PROFILES[profile], profile=profile)
+    settings.update({k: v for k, v in value.items() if k in SETTINGS and v is not None})
+
+    codec = settings.setdefault("codec", "h264")
+    if codec not in CODECS:
+        raise EncodingError(f"Unknown codec '{codec}'. Available: {', '.join(CODECS)}")
+    crf = settings.get("crf")
+    if crf is not None and (isinstance(crf, bool) or not isinstance(crf, int) or not 0 <= crf <= CODECS[codec]["max_crf"]):
+        raise EncodingError(f"crf must be an integer from 0 to {CODECS[codec]['max_crf']} for {codec}")
+    if settings.get("preset") is not None and settings["preset"] not in X264_PRESETS:
+        raise EncodingError(f"Unknown preset '{settings['preset']}', expected one of {', '.join(X264_PRESETS)}")
+    fps = settings.get("fps")
+    if fps is not None and (isinstance(fps, bool) or not isinstance(fps, (int, float)) or not 0 < fps <= 120):
+        raise EncodingError("fps must be a number above 0 and at most 120")
+    if settings.get("pix_fmt") is not None and settings["pix_fmt"] not in PIX_FMTS:
+        raise EncodingError(f"Unknown pix_fmt '{settings['pix_fmt']}', expected one of {', '.join(PIX_FMTS)}")
+    return settings
+
+
+def apply_encoding(prompt, settings):
+    """Patch the graph's save nodes with the encoding settings they support.
+
+    Returns the settings that still need an ffmpeg pass over the output (empty
+    when the graph encodes everything itself). The x264 preset alone never
+    triggers a re-encode.
+    """
+    if not settings:
+        return {}
+    nodes = prompt.template.graph
+    remaining = {}
+    vhs = [n for n, node in nodes.items() if node['class_type'] == "VHS_VideoCombine"]
+    save = [n for n, node in nodes.items() if node['class_type'] == "SaveVideo"]
+    create = [n for n, node in nodes.items() if node['class_type'] == "CreateVideo"]
+    for node_id in vhs:
+        prompt.set_input(node_id, "format", CODECS[settings["codec"]]["vhs_format"])
+        for name, input_name in (("crf", "crf"), ("pix_fmt", "pix_fmt"), ("fps", "frame_rate")):
+            if settings.get(name) is not None:
+                prompt.set_input(node_id, input_name, settings[name])
+    for node_id in create:
+        if settings.get("fps") is not None:
+            prompt.set_input(node_id, "fps", settings["fps"])
+    if save and not vhs:
+        # Core SaveVideo writes h264 MP4 at default quality; everything else is left to ffmpeg
+        for node_id in save:
+            if settings["codec"] == "h264":
+                prompt.set_input(node_id, "codec", "h264")
+                prompt.set_input(node_id, "format", "mp4")
+        if settings["codec"] != "h264" or settings.get("crf") is not None or settings.get("pix_fmt") not in (None, "yuv420p"):
+            remaining = {k: settings[k] for k in ("codec", "crf", "preset", "pix_fmt") if settings.get(k) is not None}
+    return remaining
+
+
+def applied_encoding(settings, remaining):
+    """The settings that reach an encoder, for the job's report.
+
+    Save nodes have no speed preset, so ``preset`` only counts when the x264/x265 ffmpeg pass runs.
+    """
+    applied = dict(settings)
+    if not (remaining.get("preset") and CODECS[remaining["codec"]]["encoder"] in ("libx264", "libx265")):
+        applied.pop("preset", None)
+    return applied
+
+
+def estimate_size(width, height, frames, settings=None):
+    """Rough output size in bytes for a clip, to let clients plan bandwidth before the video exists"""
+    settings = settings or {}
+    codec = settings.get("codec", "h264")
+    crf = settings.get("crf", 15)
+    bits = width * height * frames * BASE_BITS_PER_PIXEL[codec] * 2 ** ((23 - crf) / 6)
+    return int(bits / 8)
+
+
+def find_ffmpeg():
+    """ffmpeg from FFMPEG_PATH, PATH or the imageio-ffmpeg wheel VideoHelperSuite installs; None if absent"""
+    if FFMPEG_PATH:
+        return FFMPEG_PATH
+    path = shutil.which("ffmpeg")
+    if path:
+        return path
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return None
+
+
+def transcode(path, settings, ffmpeg=None):
+    """Re-encode a video with software encoders; returns the new file's path next to the original"""
+    ffmpeg = ffmpeg or find_ffmpeg()
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg not found; set FFMPEG_PATH to re-encode outputs")
+    codec = CODECS[settings.get("codec", "h264")]
+    target = f"{os.path.splitext(path)[0]}.{settings.get('codec', 'h264')}.{codec['extension']}"
+    command = [ffmpeg, "-y", "-v", "error", "-i", path, "-c:v", codec["encoder"]]
+    if settings.get("crf") is not None:
+        command += ["-crf", str(settings["crf"])]
+        if codec["encoder"] == "libvpx-vp9":
+            # Constant quality mode for VP9 needs the bitrate cap disabled
+            command += ["-b:v", "0"]
+    if settings.get("preset") and codec["encoder"] in ("libx264", "libx265"):
+        command += ["-preset", settings["preset"]]
+    command += ["-pix_fmt", settings.get("pix_fmt") or "yuv420p"]
+    command += ["-movflags", "+faststart", "-c:a", "copy"] if codec["extension"] == "mp4" else ["-an"]
+    subprocess.run(command + [target], check=True, capture_output=True, timeout=TRANSCODE_TIMEOUT)
+    logger.info(f"🎞️ Re-encoded {os.path.basename(path)} to {settings.get('codec', 'h264')} "
+                f"({os.path.getsize(path)} -> {os.path.getsize(target)} bytes)")
+    return target
@@ -26,28 +26,23 @@ fi
 # Ensure ComfyUI input directory exists for image uploads
 mkdir -p /ComfyUI/input
 
+# Prefetch the models the workflows use. "copy" puts them on local disk and must finish
+# before ComfyUI reads extra_model_paths.yaml; "warm" only fills the page cache, in parallel
+PREFETCH_MODE=${PREFETCH_MODE:-warm}
+if [ "$PREFETCH_MODE" = "copy" ]; then
+    echo "📦 Copying models to local disk..."
+    python /prefetch.py --mode copy || echo "⚠️  Warning: model prefetch failed, using the network volume"
+elif [ "$PREFETCH_MODE" = "warm" ]; then
+    echo "📦 Warming model files in the background..."
+    python /prefetch.py --mode warm &
+fi
+
 # Start ComfyUI in the background
 echo "🚀 Starting ComfyUI server..."
 python /ComfyUI/main.py --listen --use-sage-attention &
-
-# Wait for ComfyUI to be ready
-echo "⏳ Waiting for ComfyUI to be ready..."
-max_wait=120  # Maximum 2 minutes wait
-wait_count=0
-while [ $wait_count -lt $max_wait ]; do
-    if curl -s http://127.0.0.1:8188/ > /dev/null 2>&1; then
-        echo "✅ ComfyUI is ready!"
-        break
-    fi
-    echo "⏳ Waiting for ComfyUI... ($wait_count/$max_wait seconds)"
-    sleep 2
-    wait_count=$((wait_count + 2))
-done
-
-if [ $wait_count -ge $max_wait ]; then
-    echo "❌ Error: ComfyUI failed to start within $max_wait seconds"
-    exit 1
-fi
+# The handler probes /system_stats and the WebSocket with millisecond backoff and
+# stops waiting early if this process exits
+export COMFYUI_PID=$!
 
 # Start the handler in the foreground
 echo "🎬 Starting Wan2.2 I2V handler..."
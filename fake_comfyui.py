@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Minimal stand-in for the ComfyUI server used by tests and benchmarks.
+
+Serves /, /system_stats, /object_info, /prompt, /queue, /interrupt, /history/<id>, /view
+and a /ws WebSocket that emits execution events for each queued prompt after a
+configurable delay.
+Like ComfyUI, prompts execute one at a time in submission order.
+"""
+
+import os
+import json
+import queue
+import uuid
+import base64
+import struct
+import hashlib
+import tempfile
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WS_MAGIC = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def encode_frame(payload, opcode=0x1):
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    header = bytes([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header += bytes([length])
+    elif length < 65536:
+        header += bytes([126]) + struct.pack('>H', length)
+    else:
+        header += bytes([127]) + struct.pack('>Q', length)
+    return header + payload
+
+
+def solid_png(rgb, width=16, height=16):
+    """Single-colour PNG standing in for SaveImage outputs"""
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    row = b'\x00' + bytes(rgb) * width
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * height)) + chunk(b'IEND', b''))
+
+
+class FakeComfyUI:
+    """Threaded fake ComfyUI server; start() returns once it is listening"""
+
+    def __init__(self, node_delay=0.0, output_size=1024, output_node="277", port=0,
+                 progress_steps=0, fail_node=None, execution_delay=0.0, object_info=None,
+                 hang_node=None, drop_final_event=False):
+        self.node_delay = node_delay
+        # Extra seconds per prompt after its nodes ran, standing in for sampling time
+        self.execution_delay = execution_delay
+        # Served at /object_info and /system_stats
+        self.object_info = object_info or {}
+        self.system_stats = {"system": {"os": "fake"}, "devices": []}
+        self.progress_steps = progress_steps
+        self.fail_node = fail_node
+        # Execution blocks at this node until /interrupt, like a stuck sampler
+        self.hang_node = hang_node
+        # Finish prompts without sending the terminal `executing` event (history is still written)
+        self.drop_final_event = drop_final_event
+        self.output_size = output_size
+        self.output_node = output_node
+        self.output_dir = tempfile.mkdtemp(prefix="fake_comfyui_")
+        self.prompts = {}
+        self.history = {}
+        # Signatures of the last executed prompt, mimicking ComfyUI's classic output cache
+        self.cache = {}
+        self.sockets = {}
+        self.requests = []
+        self.connections = 0
+        self.ws_connections = 0
+        # Prompts queued or executing, and the deepest the queue has been
+        self.pending = 0
+        self.max_pending = 0
+        # Queue bookkeeping for GET /queue, POST /queue {"delete"} and POST /interrupt
+        self.waiting = []
+        self.running = None
+        self.deleted = []
+        self.interrupts = 0
+        self._interrupt = threading.Event()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        threading.Thread(target=self._run_queue, daemon=True).start()
+        return self
+
+    def _run_queue(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if job[0] in self.waiting:
+                    self.waiting.remove(job[0])
+                skip = job[0] in self.deleted
+                if not skip:
+                    self.running = job[0]
+                    self._interrupt.clear()
+            try:
+                if not skip:
+                    self._execute(*job)
+            finally:
+                with self._lock:
+                    self.pending -= 1
+                    self.running = None
+
+    def stop(self):
+        self._queue.put(None)
+        self._interrupt.set()
+        with self._lock:
+            sockets = [s for conns in self.sockets.values() for s, _ in conns]
+            self.sockets.clear()
+        for sock in sockets:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._server.shutdown()
+        self._server.server_close()
+
+    def drop_websockets(self):
+        """Close every open WebSocket to simulate a dropped connection"""
+        with self._lock:
+            sockets = [s for conns in self.sockets.values() for s, _ in conns]
+            self.sockets.clear()
+        for sock in sockets:
+            try:
+                sock.shutdown(2)
+                sock.close()
+            except OSError:
+                pass
+
+    def send_event(self, client_id, message):
+        with self._lock:
+            conns = list(self.sockets.get(client_id, []))
+        for sock, lock in conns:
+            try:
+                with lock:
+                    sock.sendall(encode_frame(json.dumps(message)))
+            except OSError:
+                pass
+
+    @staticmethod
+    def signatures(prompt):
+        """Node id -> signature over class, inputs and the signatures of linked ancestors"""
+        memo = {}
+
+        def sig(node_id):
+            if node_id not in memo:
+                node = prompt[node_id]
+                inputs = {}
+                for name, value in node.get("inputs", {}).items():
+                    if isinstance(value, list) and len(value) == 2 and str(value[0]) in prompt:
+                        inputs[name] = [sig(str(value[0])), value[1]]
+                    else:
+                        inputs[name] = value
+                memo[node_id] = json.dumps([node_id, node.get("class_type"), inputs], sort_keys=True)
+            return memo[node_id]
+
+        return {node_id: sig(node_id) for node_id in prompt}
+
+    def _execute(self, prompt_id, prompt, client_id):
+        self.send_event(client_id, {"type": "execution_start", "data": {"prompt_id": prompt_id}})
+        signatures = self.signatures(prompt)
+        with self._lock:
+            cached = [n for n, s in signatures.items() if self.cache.get(n) == s]
+            self.cache = signatures
+        self.send_event(client_id, {"type": "execution_cached", "data": {"nodes": cached, "prompt_id": prompt_id}})
+        for node_id in prompt:
+            if node_id in cached:
+                continue
+            self.send_event(client_id, {"type": "executing", "data": {"node": node_id, "prompt_id": prompt_id}})
+            if node_id == self.fail_node:
+                self.send_event(client_id, {"type": "execution_error", "data": {
+                    "prompt_id": prompt_id, "node_id": node_id, "node_type": prompt[node_id].get("class_type"),
+                    "exception_type": "RuntimeError", "exception_message": "simulated failure"}})
+                return
+            if node_id == self.hang_node:
+                self._interrupt.wait()
+            if self._interrupt.is_set():
+                self.send_event(client_id, {"type": "execution_interrupted", "data": {
+                    "prompt_id": prompt_id, "node_id": node_id, "node_type": prompt[node_id].get("class_type")}})
+                with self._lock:
+                    self.history[prompt_id] = {"prompt": [0, prompt_id, prompt, {}, []], "outputs": {},
+                                               "status": {"status_str": "error", "completed": False, "messages": []}}
+                return
+            for step in range(1, self.progress_steps + 1):
+                self.send_event(client_id, {"type": "progress", "data": {
+                    "value": step, "max": self.progress_steps, "node": node_id, "prompt_id": prompt_id}})
+            if self.node_delay:
+                time.sleep(self.node_delay)
+        if self.execution_delay:
+            time.sleep(self.execution_delay)
+        filename = f"{prompt_id}.mp4"
+        fullpath = os.path.join(self.output_dir, filename)
+        with open(fullpath, 'wb') as f:
+            f.write(os.urandom(self.output_size))
+        outputs = {self.output_node: {"gifs": [{
+            "filename": filename, "subfolder": "", "type": "output",
+            "format": "video/h264-mp4", "fullpath": fullpath,
+        }]}}
+        # SaveImage nodes get a small PNG whose colour differs per prompt
+        for node_id, node in prompt.items():
+            if node.get("class_type") == "SaveImage":
+                image_name = f"{prompt_id}_{node_id}.png"
+                with open(os.path.join(self.output_dir, image_name), 'wb') as f:
+                    f.write(solid_png(hashlib.sha256(prompt_id.encode()).digest()[:3]))
+                outputs[node_id] = {"images": [{"filename": image_name, "subfolder": "", "type": "output"}]}
+        with self._lock:
+            self.history[prompt_id] = {
+                "prompt": [0, prompt_id, prompt, {}, list(outputs)],
+                "outputs": outputs,
+                "status": {"status_str": "success", "completed": True, "messages": []},
+            }
+        if not self.drop_final_event:
+            self.send_event(client_id, {"type": "executing", "data": {"node": None, "prompt_id": prompt_id}})
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def _send_json(self, payload, status=200):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_body(self):
+                length = int(self.headers.get('Content-Length', 0))
+                return self.rfile.read(length) if length else b''
+
+            def do_GET(self):
+                parsed = urllib.parse.urlparse(self.path)
+                with fake._lock:
+                    fake.requests.append(("GET", parsed.path))
+                if parsed.path == "/ws":
+                    return self._websocket(urllib.parse.parse_qs(parsed.query))
+                if parsed.path == "/":
+                    body = b"<html>fake comfyui</html>"
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif parsed.path == "/system_stats":
+                    self._send_json(fake.system_stats)
+                elif parsed.path == "/queue":
+                    with fake._lock:
+                        running = [[0, fake.running, {}, {}, []]] if fake.running else []
+                        pending = [[i + 1, pid, {}, {}, []] for i, pid in enumerate(fake.waiting)]
+                    self._send_json({"queue_running": running, "queue_pending": pending})
+                elif parsed.path == "/object_info":
+                    self._send_json(fake.object_info)
+                elif parsed.path.startswith("/history/"):
+                    prompt_id = parsed.path.rsplit("/", 1)[1]
+                    with fake._lock:
+                        entry = fake.history.get(prompt_id)
+                    self._send_json({prompt_id: entry} if entry else {})
+                elif parsed.path == "/view":
+                    query = urllib.parse.parse_qs(parsed.query)
+                    path = os.path.join(fake.output_dir, os.path.basename(query["filename"][0]))
+                    if not os.path.exists(path):
+                        return self._send_json({"error": "not found"}, 404)
+                    with open(path, 'rb') as f:
+                        body = f.read()
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                parsed = urllib.parse.urlparse(self.path)
+                with fake._lock:
+                    fake.requests.append(("POST", parsed.path))
+                body = self._read_body()
+                if parsed.path == "/prompt":
+                    payload = json.loads(body)
+                    prompt = payload.get("prompt")
+                    if not isinstance(prompt, dict) or not prompt:
+                        return self._send_json({"error": {"type": "invalid_prompt"}}, 400)
+                    prompt_id = str(uuid.uuid4())
+                    with fake._lock:
+                        fake.prompts[prompt_id] = prompt
+                        fake.pending += 1
+                        fake.max_pending = max(fake.max_pending, fake.pending)
+                        fake.waiting.append(prompt_id)
+                    fake._queue.put((prompt_id, prompt, payload.get("client_id")))
+                    self._send_json({"prompt_id": prompt_id, "number": len(fake.prompts), "node_errors": {}})
+                elif parsed.path == "/queue":
+                    payload = json.loads(body or b"{}")
+                    with fake._lock:
+                        for prompt_id in payload.get("delete", []):
+                            if prompt_id in fake.waiting:
+                                fake.waiting.remove(prompt_id)
+                                fake.deleted.append(prompt_id)
+                    self._send_json({})
+                elif parsed.path == "/interrupt":
+                    payload = json.loads(body or b"{}")
+                    with fake._lock:
+                        # Like ComfyUI, a prompt_id only interrupts that prompt; without one the running prompt stops
+                        if fake.running and payload.get("prompt_id") in (None, fake.running):
+                            fake.interrupts += 1
+                            fake._interrupt.set()
+                    self._send_json({})
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def _websocket(self, query):
+                key = self.headers.get('Sec-WebSocket-Key', '')
+                accept = base64.b64encode(hashlib.sha1((key + WS_MAGIC).encode()).digest()).decode()
+                client_id = query.get("clientId", [""])[0]
+                sock = self.connection
+                lock = threading.Lock()
+                with lock:
+                    with fake._lock:
+                        fake.ws_connections += 1
+                        fake.sockets.setdefault(client_id, []).append((sock, lock))
+                    self.send_response(101, "Switching Protocols")
+                    self.send_header('Upgrade', 'websocket')
+                    self.send_header('Connection', 'Upgrade')
+                    self.send_header('Sec-WebSocket-Accept', accept)
+                    self.end_headers()
+                    self.wfile.flush()
+                    sock.sendall(encode_frame(json.dumps({"type": "status", "data": {"sid": client_id}})))
+                # Drain client frames until the client closes the socket
+                try:
+                    while True:
+                        header = sock.recv(2)
+                        if len(header) < 2 or header[0] & 0x0F == 0x8:
+                            break
+                        length = header[1] & 0x7F
+                        if length == 126:
+                            length = struct.unpack('>H', sock.recv(2))[0]
+                        elif length == 127:
+                            length = struct.unpack('>Q', sock.recv(8))[0]
+                        sock.recv(4 + length)
+                except OSError:
+                    pass
+                with fake._lock:
+                    conns = fake.sockets.get(client_id, [])
+                    if (sock, lock) in conns:
+                        conns.remove((sock, lock))
+                self.close_connection = True
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import sys
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8188
+    server = FakeComfyUI(port=port, node_delay=0.05).start()
+    print(f"Fake ComfyUI listening on 127.0.0.1:{server.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,286 @@
+import os
+import time
+import queue
+import hashlib
+import logging
+import tempfile
+import threading
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from comfy_client import backoff_delays
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed store for images fetched from `image_url` / `last_image_url`
+FETCH_CACHE_DIR = os.getenv('FETCH_CACHE_DIR', '/tmp/fetch_cache')
+FETCH_CACHE_MB = float(os.getenv('FETCH_CACHE_MB', '1024'))
+# Largest accepted download and per-request socket timeout
+FETCH_MAX_MB = float(os.getenv('FETCH_MAX_MB', '50'))
+FETCH_TIMEOUT = float(os.getenv('FETCH_TIMEOUT', '30'))
+FETCH_RETRIES = int(os.getenv('FETCH_RETRIES', '3'))
+
+# Transient statuses worth another attempt; any other error status fails at once
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+CHUNK_SIZE = 256 * 1024
+
+
+class FetchError(Exception):
+    """A remote input could not be downloaded (bad URL, error status, too large or unreachable)"""
+
+
+class _Retry(Exception):
+    pass
+
+
+class Fetcher:
+    """Downloads remote inputs over pooled keep-alive connections into a local content cache.
+
+    Blobs are stored under their SHA-256 in ``blobs/``; ``urls/`` holds one
+    symlink per fetched URL pointing at its blob, so a repeated URL is served
+    from disk. Blob mtimes record last use and the least recently used ones
+    are evicted once the cache exceeds ``cache_max_bytes``.
+    """
+
+    def __init__(self, cache_dir=FETCH_CACHE_DIR, cache_max_bytes=None, max_bytes=None, timeout=FETCH_TIMEOUT,
+                 retries=FETCH_RETRIES, pool_size=4):
+        self.cache_dir = cache_dir
+        self.link_dir = os.path.join(cache_dir, "urls")
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.cache_max_bytes = FETCH_CACHE_MB * 1024 * 1024 if cache_max_bytes is None else cache_max_bytes
+        self.max_bytes = FETCH_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        self.timeout = timeout
+        self.retries = retries
+        self.pool_size = pool_size
+        self._pools = {}
+        self._lock = threading.Lock()
+        # One download per URL at a time; concurrent requests for it wait and then hit the cache
+        self._url_locks = {}
+
+    # Connections
+
+    def _get_connection(self, scheme, host, port):
+        with self._lock:
+            pool = self._pools.setdefault((scheme, host, port), queue.LifoQueue(maxsize=self.pool_size))
+        try:
+            return pool.get_nowait()
+        except queue.Empty:
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            return cls(host, port, timeout=self.timeout)
+
+    def _release_connection(self, scheme, host, port, conn):
+        try:
+            self._pools[(scheme, host, port)].put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            while not pool.empty():
+                pool.get_nowait().close()
+
+    # Cache
+
+    def _link(self, url):
+        return os.path.join(self.link_dir, hashlib.sha256(url.encode('utf-8')).hexdigest()[:32])
+
+    def cached(self, url):
+        """Path of the cached blob for ``url``, or None"""
+        link = self._link(url)
+        if not os.path.exists(link):
+            return None
+        path = os.path.realpath(link)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def _store(self, url, tmp_path, digest):
+        link = self._link(url)
+        path = os.path.join(self.blob_dir, digest)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            os.utime(path)
+        else:
+            os.replace(tmp_path, path)
+        os.makedirs(self.link_dir, exist_ok=True)
+        tmp_link = f"{link}.{threading.get_ident()}"
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(os.path.join("..", "blobs", digest), tmp_link)
+        os.replace(tmp_link, link)
+        return path
+
+    def evict(self, keep=None):
+        """Drop least recently used blobs over the byte cap and URL links left dangling; returns freed bytes"""
+        entries = []
+        try:
+            with os.scandir(self.blob_dir) as it:
+                for entry in it:
+                    if not entry.name.startswith('.'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            return 0
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.cache_max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            freed += size
+        if freed:
+            with os.scandir(self.link_dir) as it:
+                for entry in it:
+                    if not os.path.exists(entry.path):
+                        try:
+                            os.remove(entry.path)
+                        except FileNotFoundError:
+                            pass
+            logger.info(f"🧹 Removed {freed} bytes of fetched images from {self.cache_dir}")
+        return freed
+
+    # Download
+
+    def fetch(self, url):
+        """Local path of the content at ``url``, downloading it unless cached"""
+        parts = urllib.parse.urlsplit(url) if isinstance(url, str) else None
+        if parts is None or parts.scheme not in ("http", "https") or not parts.hostname:
+            raise FetchError(f"Unsupported URL '{url}', expected http(s)")
+        with self._lock:
+            url_lock = self._url_locks.setdefault(url, threading.Lock())
+        with url_lock:
+            try:
+                path = self.cached(url)
+                if path is not None:
+                    logger.info(f"♻️ Using cached download of {parts.hostname}{parts.path}")
+                    return path
+                path = self._retrying(url, lambda: self._download(
+                    url, self.blob_dir, self.max_bytes, lambda tmp_path, digest: self._store(url, tmp_path, digest)))
+            finally:
+                with self._lock:
+                    self._url_locks.pop(url, None)
+        self.evict(keep=path)
+        return path
+
+    def download(self, url, target, max_bytes=None, sha256=None):
+        """Stream ``url`` to ``target`` (replaced atomically) without caching it; returns its SHA-256.
+
+        With ``sha256`` given, content that does not match it is discarded and raises FetchError.
+        """
+        parts = urllib.parse.urlsplit(url) if isinstance(url, str) else None
+        if parts is None or parts.scheme not in ("http", "https") or not parts.hostname:
+            raise FetchError(f"Unsupported URL '{url}', expected http(s)")
+
+        def finish(tmp_path, digest):
+            if sha256 and digest != sha256.lower():
+                raise FetchError(f"Checksum mismatch: expected {sha256.lower()}, got {digest}")
+            os.replace(tmp_path, target)
+            return digest
+
+        directory = os.path.dirname(os.path.abspath(target))
+        return self._retrying(url, lambda: self._download(
+            url, directory, self.max_bytes if max_bytes is None else max_bytes, finish, accept="*/*"))
+
+    def _retrying(self, url, attempt_download):
+        parts = urllib.parse.urlsplit(url)
+        delays = backoff_delays(base=0.2, cap=2.0)
+        for attempt in range(self.retries + 1):
+            try:
+                return attempt_download()
+            except _Retry as e:
+                if attempt == self.retries:
+                    raise FetchError(f"{e} (after {attempt + 1} attempts)")
+                delay = next(delays)
+                logger.warning(f"⚠️ Fetching {parts.hostname}{parts.path} failed ({e}); retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+    def fetch_many(self, urls):
+        """Fetch several URLs in parallel; returns their paths in order"""
+        if len(urls) < 2:
+            return [self.fetch(url) for url in urls]
+        with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+            return list(pool.map(self.fetch, urls))
+
+    def _download(self, url, directory, max_bytes, finish, accept="image/*"):
+        start = time.monotonic()
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            scheme, host = parts.scheme, parts.hostname
+            if scheme not in ("http", "https") or not host:
+                raise FetchError(f"Redirected to unsupported URL '{url}'")
+            port = parts.port or (443 if scheme == "https" else 80)
+            path = urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+            conn = self._get_connection(scheme, host, port)
+            reusable = False
+            try:
+                try:
+                    conn.request("GET", path, headers={"Accept": accept})
+                    response = conn.getresponse()
+                except (OSError, http.client.HTTPException) as e:
+                    raise _Retry(f"{type(e).__name__}: {e}")
+
+                if response.status in REDIRECT_STATUSES and response.getheader("Location"):
+                    response.read()
+                    reusable = not response.will_close
+                    url = urllib.parse.urljoin(url, response.getheader("Location"))
+                    continue
+                if response.status != 200:
+                    body = response.read(200)
+                    if response.status in RETRY_STATUSES:
+                        raise _Retry(f"HTTP {response.status}")
+                    raise FetchError(f"HTTP {response.status} from {host}: {body[:100]!r}")
+                length = response.getheader("Content-Length")
+                if length and length.isdigit() and int(length) > max_bytes:
+                    raise FetchError(f"{int(length)} bytes exceeds the {int(max_bytes)} byte limit")
+
+                result, size = self._stream(response, directory, max_bytes, finish)
+                reusable = not response.will_close
+                logger.info(f"⬇️ Fetched {host}{parts.path} ({size} bytes, {time.monotonic() - start:.2f}s)")
+                return result
+            finally:
+                if reusable:
+                    self._release_connection(scheme, host, port, conn)
+                else:
+                    conn.close()
+        raise FetchError(f"More than {MAX_REDIRECTS} redirects")
+
+    def _stream(self, response, directory, max_bytes, finish):
+        # Written in chunks to a temporary file in the destination directory, hashed on the way
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".fetch_")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    try:
+                        chunk = response.read(CHUNK_SIZE)
+                    except (OSError, http.client.HTTPException) as e:
+                        raise _Retry(f"{type(e).__name__}: {e}")
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise FetchError(f"Download exceeds the {int(max_bytes)} byte limit")
+                    digest.update(chunk)
+                    f.write(chunk)
+            if not size:
+                raise FetchError("Empty response body")
+            return finish(tmp_path, digest.hexdigest()), size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
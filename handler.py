@@ -1,15 +1,37 @@
 import runpod
-from runpod.serverless.utils import rp_upload
 import os
-import websocket
 import base64
-import json
 import uuid
 import logging
-import urllib.request
-import urllib.parse
 import binascii
+import math
 import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from comfy_client import ComfyClient, ComfyAPIError
+from fetch import Fetcher, FetchError
+from lora_cache import LoraCache, LoraCacheError
+from encoding import (PROFILES, EncodingError, parse_encoding, apply_encoding, applied_encoding, estimate_size,
+                      transcode)
+from inputs import InputImageError, prepare_image, ingest_bytes, ingest_path, collect_garbage
+from metrics import Timings, record_job, loggable_input, start_metrics_server
+from progress import ExecutionTracker, ExecutionError, JobAborted
+from outputs import video_files, deliver_video, default_output_mode, file_sha256, OUTPUT_MODES
+from pipelines import (PIPELINES, PipelineError, parse_loras, expand_variations, select_pipeline,
+                       resolve_template, apply_bindings, apply_loras, bound_value, compile_plan, validate_job,
+                       set_object_info, draft_params, scale_step_splits, apply_last_frame, frame_rate,
+                       add_last_frame_output, graph_value, lora_files, fit_step_splits)
+from schema import load_object_info
+from shapes import (SHAPE_BUCKETS, LENGTH_BUCKETS, SHAPE_PARAMS, BUCKETS, ShapeScheduler, parse_resolutions,
+                    parse_lengths, snap_shape, is_compiled)
+from segments import SEGMENT_LENGTH, SegmentError, plan_segments, stitch
+from speed import SPEED_PRESET, SpeedError, resolve_speed, check_speed, speed_params, apply_speed
+from result_cache import result_cache_from_env, result_key
+from text_cache import inject_text_cache, text_cache_stats
+from warm import canonicalize_loaders, loader_cache_report, warmup_job
+from workflows import dumps
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
@@ -17,349 +39,676 @@ logger = logging.getLogger(__name__)
 
 server_address = os.getenv('SERVER_ADDRESS', '127.0.0.1')
 client_id = str(uuid.uuid4())
+comfy_port = int(os.getenv('COMFYUI_PORT', '8188'))
+COMFY_READY_TIMEOUT = float(os.getenv('COMFY_READY_TIMEOUT', '180'))
+# PID of the ComfyUI server started by entrypoint.sh; readiness gives up early if it exits
+COMFYUI_PID = int(os.getenv('COMFYUI_PID', '0')) or None
+PROGRESS_INTERVAL = float(os.getenv('PROGRESS_INTERVAL', '1.0'))
+
+# Process-wide connection manager: pooled HTTP keep-alive plus one WebSocket bound to client_id
+comfy = ComfyClient(server_address, comfy_port, client_id)
+
+# Pooled downloader with a local content cache for `image_url` / `last_image_url`
+fetcher = Fetcher()
+# Per-job LoRAs copied from the network volume or downloaded into a capped local cache
+lora_cache = LoraCache(fetcher=fetcher)
+
+# Job parameters routed through each pipeline's binding map
+BOUND_PARAMS = ["prompt", "negative_prompt", "seed", "cfg", "width", "height", "length", "steps"]
+COMFYUI_INPUT_DIR = os.getenv('COMFYUI_INPUT_DIR', '/ComfyUI/input')
+# Warm model mode: canonical loader inputs, no unload after each run, one warm-up job at boot
+WARM_MODELS = os.getenv('WARM_MODELS', '').lower() in ('1', 'true', 'yes')
+WARMUP_WORKFLOW = os.getenv('WARMUP_WORKFLOW') or None
+# Route text encoding through the CachedCLIPTextEncode custom node (custom_nodes/wan_text_cache)
+TEXT_CACHE = os.getenv('TEXT_CACHE', '').lower() in ('1', 'true', 'yes')
+DEBUG_WORKFLOW_DUMP = os.getenv('DEBUG_WORKFLOW_DUMP', '').lower() in ('1', 'true', 'yes')
+# Finished videos keyed by patched graph and image content (None when RESULT_CACHE_MB=0)
+result_cache = result_cache_from_env()
+# Jobs RunPod hands to this worker at once; their CPU-side stages overlap GPU execution of others
+MAX_CONCURRENCY = int(os.getenv('MAX_CONCURRENCY', '3'))
+# Prompts allowed in ComfyUI's queue at once: one executing plus one ready to start right after it
+MAX_QUEUED_PROMPTS = int(os.getenv('MAX_QUEUED_PROMPTS', '2'))
+# Slots go to jobs of the shape that ran last first, so compiled graphs are not recompiled for every job
+scheduler = ShapeScheduler(MAX_QUEUED_PROMPTS)
+# Requested sizes and frame counts snap to these buckets (empty: jobs keep their exact shape)
+RESOLUTION_BUCKETS = parse_resolutions(SHAPE_BUCKETS)
+FRAME_BUCKETS = parse_lengths(LENGTH_BUCKETS)
+# Largest number of videos one job may request through `seeds` / `prompts`
+MAX_BATCH_ITEMS = int(os.getenv('MAX_BATCH_ITEMS', '16'))
+# Progressive jobs first render a draft this much smaller, with at most this many frames and steps
+PREVIEW_SCALE = float(os.getenv('PREVIEW_SCALE', '0.5'))
+PREVIEW_LENGTH = int(os.getenv('PREVIEW_LENGTH', '17'))
+PREVIEW_STEPS = int(os.getenv('PREVIEW_STEPS', '4'))
+# Deadline for a whole job (jobs may lower or raise it with `timeout`); its prompt is interrupted when it passes
+JOB_TIMEOUT = float(os.getenv('JOB_TIMEOUT', '1800'))
+# Seconds without a WebSocket event before the prompt's history is polled, in case the final event was lost
+HISTORY_FALLBACK_INTERVAL = float(os.getenv('HISTORY_FALLBACK_INTERVAL', '15'))
+# How often a waiting job checks its deadline and cancellation flag
+ABORT_CHECK_INTERVAL = 1.0
 
-def save_data_if_base64(data_input, temp_dir, output_filename):
+def get_image(filename, subfolder, folder_type):
+    logger.info(f"Getting image from: {comfy.base_url}/view")
+    return comfy.get_image(filename, subfolder, folder_type)
+
+def check_abort(deadline, cancel):
+    """Raise JobAborted once the job's deadline has passed or it was cancelled"""
+    if cancel is not None and cancel.is_set():
+        raise JobAborted("Job was cancelled")
+    if deadline is not None and time.monotonic() >= deadline:
+        raise JobAborted("Job exceeded its deadline")
+
+def wait_slice(deadline):
+    """Seconds to block before checking the deadline and cancellation again"""
+    if deadline is None:
+        return ABORT_CHECK_INTERVAL
+    return max(0.0, min(ABORT_CHECK_INTERVAL, deadline - time.monotonic()))
+
+def follow_execution(client, prompt_id, events, tracker, deadline=None, cancel=None):
+    """Consume a prompt's events until it finishes; returns its history when that had to be polled instead"""
+    last_event = time.monotonic()
+    while True:
+        check_abort(deadline, cancel)
+        try:
+            message = events.get(timeout=wait_slice(deadline))
+        except queue.Empty:
+            if time.monotonic() - last_event < HISTORY_FALLBACK_INTERVAL:
+                continue
+            # A silent socket may have lost the terminal event: ask the history whether the prompt is done
+            last_event = time.monotonic()
+            history = client.get_history(prompt_id).get(prompt_id)
+            status = (history or {}).get('status') or {}
+            if status.get('completed'):
+                logger.warning(f"⚠️ Prompt {prompt_id} finished without a completion event; using its history")
+                return history
+            if status.get('status_str') == 'error':
+                raise ExecutionError(f"Prompt {prompt_id} failed (reported by history)")
+            continue
+        last_event = time.monotonic()
+        if message is None:
+            raise ConnectionError("Lost the ComfyUI WebSocket while waiting for execution events")
+        if tracker.handle(message):
+            return None
+
+def get_videos(client, prompt, tracker=None, timings=None, deadline=None, cancel=None):
+    """Queue a prompt, follow its execution on the shared socket and return output file paths.
+
+    Past ``deadline`` (a time.monotonic() value) or once ``cancel`` is set, the prompt is removed
+    from ComfyUI's queue or interrupted and JobAborted is raised.
     """
-    Check if input data is Base64 string and save as file, otherwise return as path.
+    tracker = tracker or ExecutionTracker(prompt)
+    timings = timings or Timings()
+    logger.info(f"Queueing prompt to: {client.base_url}/prompt")
+    try:
+        with timings.stage("queue"):
+            prompt_id = client.queue_prompt(dumps(prompt))['prompt_id']
+    except ComfyAPIError as e:
+        logger.error(f"HTTP Error {e.status}: {e.body}")
+        raise
+    tracker.prompt_id = prompt_id
+    tracker.started = time.monotonic()
+    # Events arrive through the client's dispatcher, so concurrent jobs can share one socket
+    events = client.subscribe(prompt_id)
+    try:
+        with timings.stage("execution"):
+            history = follow_execution(client, prompt_id, events, tracker, deadline, cancel)
+    except JobAborted:
+        try:
+            interrupted = client.cancel_prompt(prompt_id)
+            logger.warning(f"🛑 Prompt {prompt_id} {'interrupted' if interrupted else 'removed from the queue'}")
+        except Exception as e:
+            logger.error(f"Could not cancel prompt {prompt_id}: {e}")
+        raise
+    finally:
+        client.unsubscribe(prompt_id)
+
+    if history is None:
+        with timings.stage("history_fetch"):
+            history = client.get_history(prompt_id)[prompt_id]
+    tracker.outputs = history['outputs']
+    return video_files(history)
+
+def progress_notifier(job):
+    """Forward progress payloads to RunPod for real jobs; no-op for local calls without an id"""
+    if not job.get("id"):
+        return None
+    return lambda payload: runpod.serverless.progress_update(job, payload)
+
+def build_graph(template, pipeline_name, params, loras, image_filename, encoding=None, full_steps=None,
+                save_last_frame=False):
+    """Patch a template with one item's parameters and return the materialized API graph.
+
+    Step boundaries (e.g. the high/low-noise handover) keep the template's share of the steps.
+    ``full_steps`` marks a draft: step boundaries are rescaled from that many steps to ``params["steps"]``.
+    ``save_last_frame`` adds SaveImage outputs for the last frame of each video (to chain segments).
     """
-    if not isinstance(data_input, str):
-        return data_input
+    prompt = template.overlay()
+    apply_bindings(prompt, pipeline_name, dict(params, image=image_filename))
+    # Boundaries follow the full render's steps; a draft rescales them below
+    fit_step_splits(prompt, pipeline_name, full_steps or params.get("steps"))
+    apply_loras(prompt, pipeline_name, loras)
+    apply_speed(prompt, pipeline_name, params.get("speed"))
+    if params.get("last_image"):
+        apply_last_frame(prompt, pipeline_name, params["last_image"])
+    apply_encoding(prompt, encoding)
+    if full_steps is not None:
+        scale_step_splits(prompt, pipeline_name, full_steps, params.get("steps"))
+    if save_last_frame:
+        add_last_frame_output(prompt, pipeline_name, "segments/last_frame")
+    if WARM_MODELS:
+        canonicalize_loaders(prompt)
+    if TEXT_CACHE:
+        inject_text_cache(prompt)
+    logger.info(f"Configured workflow '{pipeline_name}' with: prompt='{str(params.get('prompt'))[:50]}...', seed={params.get('seed')}, cfg={params.get('cfg')}, size={params.get('width')}x{params.get('height')}, length={params.get('length')}, steps={params.get('steps')}, loras={len(loras)}")
+    return prompt.materialize()
+
+def gpu_stats():
+    """Fresh /system_stats (free VRAM changes between jobs), falling back to the copy taken at boot"""
+    try:
+        return comfy.get_system_stats()
+    except (OSError, ComfyAPIError, ValueError) as e:
+        logger.warning(f"⚠️ /system_stats failed ({e}); using the boot-time figures")
+        return comfy.system_stats
 
+def ingest_image(source, target, link=False):
+    """Validate and downsample an image (bytes or file path) and place it in ComfyUI's input directory.
+
+    With ``link`` an image that needs no resizing is linked into place instead of copied.
+    """
+    data, image_size = prepare_image(source, *target)
+    if data is None and link:
+        return ingest_path(source, COMFYUI_INPUT_DIR), image_size
+    if data is None and not isinstance(source, bytes):
+        with open(source, 'rb') as f:
+            data = f.read()
+    return ingest_bytes(source if data is None else data, COMFYUI_INPUT_DIR), image_size
+
+
+def acquire_slot(deadline=None, cancel=None, shape=None, compiled=False):
+    """Take a ComfyUI queue slot, giving up when the job's deadline passes or it is cancelled"""
+    scheduler.acquire(shape, compiled, lambda: check_abort(deadline, cancel), ABORT_CHECK_INTERVAL)
+
+def reencode(path, settings, timings):
+    """Apply encoding settings the graph could not; the original video is kept if ffmpeg fails"""
     try:
-        decoded_data = base64.b64decode(data_input)
-        os.makedirs(temp_dir, exist_ok=True)
-        file_path = os.path.abspath(os.path.join(temp_dir, output_filename))
-        with open(file_path, 'wb') as f:
-            f.write(decoded_data)
-        logger.info(f"✅ Base64 input saved to '{file_path}'")
-        return file_path
-    except (binascii.Error, ValueError):
-        logger.info(f"➡️ '{data_input}' treated as file path")
-        return data_input
-    
-def queue_prompt(prompt):
-    url = f"http://{server_address}:8188/prompt"
-    logger.info(f"Queueing prompt to: {url}")
-    p = {"prompt": prompt, "client_id": client_id}
-    data = json.dumps(p).encode('utf-8')
-    req = urllib.request.Request(url, data=data)
-    req.add_header('Content-Type', 'application/json')
+        with timings.stage("transcode"):
+            return transcode(path, settings), None
+    except Exception as e:
+        logger.warning(f"⚠️ Re-encoding failed, delivering the original video: {e}")
+        return path, f"Re-encoding failed, original encoding delivered: {e}"
 
+def render(job, prompt, pipeline_name, output_mode, image_filename, task_id, notify=None, timings=None,
+           deadline=None, cancel=None, transcode_settings=None, on_output=None):
+    """Run one patched graph, or serve it from the result cache, and deliver its video.
+
+    ``on_output(path, node_id, outputs)`` sees the local video file and the prompt's history
+    outputs before delivery; such renders bypass the result cache, which keeps only the video.
+    """
+    job_input = job.get("input", {})
+    timings = timings or Timings()
+    job_id = job.get("id", task_id)
+
+    # Save converted workflow for debugging (opt-in, keeps disk I/O off the hot path)
+    if DEBUG_WORKFLOW_DUMP:
+        debug_workflow_path = f"/tmp/converted_workflow_{task_id}.json"
+        try:
+            with open(debug_workflow_path, 'w') as f:
+                f.write(dumps(prompt, indent=2))
+            logger.info(f"Saved converted workflow to {debug_workflow_path}")
+        except Exception as e:
+            logger.warning(f"Could not save debug workflow: {e}")
+
+    # Identical graph and image content produce the same video, so a cached result skips ComfyUI entirely
+    cache_key = None
+    if result_cache is not None and on_output is None:
+        with timings.stage("cache_lookup"):
+            image_sha256 = file_sha256(os.path.join(COMFYUI_INPUT_DIR, image_filename))
+            cache_key = result_key(prompt, image_filename, image_sha256, transcode_settings)
+            hit = result_cache.get(cache_key) if job_input.get("cache", True) is not False else None
+        if hit is not None:
+            cached_path, cached_meta = hit
+            logger.info(f"♻️ Result cache hit {cache_key[:12]} for workflow '{pipeline_name}'")
+            try:
+                with timings.stage("output"):
+                    result = deliver_video(cached_path, output_mode, job_id, job.get("s3Config"))
+            except Exception as e:
+                logger.error(f"❌ Cached result delivery failed: {e}")
+                return {"error": f"Video delivery failed: {e}"}
+            result["workflow"] = pipeline_name
+            result["cached"] = True
+            return result
+
+    # Readiness is checked once per worker; later jobs reuse the open connections
+    with timings.stage("readiness_wait"):
+        ready = comfy.wait_until_ready(timeout=COMFY_READY_TIMEOUT, process_id=COMFYUI_PID)
+    if not ready:
+        return {"error": "Cannot connect to ComfyUI server. Please check if server is running."}
+
+    # Generate video; waiting for a slot keeps ComfyUI's queue short while other jobs execute
+    tracker = ExecutionTracker(prompt, notify=notify, min_interval=PROGRESS_INTERVAL)
     try:
-        response = urllib.request.urlopen(req)
-        response_data = response.read()
-        return json.loads(response_data)
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8')
-        logger.error(f"HTTP Error {e.code}: {error_body}")
-        raise Exception(f"ComfyUI API Error {e.code}: {error_body}")
+        admission_start = time.monotonic()
+        shape = (pipeline_name,) + tuple(graph_value(prompt, pipeline_name, param) for param in SHAPE_PARAMS)
+        acquire_slot(deadline, cancel, shape, is_compiled(prompt))
+        try:
+            admission_wait = time.monotonic() - admission_start
+            timings.add("admission_wait", admission_wait)
+            if admission_wait > 0.01:
+                logger.info(f"⏳ Waited {admission_wait:.2f}s for a ComfyUI queue slot")
+            videos = get_videos(comfy, prompt, tracker, timings, deadline, cancel)
+        finally:
+            scheduler.release()
+        node_timings = tracker.summary()
+        logger.info(f"Execution finished in {node_timings['total_seconds']}s: {node_timings['by_class']}")
+
+        # Return first video found; only that file is read, uploaded or encoded
+        for node_id in videos:
+            if videos[node_id]:
+                logger.info(f"Found video output from node {node_id}")
+                path, warning = videos[node_id][0], None
+                if transcode_settings:
+                    path, warning = reencode(path, transcode_settings, timings)
+                if on_output is not None:
+                    on_output(path, node_id, tracker.outputs)
+                with timings.stage("output"):
+                    result = deliver_video(path, output_mode, job_id, job.get("s3Config"))
+                result["workflow"] = pipeline_name
+                result["cached"] = False
+                if warning:
+                    result["encoding_warning"] = warning
+                elif cache_key is not None:
+                    result_cache.put(cache_key, path, {
+                        "workflow": pipeline_name, "size": result["size"], "sha256": result["sha256"]})
+                result["node_timings"] = node_timings
+                result["loader_cache"] = loader_cache_report(prompt, node_timings["cached_nodes"])
+                if TEXT_CACHE:
+                    result["text_cache"] = text_cache_stats(prompt, tracker.outputs, node_timings["cached_nodes"])
+                return result
+
+        return {"error": "No video output found in any node", "node_timings": node_timings}
+
+    except JobAborted as e:
+        logger.warning(f"🛑 {e}")
+        return {"error": str(e), "aborted": True, "node_timings": tracker.summary()}
     except Exception as e:
-        logger.error(f"Failed to queue prompt: {e}")
-        raise
+        logger.error(f"Error during video generation: {e}")
+        return {"error": f"Video generation failed: {e}", "node_timings": tracker.summary()}
+
+def render_preview(job, template, pipeline_name, params, loras, image_filename, sizing, output_mode, task_id,
+                   notify, deadline, cancel):
+    """Render and deliver a cheap draft of the job's graph; the result is also pushed as a progress update"""
+    draft = draft_params(sizing, pipeline_name, PREVIEW_SCALE, PREVIEW_LENGTH, PREVIEW_STEPS)
+    timings = Timings()
+    with timings.stage("graph_patch"):
+        # Same seed and prompt as the full render; only size, frames, steps and encoding differ
+        prompt = build_graph(template, pipeline_name, dict(params, **draft), loras, image_filename,
+                             PROFILES["preview"], bound_value(sizing, pipeline_name, "steps"))
+    preview = render(job, prompt, pipeline_name, output_mode, image_filename, f"{task_id}_preview", None, timings,
+                     deadline, cancel)
+    preview.update(draft, timings=timings.summary())
+    if "error" in preview:
+        logger.warning(f"⚠️ Preview failed, continuing with the full render: {preview['error']}")
+    else:
+        logger.info(f"👀 Preview ready in {preview['timings']['total']}s")
+        if notify is not None:
+            notify(dict(preview, status="preview"))
+    return preview
+
+def last_frame_image(prompt, video_node, outputs):
+    """Fetch the last frame saved next to a video output and store it as a ComfyUI input image"""
+    # SaveVideo outputs are fed by the CreateVideo node that received the frames
+    source = prompt[video_node]["inputs"].get("video")
+    candidates = [f"{video_node}_last_frame"]
+    if isinstance(source, (list, tuple)):
+        candidates.insert(0, f"{source[0]}_last_frame")
+    candidates += [n for n in outputs if n.endswith("_last_frame")]
+    for node_id in candidates:
+        images = (outputs.get(node_id) or {}).get("images")
+        if images:
+            image = images[-1]
+            data = get_image(image["filename"], image.get("subfolder", ""), image.get("type", "output"))
+            return ingest_bytes(data, COMFYUI_INPUT_DIR)
+    raise RuntimeError("The segment produced no last frame image")
+
+
+def render_segments(job, template, pipeline_name, params, loras, image_filename, plan, output_mode, task_id,
+                    notify, timings, deadline, cancel, encoding, transcode_settings):
+    """Render a long video as a chain of segments, each starting on the last frame of the one before.
+
+    Every finished segment is delivered at once as a progress update; the segments are then
+    joined by stream copy.
+    """
+    job_id = job.get("id", task_id)
+    base_seed = params.get("seed")
+    if base_seed is None:
+        base_seed = bound_value(template.overlay(), pipeline_name, "seed")
+    segments, paths = [], []
+    start_image = image_filename
+    for index, length in enumerate(plan):
+        final = index == len(plan) - 1
+        segment_params = dict(params, length=length)
+        if isinstance(base_seed, int) and not isinstance(base_seed, bool):
+            # A fresh seed per segment avoids repeating the same motion; the sequence stays reproducible
+            segment_params["seed"] = base_seed + index
+        if not final:
+            # `last_image_url` is the end frame of the whole clip, so only the final segment gets it
+            segment_params.pop("last_image", None)
+        segment_timings = Timings()
+        with segment_timings.stage("graph_patch"):
+            prompt = build_graph(template, pipeline_name, segment_params, loras, start_image, encoding,
+                                 save_last_frame=not final)
+        produced = {}
+        result = render(job, prompt, pipeline_name, output_mode, start_image, f"{task_id}_segment{index}",
+                        segment_notifier(notify, index, len(plan)), segment_timings, deadline, cancel,
+                        transcode_settings, on_output=lambda path, node_id, outputs: produced.update(
+                            path=path, node_id=node_id, outputs=outputs))
+        result.update(index=index, length=length, seed=segment_params.get("seed"),
+                      timings=segment_timings.summary())
+        if "error" in result:
+            return dict(result, error=f"Segment {index + 1}/{len(plan)} failed: {result['error']}",
+                        segments=segments)
+        logger.info(f"🎞️ Segment {index + 1}/{len(plan)} ready ({length} frames)")
+        if notify is not None:
+            notify(dict(result, status="segment", segments=len(plan)))
+        # Inline videos already went out with the progress update; the final result keeps their metadata
+        segments.append({k: v for k, v in result.items() if k != "video"})
+        paths.append(produced["path"])
+        if not final:
+            try:
+                start_image = last_frame_image(prompt, produced["node_id"], produced["outputs"])
+            except Exception as e:
+                return {"error": f"Cannot chain segment {index + 2}: {e}", "segments": segments}
 
-def get_image(filename, subfolder, folder_type):
-    url = f"http://{server_address}:8188/view"
-    logger.info(f"Getting image from: {url}")
-    data = {"filename": filename, "subfolder": subfolder, "type": folder_type}
-    url_values = urllib.parse.urlencode(data)
-    with urllib.request.urlopen(f"{url}?{url_values}") as response:
-        return response.read()
-
-def get_history(prompt_id):
-    url = f"http://{server_address}:8188/history/{prompt_id}"
-    logger.info(f"Getting history from: {url}")
-    with urllib.request.urlopen(url) as response:
-        return json.loads(response.read())
-
-def get_videos(ws, prompt):
-    prompt_id = queue_prompt(prompt)['prompt_id']
-    output_videos = {}
-    while True:
-        out = ws.recv()
-        if isinstance(out, str):
-            message = json.loads(out)
-            if message['type'] == 'executing':
-                data = message['data']
-                if data['node'] is None and data['prompt_id'] == prompt_id:
-                    break
+    try:
+        if len(paths) == 1:
+            path = paths[0]
         else:
-            continue
+            with timings.stage("stitch"):
+                extension = os.path.splitext(paths[0])[1] or ".mp4"
+                path = stitch(paths, os.path.join(os.path.dirname(paths[0]), f"{task_id}_stitched{extension}"))
+        with timings.stage("output"):
+            result = deliver_video(path, output_mode, job_id, job.get("s3Config"))
+    except Exception as e:
+        logger.error(f"Stitching segments failed: {e}")
+        return {"error": f"Stitching segments failed: {e}", "segments": segments}
+    result.update(workflow=pipeline_name, cached=False, length=sum(plan), segments=segments)
+    return result
 
-    history = get_history(prompt_id)[prompt_id]
-    for node_id in history['outputs']:
-        node_output = history['outputs'][node_id]
-        videos_output = []
-
-        # Check for different video output formats
-        if 'gifs' in node_output:
-            for video in node_output['gifs']:
-                with open(video['fullpath'], 'rb') as f:
-                    video_data = base64.b64encode(f.read()).decode('utf-8')
-                videos_output.append(video_data)
-        elif 'videos' in node_output:
-            for video in node_output['videos']:
-                with open(video['fullpath'], 'rb') as f:
-                    video_data = base64.b64encode(f.read()).decode('utf-8')
-                videos_output.append(video_data)
-        elif 'mp4' in node_output:
-            for video in node_output['mp4']:
-                with open(video['fullpath'], 'rb') as f:
-                    video_data = base64.b64encode(f.read()).decode('utf-8')
-                videos_output.append(video_data)
-
-        if videos_output:
-            output_videos[node_id] = videos_output
-
-    return output_videos
-
-def load_workflow(workflow_path):
-    """Load and convert ComfyUI workflow to API format"""
-    with open(workflow_path, 'r') as file:
-        workflow_data = json.load(file)
-
-    # Convert ComfyUI export format to API format
-    if 'nodes' in workflow_data:
-        # This is a ComfyUI export format, convert to API format
-        api_workflow = {}
-        for node in workflow_data['nodes']:
-            node_id = str(node['id'])
-            api_workflow[node_id] = {
-                'class_type': node['type'],
-                'inputs': {}
-            }
-
-            # Convert inputs
-            if 'inputs' in node:
-                for input_item in node['inputs']:
-                    input_name = input_item['name']
-                    if input_item.get('link') is not None:
-                        # This input is connected to another node
-                        # Find the source node and output
-                        link_id = input_item['link']
-                        for link in workflow_data.get('links', []):
-                            if link[0] == link_id:
-                                source_node_id = str(link[1])
-                                source_output_index = link[2]
-                                api_workflow[node_id]['inputs'][input_name] = [source_node_id, source_output_index]
-                                break
-
-            # Add widget values as inputs
-            if 'widgets_values' in node:
-                # Map widget values to input names based on node type
-                if node['type'] == 'CLIPTextEncode' and len(node['widgets_values']) > 0:
-                    api_workflow[node_id]['inputs']['text'] = node['widgets_values'][0]
-                elif node['type'] == 'LoadImage' and len(node['widgets_values']) > 0:
-                    api_workflow[node_id]['inputs']['image'] = node['widgets_values'][0]
-                elif node['type'] == 'WanImageToVideo' and len(node['widgets_values']) >= 4:
-                    api_workflow[node_id]['inputs']['width'] = node['widgets_values'][0]
-                    api_workflow[node_id]['inputs']['height'] = node['widgets_values'][1]
-                    api_workflow[node_id]['inputs']['length'] = node['widgets_values'][2]
-                    api_workflow[node_id]['inputs']['batch_size'] = node['widgets_values'][3]
-                elif node['type'] == 'KSamplerAdvanced' and len(node['widgets_values']) >= 10:
-                    api_workflow[node_id]['inputs']['add_noise'] = node['widgets_values'][0]
-                    api_workflow[node_id]['inputs']['noise_seed'] = node['widgets_values'][1]
-                    api_workflow[node_id]['inputs']['steps'] = node['widgets_values'][3]
-                    api_workflow[node_id]['inputs']['cfg'] = node['widgets_values'][4]
-                    api_workflow[node_id]['inputs']['sampler_name'] = node['widgets_values'][5]
-                    api_workflow[node_id]['inputs']['scheduler'] = node['widgets_values'][6]
-                    api_workflow[node_id]['inputs']['start_at_step'] = node['widgets_values'][7]
-                    api_workflow[node_id]['inputs']['end_at_step'] = node['widgets_values'][8]
-                    api_workflow[node_id]['inputs']['return_with_leftover_noise'] = node['widgets_values'][9]
-                elif node['type'] in ['UNETLoader', 'VAELoader', 'CLIPLoader'] and len(node['widgets_values']) > 0:
-                    # Model loaders - use first widget value as model name
-                    if node['type'] == 'UNETLoader':
-                        api_workflow[node_id]['inputs']['unet_name'] = node['widgets_values'][0]
-                        if len(node['widgets_values']) > 1:
-                            api_workflow[node_id]['inputs']['weight_dtype'] = node['widgets_values'][1]
-                    elif node['type'] == 'VAELoader':
-                        api_workflow[node_id]['inputs']['vae_name'] = node['widgets_values'][0]
-                    elif node['type'] == 'CLIPLoader':
-                        api_workflow[node_id]['inputs']['clip_name'] = node['widgets_values'][0]
-                        if len(node['widgets_values']) > 1:
-                            api_workflow[node_id]['inputs']['type'] = node['widgets_values'][1]
-                        if len(node['widgets_values']) > 2:
-                            api_workflow[node_id]['inputs']['device'] = node['widgets_values'][2]
-                elif node['type'] == 'LoraLoaderModelOnly' and len(node['widgets_values']) >= 2:
-                    api_workflow[node_id]['inputs']['lora_name'] = node['widgets_values'][0]
-                    api_workflow[node_id]['inputs']['strength_model'] = node['widgets_values'][1]
-                elif node['type'] == 'ModelSamplingSD3' and len(node['widgets_values']) > 0:
-                    api_workflow[node_id]['inputs']['shift'] = node['widgets_values'][0]
-                elif node['type'] == 'CreateVideo' and len(node['widgets_values']) > 0:
-                    api_workflow[node_id]['inputs']['fps'] = node['widgets_values'][0]
-                elif node['type'] == 'SaveVideo' and len(node['widgets_values']) >= 3:
-                    api_workflow[node_id]['inputs']['filename_prefix'] = node['widgets_values'][0]
-                    api_workflow[node_id]['inputs']['format'] = node['widgets_values'][1]
-                    api_workflow[node_id]['inputs']['codec'] = node['widgets_values'][2]
-
-        return api_workflow
-    else:
-        # Already in API format
-        return workflow_data
 
-def handler(job):
+def segment_notifier(notify, index, count):
+    """Tag progress payloads with the segment they belong to"""
+    if notify is None:
+        return None
+    return lambda payload: notify(dict(payload, segment=index, segments=count))
+
+
+def item_notifier(notify, index):
+    """Tag progress payloads with the batch item they belong to"""
+    if notify is None:
+        return None
+    return lambda payload: notify(dict(payload, item=index))
+
+def handler(job, cancel=None):
+    """Run one job and attach its stage timings; every outcome is counted in the metrics.
+
+    Setting the ``cancel`` event stops the job and frees ComfyUI of its prompt.
+    """
+    timings = Timings()
+    # LoRA files the job pinned in the local cache; unpinned once it finishes, however it ends
+    pinned = []
+    try:
+        return record_job(run_job(job, timings, cancel, pinned), timings)
+    finally:
+        lora_cache.release(pinned)
+
+def run_job(job, timings, cancel=None, pinned=None):
     job_input = job.get("input", {})
-    logger.info(f"Received job input: {job_input}")
+    # Base64 images and long prompts would flood the log, and credentials must not reach it
+    logger.info(f"Received job input: {loggable_input(job_input)}")
     task_id = f"task_{uuid.uuid4()}"
 
-    # Handle image input (Base64 or path)
-    image_path_input = job_input.get("image_path")
-    image_base64_input = job_input.get("image_base64")
+    timeout = job_input.get("timeout", JOB_TIMEOUT)
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0:
+        return {"error": f"Invalid timeout '{timeout}', expected a positive number of seconds"}
+    deadline = time.monotonic() + timeout
 
-    if image_path_input:
-        image_path = image_path_input
-    elif image_base64_input:
-        try:
-            os.makedirs(task_id, exist_ok=True)
-            image_path = os.path.join(task_id, "input_image.jpg")
-            decoded_data = base64.b64decode(image_base64_input)
-            with open(image_path, 'wb') as f:
-                f.write(decoded_data)
-            logger.info(f"Base64 image saved to '{image_path}'")
-        except Exception as e:
-            return {"error": f"Base64 image decoding failed: {e}"}
-    else:
-        return {"error": "Either image_path or image_base64 must be provided"}
-
-    # Load the specific Wan2.2 I2V workflow
-    workflow_file = "/video_wan2_2_14B_i2v.json"
-    fallback_workflow = "/test_simple_workflow.json"
+    output_mode = job_input.get("output_mode") or default_output_mode()
+    if output_mode not in OUTPUT_MODES:
+        return {"error": f"Invalid output_mode '{output_mode}', expected one of {', '.join(OUTPUT_MODES)}"}
+    try:
+        encoding = parse_encoding(job_input.get("encoding"))
+    except EncodingError as e:
+        return {"error": str(e)}
 
+    # Select the pipeline (graph + binding map) before touching any input files
     try:
-        logger.info(f"Attempting to load workflow: {workflow_file}")
-        prompt = load_workflow(workflow_file)
-        logger.info(f"Loaded workflow with {len(prompt)} nodes")
+        with timings.stage("workflow_load"):
+            loras = parse_loras(job_input.get("loras"))
+            variations = expand_variations(job_input, MAX_BATCH_ITEMS)
+            pipeline_name = select_pipeline(job_input.get("workflow"), len(loras))
+            template = resolve_template(pipeline_name)
+    except PipelineError as e:
+        return {"error": str(e)}
+    logger.info(f"Using workflow '{template.name}' with {len(template)} nodes")
 
-    except Exception as e:
-        logger.error(f"Failed to load main workflow: {e}")
-        logger.info(f"Trying fallback workflow: {fallback_workflow}")
-        try:
-            prompt = load_workflow(fallback_workflow)
-            logger.info(f"Loaded fallback workflow with {len(prompt)} nodes")
-        except Exception as e2:
-            logger.error(f"Failed to load fallback workflow: {e2}")
-            return {"error": f"Failed to load any workflow. Main: {e}, Fallback: {e2}"}
-
-    # Save converted workflow for debugging
-    debug_workflow_path = f"/tmp/converted_workflow_{task_id}.json"
+    image_path_input = job_input.get("image_path")
+    image_base64_input = job_input.get("image_base64")
+    image_url_input = job_input.get("image_url")
+    last_image_url = job_input.get("last_image_url")
+    if not image_path_input and not image_base64_input and not image_url_input:
+        return {"error": "One of image_path, image_base64 or image_url must be provided"}
+    if last_image_url and not PIPELINES[pipeline_name]["last_frame"]:
+        return {"error": f"Workflow '{pipeline_name}' has no last frame input; use a first/last-frame workflow "
+                         f"such as 'wan22' for last_image_url"}
+    progressive = job_input.get("progressive") is True
+    if progressive and variations is not None:
+        return {"error": "'progressive' cannot be combined with 'seeds' or 'prompts'"}
+
+    # Speed presets tune the graph's step count, EasyCache, CFG window and model unloading;
+    # "auto" sizes the memory settings to the GPU's VRAM as reported by ComfyUI
+    speed_input = job_input.get("speed")
+    if speed_input is None and PIPELINES[pipeline_name]["speed"]:
+        speed_input = SPEED_PRESET or None
     try:
-        with open(debug_workflow_path, 'w') as f:
-            json.dump(prompt, f, indent=2)
-        logger.info(f"Saved converted workflow to {debug_workflow_path}")
-    except Exception as e:
-        logger.warning(f"Could not save debug workflow: {e}")
-
-    # Get parameters from input
-    positive_prompt = job_input.get("prompt", "A beautiful scene with natural motion")
-    negative_prompt = job_input.get("negative_prompt", "bad quality, static, blurry")
-    seed = job_input.get("seed", 42)
-    cfg = job_input.get("cfg", 7.5)
-    width = job_input.get("width", 640)
-    height = job_input.get("height", 640)
-    length = job_input.get("length", 81)
-    steps = job_input.get("steps", 20)
-
-    # Configure workflow parameters based on video_wan2_2_14B_i2v.json structure
-    # Copy image to ComfyUI input directory so it can be found
-    import shutil
-    comfyui_input_dir = "/ComfyUI/input"
-    os.makedirs(comfyui_input_dir, exist_ok=True)
-    image_filename = os.path.basename(image_path)
-    comfyui_image_path = os.path.join(comfyui_input_dir, image_filename)
-    shutil.copy2(image_path, comfyui_image_path)
-    logger.info(f"Copied image to ComfyUI input directory: {comfyui_image_path}")
-
-    # Image input nodes (LoadImage nodes: 62 and 97)
-    if "62" in prompt:
-        prompt["62"]["inputs"]["image"] = image_filename
-    if "97" in prompt:
-        prompt["97"]["inputs"]["image"] = image_filename
-
-    # Text encoding nodes (CLIPTextEncode nodes: 6, 7, 93, 89)
-    if "6" in prompt:  # Positive prompt for fp8_scaled workflow
-        prompt["6"]["inputs"]["text"] = positive_prompt
-    if "7" in prompt:  # Negative prompt for fp8_scaled workflow
-        prompt["7"]["inputs"]["text"] = negative_prompt
-    if "93" in prompt:  # Positive prompt for 4steps LoRA workflow
-        prompt["93"]["inputs"]["text"] = positive_prompt
-    if "89" in prompt:  # Negative prompt for 4steps LoRA workflow
-        prompt["89"]["inputs"]["text"] = negative_prompt
-
-    # WanImageToVideo nodes (63 and 98) - video parameters
-    if "63" in prompt:  # fp8_scaled workflow
-        prompt["63"]["inputs"]["width"] = width
-        prompt["63"]["inputs"]["height"] = height
-        prompt["63"]["inputs"]["length"] = length
-        prompt["63"]["inputs"]["batch_size"] = 1
-    if "98" in prompt:  # 4steps LoRA workflow
-        prompt["98"]["inputs"]["width"] = width
-        prompt["98"]["inputs"]["height"] = height
-        prompt["98"]["inputs"]["length"] = length
-        prompt["98"]["inputs"]["batch_size"] = 1
-
-    # KSamplerAdvanced nodes for sampling parameters
-    sampler_nodes = ["57", "58", "85", "86"]  # KSamplerAdvanced node IDs
-    for node_id in sampler_nodes:
-        if node_id in prompt:
-            # Update seed, steps, and cfg
-            if "noise_seed" in prompt[node_id]["inputs"]:
-                prompt[node_id]["inputs"]["noise_seed"] = seed
-            if "steps" in prompt[node_id]["inputs"]:
-                prompt[node_id]["inputs"]["steps"] = steps
-            if "cfg" in prompt[node_id]["inputs"]:
-                prompt[node_id]["inputs"]["cfg"] = cfg
-
-    logger.info(f"Configured workflow with: prompt='{positive_prompt[:50]}...', seed={seed}, cfg={cfg}, size={width}x{height}, length={length}, steps={steps}")
-
-    # Connect to ComfyUI WebSocket
-    ws_url = f"ws://{server_address}:8188/ws?clientId={client_id}"
-    logger.info(f"Connecting to WebSocket: {ws_url}")
-
-    # Check HTTP connection first
-    http_url = f"http://{server_address}:8188/"
-    logger.info(f"Checking HTTP connection to: {http_url}")
-
-    max_http_attempts = 180
-    for http_attempt in range(max_http_attempts):
+        speed = resolve_speed(speed_input, gpu_stats() if speed_input == "auto" else None, keep_loaded=WARM_MODELS)
+        check_speed(pipeline_name, speed)
+    except SpeedError as e:
+        return {"error": str(e)}
+
+    # Configure workflow parameters through the pipeline's compiled patch plan, rejecting values
+    # the graph cannot use before any input is decoded or GPU time is spent
+    params = dict(PIPELINES[pipeline_name]["defaults"])
+    params.update(speed_params(speed))
+    params.update({k: job_input[k] for k in BOUND_PARAMS if job_input.get(k) is not None})
+    # `duration` asks for a long video rendered as a chain of segments of `segment_length` frames
+    duration = job_input.get("duration")
+    if duration is not None:
+        if isinstance(duration, bool) or not isinstance(duration, (int, float)) or duration <= 0:
+            return {"error": f"Invalid duration '{duration}', expected a positive number of seconds"}
+        if variations is not None or progressive:
+            return {"error": "'duration' cannot be combined with 'seeds', 'prompts' or 'progressive'"}
+        params["length"] = job_input.get("segment_length") or SEGMENT_LENGTH
+    try:
+        plan = compile_plan(pipeline_name, template)
+        for variation in variations or [{}]:
+            validate_job(plan, dict(params, **variation))
+    except PipelineError as e:
+        return {"error": str(e)}
+    params["speed"] = speed
+    sizing = template.overlay()
+    apply_bindings(sizing, pipeline_name, params)
+    # Snap to the configured shape buckets so compiled graphs see few distinct shapes
+    requested = tuple(bound_value(sizing, pipeline_name, param) for param in SHAPE_PARAMS)
+    shape = snap_shape(requested, RESOLUTION_BUCKETS, FRAME_BUCKETS)
+    if RESOLUTION_BUCKETS or FRAME_BUCKETS:
+        BUCKETS.inc(result="hit" if shape == requested else "snapped")
+    else:
+        BUCKETS.inc(result="unbucketed")
+    bucket = None
+    if shape != requested:
+        logger.info(f"📦 Shape {requested} snapped to bucket {shape}")
+        bucket = {"requested": dict(zip(SHAPE_PARAMS, requested)), "used": dict(zip(SHAPE_PARAMS, shape))}
+        params.update((param, value) for param, value in zip(SHAPE_PARAMS, shape) if value is not None)
+        apply_bindings(sizing, pipeline_name, params)
+    plan = None
+    if duration is not None:
+        fps = (encoding or {}).get("fps") or frame_rate(sizing, pipeline_name) or 16
         try:
-            with urllib.request.urlopen(http_url, timeout=5) as response:
-                logger.info(f"HTTP connection successful (attempt {http_attempt+1})")
-                break
-        except Exception as e:
-            logger.warning(f"HTTP connection failed (attempt {http_attempt+1}/{max_http_attempts}): {e}")
-            if http_attempt == max_http_attempts - 1:
-                return {"error": "Cannot connect to ComfyUI server. Please check if server is running."}
-            time.sleep(1)
-
-    # Connect to WebSocket
-    ws = websocket.WebSocket()
-    max_attempts = int(180/5)  # 3 minutes
-    for attempt in range(max_attempts):
+            plan = plan_segments(math.ceil(duration * fps), params["length"])
+        except SegmentError as e:
+            return {"error": str(e)}
+        logger.info(f"🎞️ {duration}s at {fps} fps as {len(plan)} segments of {plan[0]} frames")
+
+    # Validate and downsample the image on the CPU before anything is queued, then place it in
+    # ComfyUI's input directory: stored once under a content hash, or linked when used unchanged
+    width, height = bound_value(sizing, pipeline_name, "width"), bound_value(sizing, pipeline_name, "height")
+    target = (None, None)
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) and v > 0 for v in (width, height)):
+        scale = PIPELINES[pipeline_name]["image_scale"]
+        target = (int(width * scale), int(height * scale))
+
+    # Encoding the save node cannot do itself is applied by ffmpeg after the render
+    transcode_settings = apply_encoding(sizing, encoding)
+    encoding_report = None
+    if encoding:
+        encoding_report = dict(applied_encoding(encoding, transcode_settings), transcoded=bool(transcode_settings))
+        length = sum(plan) if plan else bound_value(sizing, pipeline_name, "length")
+        if all(isinstance(v, int) for v in (width, height, length)):
+            encoding_report["estimated_size"] = estimate_size(width, height, length, encoding)
+    # Remote images (first and last frame) download in parallel over pooled connections
+    urls = [] if image_path_input or image_base64_input else [image_url_input]
+    urls += [last_image_url] if last_image_url else []
+    fetched = []
+    if urls:
         try:
-            ws.connect(ws_url)
-            logger.info(f"WebSocket connection successful (attempt {attempt+1})")
-            break
-        except Exception as e:
-            logger.warning(f"WebSocket connection failed (attempt {attempt+1}/{max_attempts}): {e}")
-            if attempt == max_attempts - 1:
-                return {"error": "WebSocket connection timeout (3 minutes)"}
-            time.sleep(5)
-
-    # Generate video
+            with timings.stage("input_fetch"):
+                fetched = fetcher.fetch_many(urls)
+        except FetchError as e:
+            return {"error": f"Cannot fetch input image: {e}"}
     try:
-        videos = get_videos(ws, prompt)
-        ws.close()
-
-        # Return first video found
-        for node_id in videos:
-            if videos[node_id]:
-                logger.info(f"Found video output from node {node_id}")
-                return {"video": videos[node_id][0]}
-
-        return {"error": "No video output found in any node"}
+        with timings.stage("input_decode"):
+            if image_path_input:
+                image_filename, image_size = ingest_image(image_path_input, target, link=True)
+            elif image_base64_input:
+                try:
+                    raw = base64.b64decode(image_base64_input)
+                except (binascii.Error, ValueError) as e:
+                    return {"error": f"Base64 image decoding failed: {e}"}
+                image_filename, image_size = ingest_image(raw, target)
+            else:
+                image_filename, image_size = ingest_image(fetched[0], target)
+            if last_image_url:
+                params["last_image"], _ = ingest_image(fetched[-1], target)
+    except InputImageError as e:
+        return {"error": f"Invalid input image: {e}"}
+    except OSError as e:
+        return {"error": f"Cannot read input image: {e}"}
+    collect_garbage(COMFYUI_INPUT_DIR)
+    logger.info(f"Input image '{image_filename}' ({image_size[0]}x{image_size[1]})")
+
+    # Requested LoRAs are placed on local disk (in parallel) before any prompt is queued
+    files = lora_files(loras)
+    if files:
+        try:
+            with timings.stage("lora_fetch"):
+                lora_results = lora_cache.acquire(files)
+        except (LoraCacheError, OSError) as e:
+            return {"error": f"Cannot load LoRA: {e}"}
+        if pinned is not None:
+            pinned.extend(lora_results)
+        logger.info(f"🎛️ LoRAs ready: {lora_results}")
+
+    notify = progress_notifier(job)
+    if plan is not None:
+        result = render_segments(job, template, pipeline_name, params, loras, image_filename, plan, output_mode,
+                                 task_id, notify, timings, deadline, cancel, encoding, transcode_settings)
+        if encoding_report and "error" not in result:
+            result["encoding"] = encoding_report
+        if bucket:
+            result["bucket"] = bucket
+        if speed:
+            result["speed"] = speed
+        return result
+    if variations is None:
+        preview = None
+        if progressive:
+            preview = render_preview(job, template, pipeline_name, params, loras, image_filename, sizing, output_mode,
+                                     task_id, notify, deadline, cancel)
+            if preview.get("aborted"):
+                return preview
+        with timings.stage("graph_patch"):
+            prompt = build_graph(template, pipeline_name, params, loras, image_filename, encoding)
+        result = render(job, prompt, pipeline_name, output_mode, image_filename, task_id, notify, timings,
+                        deadline, cancel, transcode_settings)
+        if encoding_report and "error" not in result:
+            result["encoding"] = encoding_report
+        if bucket:
+            result["bucket"] = bucket
+        if speed:
+            result["speed"] = speed
+        if preview is not None:
+            result["preview"] = preview
+        return result
+
+    # Batch: every variation shares the image, loaders and connections; prompts are queued back to
+    # back (up to MAX_QUEUED_PROMPTS at once) so ComfyUI starts the next one as soon as one finishes
+    logger.info(f"Rendering a batch of {len(variations)} videos")
+    with timings.stage("graph_patch"):
+        prompts = [build_graph(template, pipeline_name, dict(params, **v), loras, image_filename, encoding)
+                   for v in variations]
+    # Each item reports its own stages; the job's timings cover the shared ones
+    item_timings = [Timings() for _ in prompts]
+    with ThreadPoolExecutor(max_workers=MAX_QUEUED_PROMPTS) as pool:
+        futures = [pool.submit(render, job, prompt, pipeline_name, output_mode, image_filename,
+                               f"{task_id}_{index}", item_notifier(notify, index), item_timings[index],
+                               deadline, cancel, transcode_settings)
+                   for index, prompt in enumerate(prompts)]
+        results = [dict(future.result(), timings=t.summary()) for future, t in zip(futures, item_timings)]
+
+    items = [dict(variation, index=index, **result) for index, (variation, result) in enumerate(zip(variations, results))]
+    response = {"workflow": pipeline_name, "videos": items}
+    if encoding_report:
+        response["encoding"] = encoding_report
+    if bucket:
+        response["bucket"] = bucket
+    if speed:
+        response["speed"] = speed
+    failed = sum("error" in item for item in items)
+    if failed == len(items):
+        response["error"] = f"All {failed} videos in the batch failed: {items[0]['error']}"
+    return response
+
+async def async_handler(job):
+    """Run a job on a worker thread so several jobs can be in flight on one worker.
+
+    The thread cannot be killed, so a cancelled task signals it to interrupt its prompt and return.
+    """
+    cancel = threading.Event()
+    try:
+        return await asyncio.to_thread(handler, job, cancel)
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
 
-    except Exception as e:
-        ws.close()
-        logger.error(f"Error during video generation: {e}")
-        return {"error": f"Video generation failed: {e}"}
+def concurrency_modifier(current_concurrency):
+    return MAX_CONCURRENCY
 
-runpod.serverless.start({"handler": handler})
\ No newline at end of file
+def warm_up():
+    """Run one tiny job at boot so model loaders are resident and cached before real traffic"""
+    start = time.monotonic()
+    result = handler(warmup_job(WARMUP_WORKFLOW))
+    if "error" in result:
+        logger.warning(f"⚠️ Warm-up failed: {result['error']}")
+    else:
+        logger.info(f"🔥 Warm-up of '{result['workflow']}' finished in {time.monotonic() - start:.1f}s")
+
+if __name__ == "__main__":
+    # Hot LoRAs copy to local disk while ComfyUI starts
+    lora_cache.start_prefetch()
+    if not comfy.wait_until_ready(timeout=COMFY_READY_TIMEOUT, process_id=COMFYUI_PID):
+        raise SystemExit("ComfyUI failed to start")
+    # Node schema for job validation; the disk copy covers a server that does not answer
+    set_object_info(load_object_info(comfy))
+    start_metrics_server()
+    if WARM_MODELS:
+        warm_up()
+    runpod.serverless.start({"handler": async_handler, "concurrency_modifier": concurrency_modifier})
@@ -0,0 +1,205 @@
+import io
+import os
+import math
+import hashlib
+import logging
+import shutil
+import tempfile
+import time
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+
+class InputImageError(Exception):
+    """The input image is not a decodable image of an accepted format and size"""
+
+# Size cap for ingested inputs in the ComfyUI input directory
+INPUT_CACHE_MAX_MB = float(os.getenv('INPUT_CACHE_MAX_MB', '2048'))
+# Inputs used this recently are never collected, so queued jobs keep their image
+INPUT_GC_MIN_AGE = float(os.getenv('INPUT_GC_MIN_AGE', '3600'))
+
+# Formats ComfyUI's LoadImage handles; anything else is rejected before queueing
+ALLOWED_FORMATS = ("PNG", "JPEG", "WEBP", "BMP", "GIF")
+MAX_INPUT_PIXELS = int(os.getenv('MAX_INPUT_PIXELS', str(64 * 1024 * 1024)))
+JPEG_QUALITY = int(os.getenv('INPUT_JPEG_QUALITY', '95'))
+
+# Prefixes of files this module manages; anything else in the input directory is left alone
+DECODED_PREFIX = "in_"
+LINKED_PREFIX = "ln_"
+
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+)
+
+
+def sniff_extension(head):
+    """File extension for an image header, 'bin' when unrecognized"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for signature, extension in _SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return "bin"
+
+
+def _touch(path):
+    # mtime doubles as last-use time for garbage collection
+    try:
+        os.utime(path, follow_symlinks=False)
+    except (NotImplementedError, OSError):
+        pass
+
+
+def ingest_bytes(data, input_dir):
+    """Store image bytes under a content-addressed name; identical images are written once"""
+    digest = hashlib.sha256(data).hexdigest()
+    filename = f"{DECODED_PREFIX}{digest[:32]}.{sniff_extension(data[:16])}"
+    path = os.path.join(input_dir, filename)
+    if os.path.exists(path):
+        _touch(path)
+        logger.info(f"♻️ Reusing input image {filename}")
+        return filename
+    os.makedirs(input_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=input_dir, prefix=".ingest_")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.info(f"✅ Input image written to {path} ({len(data)} bytes)")
+    return filename
+
+
+def cover_size(size, width, height):
+    """Smallest size with the aspect ratio of ``size`` that covers width x height; never larger than ``size``"""
+    w, h = size
+    scale = max(width / w, height / h)
+    if scale >= 1:
+        return size
+    return min(w, max(width, math.ceil(w * scale))), min(h, max(height, math.ceil(h * scale)))
+
+
+def prepare_image(source, width=None, height=None):
+    """Validate an image (bytes or file path) and downsample it to just cover width x height.
+
+    Returns ``(data, size)``: ``data`` holds the re-encoded image, or is None when
+    the source can be used unchanged. ``size`` is the upright size ComfyUI will see.
+    """
+    try:
+        image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    except UnidentifiedImageError:
+        raise InputImageError("not a recognized image format")
+    except (FileNotFoundError, PermissionError, IsADirectoryError):
+        raise
+    except (OSError, SyntaxError, ValueError) as e:
+        raise InputImageError(f"corrupt image data: {e}")
+    with image:
+        if image.format not in ALLOWED_FORMATS:
+            raise InputImageError(f"unsupported format {image.format}, expected one of {', '.join(ALLOWED_FORMATS)}")
+        if image.width * image.height > MAX_INPUT_PIXELS:
+            raise InputImageError(f"{image.width}x{image.height} exceeds {MAX_INPUT_PIXELS} pixels")
+        # ComfyUI applies the EXIF orientation on load, so targets refer to the upright image
+        transposed = image.getexif().get(0x0112, 1) in (5, 6, 7, 8)
+        size = image.size[::-1] if transposed else image.size
+        new_size = cover_size(size, width, height) if width and height else size
+        if image.format == "JPEG" and new_size != size:
+            # Let libjpeg decode at a reduced scale instead of decoding the full frame
+            image.draft(None, new_size[::-1] if transposed else new_size)
+        try:
+            image.load()
+        except (OSError, SyntaxError, ValueError) as e:
+            raise InputImageError(f"corrupt image data: {e}")
+        if new_size == size:
+            return None, size
+
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+        if image.size != new_size:
+            image = image.resize(new_size, Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        if image.mode == "RGBA":
+            image.save(out, format="PNG", compress_level=1)
+        else:
+            image.save(out, format="JPEG", quality=JPEG_QUALITY)
+        logger.info(f"📐 Input image downsampled from {size[0]}x{size[1]} to {new_size[0]}x{new_size[1]}")
+        return out.getvalue(), new_size
+
+
+def ingest_path(path, input_dir):
+    """Expose an existing file to ComfyUI without copying it.
+
+    Files already inside ``input_dir`` are used as-is. Others are symlinked,
+    hardlinked where symlinks are unsupported, and copied only if neither
+    works. The link name derives from the source path, size and mtime, so a
+    changed file gets a new name and an unchanged one is linked once.
+    """
+    source = os.path.realpath(path)
+    stat = os.stat(source)
+    root = os.path.realpath(input_dir)
+    if os.path.commonpath([source, root]) == root:
+        return os.path.relpath(source, root)
+
+    key = hashlib.sha256(f"{source}\0{stat.st_size}\0{stat.st_mtime_ns}".encode('utf-8')).hexdigest()
+    extension = os.path.splitext(source)[1].lstrip('.').lower() or "bin"
+    filename = f"{LINKED_PREFIX}{key[:32]}.{extension}"
+    target = os.path.join(input_dir, filename)
+    if os.path.lexists(target):
+        # Touching a hardlink would change the source's mtime and with it the link name
+        if os.path.islink(target) or os.stat(target).st_nlink == 1:
+            _touch(target)
+        return filename
+
+    os.makedirs(input_dir, exist_ok=True)
+    tmp_target = os.path.join(input_dir, f".ingest_{key[:16]}_{os.getpid()}")
+    for method, link in (("symlink", os.symlink), ("hardlink", os.link), ("copy", shutil.copy2)):
+        try:
+            link(source, tmp_target)
+        except OSError:
+            continue
+        os.replace(tmp_target, target)
+        logger.info(f"🔗 Input image {source} exposed as {filename} ({method})")
+        return filename
+    raise OSError(f"Could not link or copy {source} into {input_dir}")
+
+
+def collect_garbage(input_dir, max_bytes=None, min_age=None, now=None):
+    """Delete the least recently used ingested inputs until they fit in ``max_bytes``; returns freed bytes"""
+    max_bytes = INPUT_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    min_age = INPUT_GC_MIN_AGE if min_age is None else min_age
+    now = time.time() if now is None else now
+    entries = []
+    try:
+        with os.scandir(input_dir) as it:
+            for entry in it:
+                if entry.name.startswith((DECODED_PREFIX, LINKED_PREFIX)):
+                    stat = entry.stat(follow_symlinks=False)
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except FileNotFoundError:
+        return 0
+
+    total = sum(size for _, size, _ in entries)
+    freed = 0
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if now - mtime < min_age:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        freed += size
+    if freed:
+        logger.info(f"🧹 Removed {freed} bytes of old input images from {input_dir}")
+    return freed
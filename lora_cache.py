@@ -0,0 +1,329 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from fetch import FetchError
+from metrics import Counter, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Where per-job LoRAs live on the network volume, and the local NVMe directory they are copied to.
+# LORA_CACHE_DIR must be listed first under `loras` in extra_model_paths.yaml so ComfyUI loads the local copy.
+LORA_SOURCE_DIR = os.getenv('LORA_SOURCE_DIR', '/runpod-volume/models/loras')
+LORA_CACHE_DIR = os.getenv('LORA_CACHE_DIR', os.path.join(os.getenv('PREFETCH_LOCAL_DIR', '/local-models'), 'loras'))
+# Byte cap of the local copies (0 disables the cache: LoRAs load from the volume, URLs are refused)
+LORA_CACHE_MB = float(os.getenv('LORA_CACHE_MB', '20480'))
+# Largest LoRA file accepted from the volume or a URL
+LORA_MAX_MB = float(os.getenv('LORA_MAX_MB', '2048'))
+# LoRAs copied in the background at boot: named ones, then the most used ones recorded in the cache index
+LORA_PREFETCH = [n for n in os.getenv('LORA_PREFETCH', '').split(',') if n]
+LORA_PREFETCH_TOP = int(os.getenv('LORA_PREFETCH_TOP', '4'))
+LORA_THREADS = int(os.getenv('LORA_THREADS', '4'))
+
+INDEX_FILE = ".lora_cache.json"
+READ_CHUNK = 16 * 1024 * 1024
+
+LORA_RESULTS = Counter("handler_lora_cache_total",
+                       "LoRA files requested by jobs by outcome (hit, copied, downloaded, volume, passthrough)",
+                       ["result"])
+REGISTRY.extend([LORA_RESULTS])
+
+
+class LoraCacheError(Exception):
+    """A requested LoRA is missing, too large, fails its checksum or cannot be downloaded"""
+
+
+def _stored_url(url):
+    """The URL as kept in the index: credentials, query string (presigned signatures) and fragment removed.
+
+    Returns (url, signed); only unsigned URLs can be fetched again from the index.
+    """
+    parts = urllib.parse.urlsplit(url)
+    netloc = parts.netloc.rsplit("@", 1)[-1]
+    signed = bool(parts.query or netloc != parts.netloc)
+    return urllib.parse.urlunsplit((parts.scheme, netloc, parts.path, "", "")), signed
+
+
+def _copy(source, target, max_bytes):
+    """Copy ``source`` to ``target`` through a temporary file next to it; returns the SHA-256"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".lora_")
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, 'wb') as sink, open(source, 'rb') as f:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            size = 0
+            for chunk in iter(lambda: f.read(READ_CHUNK), b''):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise LoraCacheError(f"{os.path.basename(source)} exceeds the {int(max_bytes)} byte limit")
+                digest.update(chunk)
+                sink.write(chunk)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return digest.hexdigest()
+
+
+class LoraCache:
+    """Local copies of per-job LoRAs under a byte cap, evicted least recently used first.
+
+    Files come from ``source_dir`` (the network volume) or a URL and keep their
+    file name, so the graph refers to them unchanged. An index in the cache
+    directory records size, SHA-256, source and use of every file the cache
+    placed there; other files in the directory (e.g. prefetch.py copies) are
+    used but never evicted. Files pinned by running jobs are not evicted either.
+    """
+
+    def __init__(self, cache_dir=LORA_CACHE_DIR, source_dir=LORA_SOURCE_DIR, max_bytes=None, max_file_bytes=None,
+                 fetcher=None):
+        self.cache_dir = cache_dir
+        self.source_dir = source_dir
+        self.max_bytes = LORA_CACHE_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        self.max_file_bytes = LORA_MAX_MB * 1024 * 1024 if max_file_bytes is None else max_file_bytes
+        self.fetcher = fetcher
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+        self._lock = threading.Lock()
+        self._name_locks = {}
+        self._pins = {}
+        self.index = self._load_index()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    # Index
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        index = {name: entry for name, entry in index.items() if isinstance(entry, dict)}
+        # Entries whose file disappeared no longer count as cached; their use counts still rank prefetches
+        for name, entry in index.items():
+            if not os.path.isfile(self._path(name)):
+                entry["size"] = None
+        return index
+
+    def _save_index(self):
+        # Called with self._lock held
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.index_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _record(self, name, **fields):
+        with self._lock:
+            entry = self.index.setdefault(name, {"uses": 0})
+            entry.update(fields)
+            self._save_index()
+
+    # Pins
+
+    def pin(self, names):
+        with self._lock:
+            for name in names:
+                self._pins[name] = self._pins.get(name, 0) + 1
+
+    def release(self, names):
+        """Unpin files a finished job used so they may be evicted again"""
+        with self._lock:
+            for name in names:
+                count = self._pins.get(name, 0) - 1
+                if count > 0:
+                    self._pins[name] = count
+                else:
+                    self._pins.pop(name, None)
+
+    # Eviction
+
+    def evict(self, need=0):
+        """Drop least recently used unpinned copies until ``need`` more bytes fit; returns whether they do"""
+        with self._lock:
+            cached = [(entry.get("last_used", 0), name, entry["size"]) for name, entry in self.index.items()
+                      if entry.get("size") is not None]
+            total = sum(size for _, _, size in cached)
+            freed = 0
+            for _, name, size in sorted(cached):
+                if total + need <= self.max_bytes:
+                    break
+                if self._pins.get(name):
+                    continue
+                try:
+                    os.remove(self._path(name))
+                except FileNotFoundError:
+                    pass
+                self.index[name]["size"] = None
+                total -= size
+                freed += size
+            if freed:
+                self._save_index()
+                logger.info(f"🧹 Removed {freed} bytes of cached LoRAs from {self.cache_dir}")
+            return total + need <= self.max_bytes
+
+    # Lookup
+
+    def _name_lock(self, name):
+        with self._lock:
+            return self._name_locks.setdefault(name, threading.Lock())
+
+    def _cached(self, name, sha256, url=None):
+        path = self._path(name)
+        entry = self.index.get(name)
+        if entry is None or entry.get("size") is None:
+            # Files placed by someone else (prefetch.py) are used as they are, unless a checksum or URL is asked for
+            return os.path.isfile(path) and sha256 is None and url is None and name not in self.index
+        if not os.path.isfile(path) or os.path.getsize(path) != entry["size"]:
+            return False
+        # A copy of the same name from another URL is a different file
+        if url is not None and entry.get("source") != _stored_url(url)[0]:
+            return False
+        return sha256 is None or entry.get("sha256") == sha256
+
+    def ensure(self, name, url=None, sha256=None, count=True):
+        """Make one LoRA file loadable by ComfyUI; returns 'hit', 'copied', 'downloaded', 'volume' or 'passthrough'.
+
+        Volume files are copied to the local cache (or, when it is disabled or
+        full, left for ComfyUI to read from the volume). ``url`` is downloaded
+        when the volume has no such file. ``sha256`` is checked on every copy.
+        Names found nowhere without a ``url`` are left to ComfyUI's other
+        model paths ('passthrough').
+        """
+        source = os.path.join(self.source_dir, name)
+        on_volume = os.path.isfile(source)
+        if not self.enabled:
+            if url and not on_volume:
+                raise LoraCacheError(f"LoRA '{name}' is only available from a URL, which needs LORA_CACHE_MB > 0")
+            return "volume" if on_volume else "passthrough"
+
+        with self._name_lock(name):
+            # The volume copy wins over a url, so the url only identifies files the volume lacks
+            if self._cached(name, sha256, None if on_volume else url):
+                with self._lock:
+                    entry = self.index.get(name)
+                    if entry is not None:
+                        entry["last_used"] = time.time()
+                        entry["uses"] = entry.get("uses", 0) + int(count)
+                        self._save_index()
+                return "hit"
+            if not on_volume and not url:
+                if sha256 is not None:
+                    raise LoraCacheError(f"LoRA '{name}' not found in {self.source_dir} and no url given")
+                logger.warning(f"⚠️ LoRA '{name}' not found in {self.source_dir}; leaving it to ComfyUI's model paths")
+                return "passthrough"
+
+            size = os.path.getsize(source) if on_volume else None
+            if size is not None and size > self.max_file_bytes:
+                raise LoraCacheError(f"LoRA '{name}' is {size} bytes, over the {int(self.max_file_bytes)} byte limit")
+            self.pin([name])
+            try:
+                if not self.evict(need=size or 0):
+                    if on_volume and sha256 is None:
+                        logger.warning(f"⚠️ LoRA cache is full of pinned files; '{name}' loads from the volume")
+                        return "volume"
+                    raise LoraCacheError(f"No room in the LoRA cache for '{name}'")
+                target = self._path(name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                start = time.monotonic()
+                if on_volume:
+                    result = "copied"
+                    try:
+                        digest = _copy(source, target, self.max_file_bytes)
+                    except OSError as e:
+                        if sha256 is not None:
+                            raise LoraCacheError(f"Cannot copy LoRA '{name}': {e}")
+                        logger.warning(f"⚠️ Copying LoRA '{name}' failed ({e}); it loads from the volume")
+                        return "volume"
+                    if sha256 is not None and digest != sha256:
+                        os.remove(target)
+                        raise LoraCacheError(f"LoRA '{name}' checksum mismatch: expected {sha256}, got {digest}")
+                else:
+                    result = "downloaded"
+                    if self.fetcher is None:
+                        raise LoraCacheError(f"LoRA '{name}' needs a download but no fetcher is configured")
+                    try:
+                        digest = self.fetcher.download(url, target, self.max_file_bytes, sha256)
+                    except FetchError as e:
+                        raise LoraCacheError(f"Cannot download LoRA '{name}': {e}")
+                size = os.path.getsize(target)
+                stored, signed = (source, False) if on_volume else _stored_url(url)
+                self._record(name, size=size, sha256=digest, source=stored, signed=signed,
+                             last_used=time.time(), uses=self.index.get(name, {}).get("uses", 0) + int(count))
+                logger.info(f"💾 Cached LoRA '{name}' ({size / 1e6:.1f} MB, {result}) in {time.monotonic() - start:.2f}s")
+                # The new file may push the cache over its cap when the size was not known in advance
+                self.evict()
+                return result
+            finally:
+                self.release([name])
+
+    def acquire(self, files, threads=LORA_THREADS):
+        """Ensure (name, url, sha256) files in parallel and pin them for the job; returns name -> result.
+
+        Call ``release`` with the names once the job is done.
+        """
+        names = [name for name, _, _ in files]
+        self.pin(names)
+        try:
+            if len(files) < 2:
+                results = [self.ensure(*f) for f in files]
+            else:
+                with ThreadPoolExecutor(max_workers=min(threads, len(files))) as pool:
+                    results = list(pool.map(lambda f: self.ensure(*f), files))
+        except BaseException:
+            self.release(names)
+            raise
+        for result in results:
+            LORA_RESULTS.inc(result=result)
+        return dict(zip(names, results))
+
+    # Prefetch
+
+    def hot(self, names=(), top=LORA_PREFETCH_TOP):
+        """Named LoRAs followed by the ``top`` most used ones in the index, without duplicates"""
+        ranked = sorted(self.index.items(), key=lambda item: item[1].get("uses", 0), reverse=True)
+        hot = list(dict.fromkeys(names))
+        for name, entry in ranked[:top]:
+            if name not in hot and entry.get("uses"):
+                hot.append(name)
+        return hot
+
+    def prefetch(self, names=(), top=LORA_PREFETCH_TOP):
+        """Copy hot LoRAs into the cache; failures are logged and skipped"""
+        if not self.enabled:
+            return {}
+        results = {}
+        for name in self.hot(names, top):
+            entry = self.index.get(name, {})
+            source = entry.get("source")
+            url = source if isinstance(source, str) and "://" in source else None
+            if url and entry.get("signed"):
+                # The index keeps no signature, so a presigned LoRA waits for the next job that sends its URL
+                continue
+            try:
+                results[name] = self.ensure(name, url, count=False)
+            except (LoraCacheError, OSError) as e:
+                logger.warning(f"⚠️ Prefetching LoRA '{name}' failed: {e}")
+        if results:
+            logger.info(f"📦 Prefetched {len(results)} LoRAs: {results}")
+        return results
+
+    def start_prefetch(self, names=None, top=LORA_PREFETCH_TOP):
+        """Run ``prefetch`` on a daemon thread so it overlaps ComfyUI startup and the first jobs"""
+        thread = threading.Thread(target=self.prefetch, args=(LORA_PREFETCH if names is None else names, top),
+                                  name="lora-prefetch", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Port of the Prometheus text endpoint; 0 disables it
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9090'))
+# Interface the endpoint listens on; set 0.0.0.0 to let a scraper outside the container reach it
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+# Longest job input summary written to the log
+LOG_INPUT_LIMIT = int(os.getenv('LOG_INPUT_LIMIT', '1000'))
+
+# Stage latencies range from milliseconds (graph patching) to minutes (sampling)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Input keys whose values never reach the log
+SECRET_MARKERS = ("secret", "token", "password", "access", "credential")
+
+
+def _labels(names, values):
+    return ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels[n]) for n in self.labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                label_str = _labels(self.labels, key)
+                lines.append(f"{self.name}{{{label_str}}} {value}" if label_str else f"{self.name} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._series[key] = (counts, total + value)
+
+    def count(self, **labels):
+        series = self._series.get(tuple(str(labels[n]) for n in self.labels))
+        return sum(series[0]) if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        for key, counts, total in series:
+            base = _labels(self.labels, key)
+            prefix = f"{base}," if base else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            suffix = f"{{{base}}}" if base else ""
+            lines.append(f"{self.name}_sum{suffix} {round(total, 6)}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("handler_stage_seconds", "Seconds spent in each handler stage", ["stage"])
+JOB_SECONDS = Histogram("handler_job_seconds", "End-to-end handler seconds per job", ["status"])
+JOBS = Counter("handler_jobs_total", "Jobs handled by outcome", ["status"])
+REGISTRY = [STAGE_SECONDS, JOB_SECONDS, JOBS]
+
+
+def render_metrics():
+    """All metrics in Prometheus text exposition format"""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+class Timings:
+    """Per-job stage timer; every stage is also recorded in the shared histogram"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = round(self.stages.get(stage, 0.0) + seconds, 4)
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, time.monotonic() - start)
+
+    def summary(self):
+        return dict(self.stages, total=round(time.monotonic() - self.started, 4))
+
+
+def record_job(result, timings):
+    """Count a finished job and attach its stage timings to the result"""
+    status = "error" if "error" in result else "cached" if result.get("cached") else "success"
+    summary = timings.summary()
+    JOBS.inc(status=status)
+    JOB_SECONDS.observe(summary["total"], status=status)
+    result["timings"] = summary
+    return result
+
+
+def redact(value, limit=200):
+    """Copy of a job input that is safe to log: long strings truncated, secrets masked"""
+    if isinstance(value, dict):
+        return {k: "***" if any(m in str(k).lower() for m in SECRET_MARKERS) else redact(v, limit)
+                for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v, limit) for v in value[:20]] + ([f"... {len(value) - 20} more"] if len(value) > 20 else [])
+    if isinstance(value, str) and value.startswith(("http://", "https://")) and "?" in value:
+        # Presigned URLs carry their signature in the query string
+        value = value.split("?", 1)[0] + "?***"
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit // 2]}... ({len(value)} chars)"
+    return value
+
+
+def loggable_input(job_input, limit=LOG_INPUT_LIMIT):
+    """Redacted, size-capped JSON summary of a job input"""
+    text = json.dumps(redact(job_input), default=str)
+    return text if len(text) <= limit else f"{text[:limit]}... ({len(text)} chars)"
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serve /metrics on a background thread; returns the server, or None when disabled or the port is taken"""
+    if not port:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_metrics().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    try:
+        server = ThreadingHTTPServer((host, port), Handler)
+    except OSError as e:
+        logger.warning(f"⚠️ Metrics endpoint not started on port {port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"📈 Metrics at http://{host}:{server.server_address[1]}/metrics")
+    return server
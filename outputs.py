@@ -0,0 +1,105 @@
+import os
+import time
+import base64
+import hashlib
+import logging
+import mimetypes
+
+from runpod.serverless.utils import rp_upload
+
+logger = logging.getLogger(__name__)
+
+COMFYUI_OUTPUT_DIR = os.getenv('COMFYUI_OUTPUT_DIR', '/ComfyUI/output')
+BUCKET_NAME = os.getenv('BUCKET_NAME')
+PRESIGNED_URL_EXPIRY = int(os.getenv('PRESIGNED_URL_EXPIRY', str(7 * 24 * 3600)))
+
+# Multiple of 3 so every chunk base64-encodes without padding except the last one
+CHUNK_SIZE = 3 * 256 * 1024
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+
+OUTPUT_MODES = ("url", "base64")
+
+# History output keys that can hold video files, in order of preference
+VIDEO_OUTPUT_KEYS = ("gifs", "videos", "mp4")
+
+
+def default_output_mode():
+    """Upload when a bucket is configured, otherwise fall back to inline base64"""
+    mode = os.getenv('OUTPUT_MODE')
+    if mode:
+        return mode
+    return "url" if os.getenv('BUCKET_ENDPOINT_URL') else "base64"
+
+
+def video_files(history):
+    """Map node id -> list of output file paths from a ComfyUI history entry, without reading them"""
+    output_videos = {}
+    for node_id, node_output in history['outputs'].items():
+        for key in VIDEO_OUTPUT_KEYS:
+            if key in node_output:
+                paths = []
+                for video in node_output[key]:
+                    path = video.get('fullpath') or os.path.join(
+                        COMFYUI_OUTPUT_DIR, video.get('subfolder', ''), video['filename'])
+                    paths.append(path)
+                if paths:
+                    output_videos[node_id] = paths
+                break
+    return output_videos
+
+
+def file_sha256(path, chunk_size=CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_base64(path, chunk_size=CHUNK_SIZE):
+    """Base64-encode a file in fixed-size chunks; returns (encoded str, size, sha256)"""
+    size = os.path.getsize(path)
+    encoded = bytearray(4 * ((size + 2) // 3))
+    digest = hashlib.sha256()
+    offset = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+            piece = base64.b64encode(chunk)
+            encoded[offset:offset + len(piece)] = piece
+            offset += len(piece)
+    return str(memoryview(encoded)[:offset], 'ascii'), size, digest.hexdigest()
+
+
+def upload_file(path, job_id, bucket_creds=None, bucket_name=None):
+    """Stream a file to S3-compatible storage with multipart upload; returns (url, size, sha256)"""
+    from boto3.s3.transfer import TransferConfig
+
+    boto_client, _ = rp_upload.get_boto_client(bucket_creds)
+    if boto_client is None:
+        raise RuntimeError("No bucket configured: set BUCKET_ENDPOINT_URL, BUCKET_ACCESS_KEY_ID and BUCKET_SECRET_ACCESS_KEY")
+
+    bucket = bucket_name or (bucket_creds or {}).get("bucketName") or BUCKET_NAME or time.strftime("%m-%y")
+    key = f"{job_id}/{os.path.basename(path)}"
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    transfer_config = TransferConfig(multipart_threshold=MULTIPART_CHUNK_SIZE, multipart_chunksize=MULTIPART_CHUNK_SIZE)
+
+    size = os.path.getsize(path)
+    sha256 = file_sha256(path)
+    boto_client.upload_file(path, bucket, key, Config=transfer_config,
+                            ExtraArgs={"ContentType": content_type, "Metadata": {"sha256": sha256}})
+    url = boto_client.generate_presigned_url(
+        "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=PRESIGNED_URL_EXPIRY)
+    logger.info(f"✅ Uploaded {path} ({size} bytes) to s3://{bucket}/{key}")
+    return url, size, sha256
+
+
+def deliver_video(path, mode, job_id, bucket_creds=None):
+    """Return the job output for a finished video in the requested output mode"""
+    if mode == "url":
+        url, size, sha256 = upload_file(path, job_id, bucket_creds)
+        return {"video_url": url, "size": size, "sha256": sha256}
+    if mode == "base64":
+        video, size, sha256 = encode_base64(path)
+        return {"video": video, "size": size, "sha256": sha256}
+    raise ValueError(f"Unknown output_mode '{mode}', expected one of {', '.join(OUTPUT_MODES)}")
@@ -0,0 +1,577 @@
+import re
+import logging
+
+from schema import input_spec, check_value
+from workflows import get_template, TEMPLATE_ERRORS
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineError(Exception):
+    """A job asked for a pipeline or parameters the selected graph cannot serve"""
+
+
+class Select:
+    """Binding target found by class type, title and/or the input it feeds, instead of a fixed node ID"""
+
+    def __init__(self, input, class_type=None, title=None, feeds=None):
+        self.input = input
+        self.class_type = class_type
+        self.title = title
+        # (class type, input name): match the nodes linked into that input
+        self.feeds = feeds
+
+    def resolve(self, graph):
+        """Matching node IDs in graph order"""
+        sources = None
+        if self.feeds:
+            feed_class, feed_input = self.feeds
+            sources = {str(node['inputs'][feed_input][0]) for node in graph.values()
+                       if node['class_type'] == feed_class and isinstance(node['inputs'].get(feed_input), (list, tuple))}
+        matches = []
+        for node_id, node in graph.items():
+            if self.class_type and node['class_type'] != self.class_type:
+                continue
+            if self.title and (node.get('_meta') or {}).get('title') != self.title:
+                continue
+            if sources is not None and node_id not in sources:
+                continue
+            matches.append(node_id)
+        return matches
+
+    def __repr__(self):
+        parts = [f"{k}={v!r}" for k, v in (("class_type", self.class_type), ("title", self.title), ("feeds", self.feeds)) if v]
+        return f"Select({self.input!r}, {', '.join(parts)})"
+
+
+# Job parameter -> binding targets, per pipeline: fixed (node id, input name) pairs or Select
+# rules resolved against each template once. Non-strict pipelines skip targets missing from the
+# template (the i2v export shares its bindings with the simple fallback graph).
+I2V_BINDINGS = {
+    "image": [Select("image", class_type="LoadImage")],
+    "prompt": [Select("text", class_type="CLIPTextEncode", feeds=("WanImageToVideo", "positive"))],
+    "negative_prompt": [Select("text", class_type="CLIPTextEncode", feeds=("WanImageToVideo", "negative"))],
+    "width": [Select("width", class_type="WanImageToVideo")],
+    "height": [Select("height", class_type="WanImageToVideo")],
+    "length": [Select("length", class_type="WanImageToVideo")],
+    "batch_size": [Select("batch_size", class_type="WanImageToVideo")],
+    "seed": [Select("noise_seed", class_type="KSamplerAdvanced")],
+    "steps": [Select("steps", class_type="KSamplerAdvanced")],
+    "cfg": [Select("cfg", class_type="KSamplerAdvanced")],
+}
+
+WAN22_BINDINGS = {
+    "image": [Select("image", class_type="LoadImage")],
+    "prompt": [Select("value", title="Positive Prompt (STRING)")],
+    "negative_prompt": [Select("value", title="Negative Prompt (STRING)")],
+    "width": [Select("value", class_type="INTConstant", title="WIDTH")],
+    "height": [Select("value", class_type="INTConstant", title="HEIGHT")],
+    "length": [Select("value", class_type="INTConstant", title="LENGTH")],
+    "seed": [Select("noise_seed", class_type="RandomNoise")],
+    "steps": [Select("steps", class_type="BetaSamplingScheduler")],
+    "cfg": [Select("cfg", class_type="ScheduledCFGGuidance")],
+}
+
+# Expected Python types of job parameters, checked even without a node schema
+PARAM_TYPES = {
+    "prompt": str, "negative_prompt": str, "seed": int, "cfg": (int, float),
+    "width": int, "height": int, "length": int, "steps": int, "batch_size": int,
+}
+
+
+def _grid(value):
+    # Wan's VAE and patch embedding work on a 16-pixel grid
+    return None if value % 16 == 0 else f"{value} is not a multiple of 16"
+
+
+def _frames(value):
+    # The VAE compresses time 4x and keeps the first frame: valid lengths are 4k+1
+    return None if value % 4 == 1 else f"{value} is not of the form 4k+1 (nearest: {max(1, round((value - 1) / 4) * 4 + 1)})"
+
+
+def _positive(value):
+    return None if value > 0 else f"{value} must be positive"
+
+
+PARAM_RULES = {
+    "width": [_positive, _grid], "height": [_positive, _grid], "length": [_positive, _frames],
+    "steps": [_positive], "batch_size": [_positive],
+}
+
+# (high-noise loader, low-noise loader) per user LoRA slot in the wan22 graphs
+WAN22_LORA_SLOTS = [("282", "286"), ("339", "337"), ("340", "338")]
+
+PIPELINES = {
+    "i2v": {
+        "templates": ["video_wan2_2_14B_i2v", "test_simple_workflow"],
+        "bindings": I2V_BINDINGS,
+        "strict": False,
+        "lora_slots": [],
+        # Sampler step boundaries rescaled with `steps` in preview drafts
+        "step_splits": [Select("end_at_step", class_type="KSamplerAdvanced"),
+                        Select("start_at_step", class_type="KSamplerAdvanced")],
+        # WanImageToVideo center-crops the start image to the video size
+        "image_scale": 1,
+        # WanImageToVideo has no end frame input
+        "last_frame": None,
+        # Decoded frames and frame rate of each video output
+        "frames": Select("images", class_type="CreateVideo"),
+        "frame_rate": Select("fps", class_type="CreateVideo"),
+        # The i2v graph has none of the nodes speed presets tune
+        "speed": {},
+        "defaults": {
+            "prompt": "A beautiful scene with natural motion",
+            "negative_prompt": "bad quality, static, blurry",
+            "seed": 42, "cfg": 7.5, "width": 640, "height": 640, "length": 81, "steps": 20, "batch_size": 1,
+        },
+    },
+}
+for _count, _name in enumerate(["wan22_nolora", "wan22_1lora", "wan22_2lora", "wan22_3lora"]):
+    PIPELINES[_name] = {
+        "templates": [_name],
+        "bindings": WAN22_BINDINGS,
+        "strict": True,
+        "lora_slots": WAN22_LORA_SLOTS[:_count],
+        # SplitSigmas hands the schedule from the high-noise to the low-noise model at this step
+        "step_splits": [Select("step", class_type="SplitSigmas")],
+        # Node 852 scales the start image to twice the video size before cropping
+        "image_scale": 2,
+        # WanFirstLastFrameToVideo (node 481) takes an optional end frame next to its start_image
+        "last_frame": Select("end_image", class_type="WanFirstLastFrameToVideo"),
+        "frames": Select("images", class_type="VHS_VideoCombine"),
+        "frame_rate": Select("frame_rate", class_type="VHS_VideoCombine"),
+        # Nodes tuned by speed presets: step reuse, the share of steps with CFG, model unloading after a run
+        "speed": {
+            "cache": Select("reuse_threshold", class_type="EasyCache"),
+            "cfg_window": Select("end_percent", class_type="ScheduledCFGGuidance"),
+            "unload": Select("unload_all_models", class_type="VRAM_Debug"),
+        },
+        # wan22 graphs carry tuned defaults; only parameters the job sets are patched
+        "defaults": {},
+    }
+
+# Families resolve to the smallest member with enough LoRA slots
+FAMILIES = {
+    "wan22": ["wan22_nolora", "wan22_1lora", "wan22_2lora", "wan22_3lora"],
+}
+
+DEFAULT_PIPELINE = "i2v"
+
+
+LORA_STAGES = ("high", "low")
+SHA256_PATTERN = re.compile(r"[0-9a-fA-F]{64}")
+
+
+def _lora_file(index, name, url, sha256):
+    if not isinstance(name, str) or not name or name.startswith(("/", "\\")) or ".." in re.split(r"[/\\]", name):
+        raise PipelineError(f"LoRA {index} has an invalid file name '{name}'")
+    if url is not None and not isinstance(url, str):
+        raise PipelineError(f"LoRA {index} has an invalid url")
+    if sha256 is not None and not (isinstance(sha256, str) and SHA256_PATTERN.fullmatch(sha256)):
+        raise PipelineError(f"LoRA {index} has an invalid sha256, expected 64 hex digits")
+    return name, url, sha256 and sha256.lower()
+
+
+def _strength(index, value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise PipelineError(f"LoRA {index} has an invalid strength '{value}'")
+    return float(value)
+
+
+def _empty_slot():
+    slot = {"open": True}
+    for stage in LORA_STAGES:
+        slot.update({stage: None, f"{stage}_strength": 0.0, f"{stage}_url": None, f"{stage}_sha256": None})
+    return slot
+
+
+def parse_loras(loras):
+    """Normalize the `loras` job input to slots of {high, low, high_strength, low_strength, *_url, *_sha256}.
+
+    A pair entry ``{high, low, strength}`` takes a slot of its own. A stage entry
+    ``{name, strength, stage}`` (stage "high", "low" or "both") shares the first
+    slot whose loader for that stage is still free, so single-stage LoRAs pack
+    into as few loader pairs as possible.
+    """
+    if loras is None:
+        return []
+    if not isinstance(loras, list):
+        raise PipelineError("'loras' must be a list")
+    slots = []
+    for index, lora in enumerate(loras):
+        if not isinstance(lora, dict):
+            raise PipelineError(f"LoRA {index} must be an object")
+        strength = _strength(index, lora.get("strength", 1.0))
+        if "name" in lora:
+            if lora.get("high") or lora.get("low"):
+                raise PipelineError(f"LoRA {index} mixes 'name' with 'high'/'low'")
+            stage = lora.get("stage", "both")
+            if stage not in LORA_STAGES + ("both",):
+                raise PipelineError(f"LoRA {index} has an invalid stage '{stage}', expected high, low or both")
+            stages = LORA_STAGES if stage == "both" else (stage,)
+            name, url, sha256 = _lora_file(index, lora["name"], lora.get("url"), lora.get("sha256"))
+            slot = next((s for s in slots if s["open"] and all(s[st] is None for st in stages)), None)
+            if slot is None:
+                slot = _empty_slot()
+                slots.append(slot)
+            for st in stages:
+                slot.update({st: name, f"{st}_strength": strength, f"{st}_url": url, f"{st}_sha256": sha256})
+            continue
+        if not (lora.get("high") or lora.get("low")):
+            raise PipelineError(f"LoRA {index} must be an object with a 'name' or a 'high' and/or 'low' file name")
+        slot = _empty_slot()
+        slot["open"] = False
+        for st in LORA_STAGES:
+            if lora.get(st):
+                name, url, sha256 = _lora_file(index, lora[st], lora.get(f"{st}_url"), lora.get(f"{st}_sha256"))
+                slot.update({st: name, f"{st}_strength": _strength(index, lora.get(f"{st}_strength", strength)),
+                             f"{st}_url": url, f"{st}_sha256": sha256})
+        slots.append(slot)
+    for slot in slots:
+        del slot["open"]
+    return slots
+
+
+def lora_files(loras):
+    """Distinct (name, url, sha256) files the parsed LoRA slots load, in slot order"""
+    files = {}
+    for lora in loras:
+        for stage in LORA_STAGES:
+            if lora[stage]:
+                files.setdefault(lora[stage], (lora[stage], lora[f"{stage}_url"], lora[f"{stage}_sha256"]))
+    return list(files.values())
+
+
+def expand_variations(job_input, max_items):
+    """Expand the `seeds` and/or `prompts` job inputs into per-item overrides (every prompt with every seed).
+
+    Returns None for a single-video job.
+    """
+    lists = []
+    for key, param in (("prompts", "prompt"), ("seeds", "seed")):
+        values = job_input.get(key)
+        if values is None:
+            continue
+        if not isinstance(values, list) or not values:
+            raise PipelineError(f"'{key}' must be a non-empty list")
+        if param == "seed" and not all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+            raise PipelineError("'seeds' must contain integers")
+        if param == "prompt" and not all(isinstance(v, str) for v in values):
+            raise PipelineError("'prompts' must contain strings")
+        lists.append((param, values))
+    if not lists:
+        return None
+    variations = [{}]
+    for param, values in lists:
+        variations = [dict(v, **{param: value}) for v in variations for value in values]
+    if len(variations) > max_items:
+        raise PipelineError(f"Batch of {len(variations)} videos exceeds the limit of {max_items}")
+    return variations
+
+
+def select_pipeline(workflow, lora_count):
+    """Resolve the `workflow` job input to a pipeline name"""
+    if workflow is None:
+        workflow = "wan22" if lora_count else DEFAULT_PIPELINE
+    if workflow in FAMILIES:
+        for name in FAMILIES[workflow]:
+            if len(PIPELINES[name]["lora_slots"]) >= lora_count and get_template(name) is not None:
+                return name
+        raise PipelineError(f"No '{workflow}' workflow supports {lora_count} LoRAs")
+    if workflow not in PIPELINES:
+        raise PipelineError(f"Unknown workflow '{workflow}'. Available: {', '.join(sorted(PIPELINES) + sorted(FAMILIES))}")
+    slots = len(PIPELINES[workflow]["lora_slots"])
+    if lora_count > slots:
+        raise PipelineError(f"Workflow '{workflow}' supports {slots} LoRAs, {lora_count} requested")
+    return workflow
+
+
+def resolve_template(name):
+    """Return the first compiled template of a pipeline, falling back in order"""
+    for template_name in PIPELINES[name]["templates"]:
+        template = get_template(template_name)
+        if template is not None:
+            return template
+    errors = ", ".join(f"{t}: {TEMPLATE_ERRORS.get(t)}" for t in PIPELINES[name]["templates"])
+    raise PipelineError(f"Failed to load any workflow for '{name}'. {errors}")
+
+
+class PatchPlan:
+    """A pipeline's bindings resolved against one template: param -> (node id, input name) targets.
+
+    ``problems`` lists bindings that found no usable input; ``specs`` holds the
+    /object_info schema of each target when one was loaded.
+    """
+
+    def __init__(self, name, template, targets, specs, problems):
+        self.name = name
+        self.template = template
+        self.targets = targets
+        self.specs = specs
+        self.problems = problems
+
+
+# Node schema from /object_info (see schema.py); None skips schema checks
+OBJECT_INFO = None
+_PLANS = {}
+
+
+def set_object_info(object_info):
+    """Install a node schema; plans are recompiled against it on next use"""
+    global OBJECT_INFO
+    OBJECT_INFO = object_info or None
+    _PLANS.clear()
+
+
+def _check_target(graph, node_id, input_name, label):
+    if input_name not in graph[node_id]["inputs"]:
+        return f"{label}: node {node_id} has no input '{input_name}'"
+    if isinstance(graph[node_id]["inputs"][input_name], (list, tuple)):
+        return f"{label}: node {node_id} input '{input_name}' is a link"
+    if OBJECT_INFO is not None:
+        class_type = graph[node_id]["class_type"]
+        if class_type not in OBJECT_INFO:
+            return f"{label}: node {node_id} class {class_type} is not installed in ComfyUI"
+        if input_spec(OBJECT_INFO, class_type, input_name) is None:
+            return f"{label}: node {node_id} ({class_type}) has no input '{input_name}' in /object_info"
+    return None
+
+
+def compile_plan(name, template):
+    """Resolve a pipeline's bindings and LoRA slots against a template; cached per template"""
+    plan = _PLANS.get((name, template.name))
+    if plan is not None and plan.template is template:
+        return plan
+    pipeline = PIPELINES[name]
+    graph = template.graph
+    prefix = f"{name}/{template.name}"
+    targets, specs, problems = {}, {}, []
+    for param, rules in pipeline["bindings"].items():
+        resolved = []
+        for rule in rules:
+            if isinstance(rule, Select):
+                node_ids, input_name = rule.resolve(graph), rule.input
+                if not node_ids and pipeline["strict"]:
+                    problems.append(f"{prefix}: '{param}' matches no node for {rule}")
+            else:
+                (node_id, input_name), node_ids = rule, [rule[0]]
+                if node_id not in graph:
+                    if pipeline["strict"]:
+                        problems.append(f"{prefix}: '{param}' targets missing node {node_id}")
+                    node_ids = []
+            for node_id in node_ids:
+                problem = _check_target(graph, node_id, input_name, f"{prefix}: '{param}'")
+                if problem:
+                    problems.append(problem)
+                    continue
+                resolved.append((node_id, input_name))
+                if OBJECT_INFO is not None:
+                    specs[(node_id, input_name)] = input_spec(OBJECT_INFO, graph[node_id]["class_type"], input_name)
+        if not resolved and not any(p.startswith(f"{prefix}: '{param}'") for p in problems):
+            problems.append(f"{prefix}: '{param}' has no target in the graph")
+        targets[param] = tuple(resolved)
+    for node_id in (n for slot in pipeline["lora_slots"] for n in slot):
+        if node_id not in graph:
+            problems.append(f"{prefix}: LoRA slot node {node_id} is missing")
+            continue
+        for input_name in ("lora_name", "strength_model"):
+            problem = _check_target(graph, node_id, input_name, f"{prefix}: LoRA slot")
+            if problem:
+                problems.append(problem)
+    plan = PatchPlan(name, template, targets, specs, problems)
+    _PLANS[(name, template.name)] = plan
+    return plan
+
+
+def check_params(plan, params):
+    """Problems with parameter values: wrong types, shape rules and /object_info ranges"""
+    problems = []
+    for param, targets in plan.targets.items():
+        value = params.get(param)
+        if value is None or param == "image":
+            continue
+        expected = PARAM_TYPES.get(param)
+        if expected and (not isinstance(value, expected) or isinstance(value, bool)):
+            problems.append(f"'{param}' must be {getattr(expected, '__name__', 'a number')}, got {type(value).__name__}")
+            continue
+        problems.extend(f"'{param}': {reason}" for rule in PARAM_RULES.get(param, []) if (reason := rule(value)))
+        for target in targets:
+            spec = plan.specs.get(target)
+            reason = check_value(spec, value) if spec else None
+            if reason:
+                problems.append(f"'{param}': {reason} (node {target[0]} input '{target[1]}')")
+                break
+    return problems
+
+
+def validate_job(plan, params):
+    """Reject a job before anything is queued: broken bindings or values the graph cannot use"""
+    problems = list(plan.problems) + check_params(plan, params)
+    if problems:
+        raise PipelineError("Invalid job: " + "; ".join(problems))
+
+
+def apply_bindings(prompt, name, params):
+    """Write job parameters onto their bound node inputs; None values keep the template's value"""
+    plan = compile_plan(name, prompt.template)
+    for param, targets in plan.targets.items():
+        value = params.get(param)
+        if value is None:
+            continue
+        for node_id, input_name in targets:
+            prompt.set_input(node_id, input_name, value)
+
+
+def bound_value(prompt, name, param):
+    """Current value of a parameter in a patched graph, read from its first bound input"""
+    for node_id, input_name in compile_plan(name, prompt.template).targets.get(param, ()):
+        return prompt.get_input(node_id, input_name)
+    return None
+
+
+def graph_value(graph, name, param):
+    """Value of a parameter in a materialized graph (PatchedGraph), read from its first bound input"""
+    for node_id, input_name in compile_plan(name, graph.template).targets.get(param, ()):
+        return graph[node_id]['inputs'].get(input_name)
+    return None
+
+
+def draft_params(prompt, name, scale, max_length, max_steps):
+    """Parameter overrides for a cheap draft of a patched graph: smaller, shorter and fewer steps.
+
+    Sizes stay multiples of 16 and lengths of the form 4k+1; seed and prompt are left alone.
+    """
+    draft = {}
+    for param in ("width", "height"):
+        value = bound_value(prompt, name, param)
+        if isinstance(value, int):
+            draft[param] = max(16, int(value * scale) // 16 * 16)
+    length = bound_value(prompt, name, "length")
+    if isinstance(length, int):
+        draft["length"] = min(length, max_length)
+    steps = bound_value(prompt, name, "steps")
+    if isinstance(steps, int):
+        draft["steps"] = min(steps, max_steps)
+    return draft
+
+
+def _is_step(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _move_boundary(value, full_steps, steps):
+    """A step boundary of a ``full_steps`` schedule moved to the same share of ``steps``"""
+    # 0 is the start; values past the end (e.g. end_at_step 10000) already mean "until the last step"
+    if not _is_step(value) or value <= 0 or value > full_steps:
+        return value
+    if value == full_steps:
+        return steps
+    return max(1, min(steps - 1, round(value * steps / full_steps)))
+
+
+def _rescale_splits(prompt, name, steps, full_steps_of):
+    graph = prompt.template.graph
+    for rule in PIPELINES[name].get("step_splits", []):
+        for node_id in rule.resolve(graph):
+            full_steps = full_steps_of(node_id)
+            if not _is_step(full_steps) or full_steps <= 0 or full_steps == steps:
+                continue
+            value = prompt.get_input(node_id, rule.input)
+            moved = _move_boundary(value, full_steps, steps)
+            if moved != value:
+                prompt.set_input(node_id, rule.input, moved)
+
+
+def scale_step_splits(prompt, name, full_steps, draft_steps):
+    """Move step boundaries (e.g. the high/low-noise handover) proportionally for a draft with fewer steps"""
+    if _is_step(full_steps) and _is_step(draft_steps) and draft_steps > 0:
+        _rescale_splits(prompt, name, draft_steps, lambda node_id: full_steps)
+
+
+def _template_split_steps(template, name, node_id):
+    """Steps a node's template boundaries refer to: its own `steps` (samplers) or the pipeline's scheduler's"""
+    inputs = template.graph[node_id]["inputs"]
+    if "steps" in inputs:
+        return inputs["steps"]
+    for target_id, input_name in compile_plan(name, template).targets.get("steps", ()):
+        return template.graph[target_id]["inputs"].get(input_name)
+    return None
+
+
+def fit_step_splits(prompt, name, steps):
+    """Keep each node's step boundaries at its template share of the schedule when a job rebinds `steps`"""
+    if _is_step(steps) and steps > 0:
+        _rescale_splits(prompt, name, steps, lambda node_id: _template_split_steps(prompt.template, name, node_id))
+
+
+def apply_loras(prompt, name, loras):
+    """Bind requested LoRAs to the pipeline's loader chain; unused loaders are bypassed so ComfyUI never sees them"""
+    for index, (high_node, low_node) in enumerate(PIPELINES[name]["lora_slots"]):
+        lora = loras[index] if index < len(loras) else None
+        for node_id, stage in ((high_node, "high"), (low_node, "low")):
+            if lora and lora[stage]:
+                prompt.set_input(node_id, "lora_name", lora[stage])
+                prompt.set_input(node_id, "strength_model", lora[f"{stage}_strength"])
+            else:
+                prompt.bypass(node_id, "model")
+
+
+def apply_last_frame(prompt, name, image_filename):
+    """Feed a second input image to the pipeline's end frame input.
+
+    The end frame gets its own LoadImage plus a copy of the node that prepares
+    the start image (e.g. the center-cropping ImageScale), so both frames share size and crop.
+    """
+    rule = PIPELINES[name].get("last_frame")
+    targets = rule.resolve(prompt.template.graph) if rule else []
+    if not targets:
+        raise PipelineError(f"Workflow '{name}' has no last frame input; use a first/last-frame workflow such as 'wan22'")
+    for node_id in targets:
+        load_id = f"{node_id}_last_image"
+        prompt.add_node(load_id, "LoadImage", {"image": image_filename}, title="Last frame")
+        source = prompt.get_input(node_id, "start_image")
+        if isinstance(source, (list, tuple)) and prompt.has_input(source[0], "image"):
+            prep_id = f"{node_id}_last_prep"
+            prompt.add_node(prep_id, prompt.get_class_type(source[0]), dict(prompt.get_inputs(source[0]), image=[load_id, 0]))
+            prompt.set_input(node_id, rule.input, [prep_id, source[1]])
+        else:
+            prompt.set_input(node_id, rule.input, [load_id, 0])
+
+
+def frame_rate(prompt, name):
+    """Frame rate of the pipeline's video output in a patched graph, None when it is not a number"""
+    rule = PIPELINES[name]["frame_rate"]
+    for node_id in rule.resolve(prompt.template.graph):
+        value = prompt.get_input(node_id, rule.input)
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+            return value
+    return None
+
+
+def add_last_frame_output(prompt, name, prefix):
+    """Save the last decoded frame of every video output as an image.
+
+    Returns {video node: SaveImage node}; the video node is the one that
+    receives the frames (VHS_VideoCombine or CreateVideo).
+    """
+    rule = PIPELINES[name]["frames"]
+    savers = {}
+    for node_id in rule.resolve(prompt.template.graph):
+        pick_id, save_id = f"{node_id}_last_frame_pick", f"{node_id}_last_frame"
+        # ImageFromBatch clamps the index to the batch, so 4095 selects the last frame of any length
+        prompt.add_node(pick_id, "ImageFromBatch", {"image": list(prompt.get_input(node_id, rule.input)),
+                                                    "batch_index": 4095, "length": 1})
+        prompt.add_node(save_id, "SaveImage", {"images": [pick_id, 0], "filename_prefix": prefix})
+        savers[node_id] = save_id
+    return savers
+
+
+def validate_pipelines():
+    """Compile every pipeline against its templates; returns a list of problems (empty when valid)"""
+    problems = []
+    for name, pipeline in PIPELINES.items():
+        for template_name in pipeline["templates"]:
+            template = get_template(template_name)
+            if template is not None:
+                problems.extend(compile_plan(name, template).problems)
+    return problems
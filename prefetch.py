@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Boot-time model prefetch: read every model file the workflows reference from
+the network volume in parallel, before the first job needs it.
+
+Modes:
+  warm  read each file once so it sits in the page cache (safe to run next to ComfyUI)
+  copy  copy files to local disk, record them in a manifest with SHA-256 checksums
+        and list the local directories first in extra_model_paths.yaml
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from pipelines import PIPELINES
+from warm import NAME_INPUTS
+from workflows import TEMPLATES
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_THREADS = int(os.getenv('PREFETCH_THREADS', '8'))
+PREFETCH_LOCAL_DIR = os.getenv('PREFETCH_LOCAL_DIR', '/local-models')
+PREFETCH_WORKFLOWS = [w for w in os.getenv('PREFETCH_WORKFLOWS', '').split(',') if w]
+MODEL_PATHS_FILE = os.getenv('MODEL_PATHS_FILE', '/ComfyUI/extra_model_paths.yaml')
+READ_CHUNK = 16 * 1024 * 1024
+
+# Model folder per loader input; CLIPVisionLoader reuses clip_name for a different folder
+FOLDERS = {"unet_name": "diffusion_models", "clip_name": "text_encoders", "vae_name": "vae", "lora_name": "loras"}
+CLASS_FOLDERS = {("CLIPVisionLoader", "clip_name"): "clip_vision"}
+
+
+def model_references(templates=None):
+    """Sorted (folder, file name) pairs loaded by the given templates, excluding per-job LoRA slots"""
+    templates = templates or list(TEMPLATES)
+    job_slots = {node_id for pipeline in PIPELINES.values() for slot in pipeline["lora_slots"] for node_id in slot}
+    refs = set()
+    for name in templates:
+        template = TEMPLATES.get(name)
+        if template is None:
+            logger.warning(f"⚠️ Unknown workflow '{name}' skipped")
+            continue
+        for node_id, node in template.graph.items():
+            if node_id in job_slots:
+                continue
+            for input_name in NAME_INPUTS:
+                value = node['inputs'].get(input_name)
+                if isinstance(value, str) and value:
+                    folder = CLASS_FOLDERS.get((node['class_type'], input_name), FOLDERS[input_name])
+                    refs.add((folder, value))
+    return sorted(refs)
+
+
+def search_paths(config_path):
+    """Folder -> directories listed for it in extra_model_paths.yaml, in ComfyUI's lookup order"""
+    with open(config_path) as f:
+        config = yaml.safe_load(f) or {}
+    paths = {}
+    for section in config.values():
+        if not isinstance(section, dict):
+            continue
+        base = section.get('base_path', '')
+        for folder, value in section.items():
+            if folder in ('base_path', 'is_default') or not isinstance(value, str):
+                continue
+            for line in value.splitlines():
+                line = line.strip()
+                if line:
+                    paths.setdefault(folder, []).append(os.path.join(base, line))
+    return paths
+
+
+def locate(folder, name, paths, local_dir=None):
+    """First existing file for a model, skipping the local copy directory"""
+    for directory in paths.get(folder, []):
+        if local_dir and os.path.abspath(directory).startswith(os.path.abspath(local_dir) + os.sep):
+            continue
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _stream(source, sink=None):
+    """Read a file sequentially (optionally writing it to ``sink``); returns its SHA-256"""
+    digest = hashlib.sha256()
+    with open(source, 'rb') as f:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        for chunk in iter(lambda: f.read(READ_CHUNK), b''):
+            digest.update(chunk)
+            if sink is not None:
+                sink.write(chunk)
+    return digest.hexdigest()
+
+
+def prefetch_file(folder, name, source, mode, local_dir=None, previous=None):
+    """Warm or copy one model file; returns its manifest entry"""
+    stat = os.stat(source)
+    entry = {"folder": folder, "name": name, "source": source, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+    start = time.monotonic()
+    if mode == "copy":
+        target = os.path.join(local_dir, folder, name)
+        entry["local"] = target
+        same = previous and all(previous.get(k) == entry[k] for k in ("source", "size", "mtime"))
+        if same and os.path.isfile(target) and os.path.getsize(target) == stat.st_size:
+            entry.update(sha256=previous.get("sha256"), seconds=0.0, status="unchanged")
+            return entry
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if shutil.disk_usage(os.path.dirname(target)).free < stat.st_size:
+            mode = "warm"
+            entry.pop("local")
+            logger.warning(f"⚠️ Not enough local disk for {name}, warming the page cache instead")
+        else:
+            part = f"{target}.part"
+            try:
+                with open(part, 'wb') as sink:
+                    entry["sha256"] = _stream(source, sink)
+                os.replace(part, target)
+            except OSError:
+                if os.path.exists(part):
+                    os.remove(part)
+                raise
+    if mode == "warm":
+        entry["sha256"] = _stream(source)
+    seconds = time.monotonic() - start
+    entry.update(seconds=round(seconds, 3), status="copied" if "local" in entry else "warmed")
+    entry["mb_per_s"] = round(stat.st_size / (1024 * 1024) / seconds, 1) if seconds > 0 else None
+    return entry
+
+
+def rewrite_model_paths(config_path, local_dir, folders):
+    """List ``local_dir/<folder>/`` first for each folder that has local copies; idempotent"""
+    with open(config_path) as f:
+        lines = f.read().splitlines()
+    out = []
+    current = None
+    for line in lines:
+        out.append(line)
+        stripped = line.strip()
+        if stripped.endswith(': |'):
+            current = stripped[:-3]
+            local = os.path.join(local_dir, current) + '/'
+            if current in folders and local not in (l.strip() for l in lines):
+                indent = line[:len(line) - len(line.lstrip())] + '    '
+                out.append(f"{indent}{local}")
+    with open(config_path, 'w') as f:
+        f.write('\n'.join(out) + '\n')
+
+
+def prefetch(mode, config_path=MODEL_PATHS_FILE, local_dir=PREFETCH_LOCAL_DIR, templates=None, threads=PREFETCH_THREADS):
+    """Prefetch every referenced model in parallel; returns the manifest"""
+    paths = search_paths(config_path)
+    manifest_path = os.path.join(local_dir, "manifest.json") if mode == "copy" else None
+    previous = {}
+    if manifest_path and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = {(e["folder"], e["name"]): e for e in json.load(f).get("files", [])}
+
+    jobs, missing = [], []
+    for folder, name in model_references(templates):
+        source = locate(folder, name, paths, local_dir)
+        if source is None:
+            missing.append({"folder": folder, "name": name, "status": "missing"})
+        else:
+            jobs.append((folder, name, source))
+    # Largest files first so the pool does not finish on one long read
+    jobs.sort(key=lambda job: os.path.getsize(job[2]), reverse=True)
+
+    start = time.monotonic()
+    entries = []
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(prefetch_file, folder, name, source, mode, local_dir, previous.get((folder, name)))
+                   for folder, name, source in jobs]
+        for future in futures:
+            try:
+                entry = future.result()
+            except OSError as e:
+                logger.error(f"❌ Prefetch failed: {e}")
+                continue
+            entries.append(entry)
+            rate = f"{entry['mb_per_s']} MB/s" if entry.get("mb_per_s") else entry["status"]
+            logger.info(f"📦 {entry['folder']}/{entry['name']}: {entry['size'] / 1e9:.2f} GB in {entry['seconds']}s ({rate})")
+    for entry in missing:
+        logger.warning(f"⚠️ {entry['folder']}/{entry['name']} not found in any model path")
+
+    total = sum(e["size"] for e in entries)
+    seconds = time.monotonic() - start
+    manifest = {"mode": mode, "seconds": round(seconds, 3), "bytes": total, "files": entries + missing}
+    logger.info(f"✅ Prefetched {len(entries)} files ({total / 1e9:.2f} GB) in {seconds:.1f}s")
+
+    if manifest_path:
+        os.makedirs(local_dir, exist_ok=True)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        local_folders = {e["folder"] for e in entries if e.get("local")}
+        if local_folders:
+            rewrite_model_paths(config_path, local_dir, local_folders)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prefetch model files referenced by the workflows")
+    parser.add_argument("--mode", choices=("warm", "copy"), default=os.getenv('PREFETCH_MODE', 'warm'))
+    parser.add_argument("--config", default=MODEL_PATHS_FILE)
+    parser.add_argument("--local-dir", default=PREFETCH_LOCAL_DIR)
+    parser.add_argument("--threads", type=int, default=PREFETCH_THREADS)
+    args = parser.parse_args(argv)
+    prefetch(args.mode, args.config, args.local_dir, PREFETCH_WORKFLOWS or None, args.threads)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionError(Exception):
+    """ComfyUI reported an execution error or interruption for the tracked prompt"""
+
+    def __init__(self, message, node_id=None, node_type=None):
+        super().__init__(message)
+        self.node_id = node_id
+        self.node_type = node_type
+
+
+class JobAborted(Exception):
+    """A job passed its deadline or was cancelled before its prompt finished"""
+
+
+class ExecutionTracker:
+    """Follows ComfyUI WebSocket events for one prompt.
+
+    Records wall-clock time per executed node (cached nodes count as zero)
+    and forwards throttled progress updates to ``notify``.
+    """
+
+    def __init__(self, prompt, notify=None, min_interval=1.0, prompt_id=None):
+        self.prompt = prompt
+        self.prompt_id = prompt_id
+        self.notify = notify
+        self.min_interval = min_interval
+        self.started = time.monotonic()
+        self.nodes = []
+        self.cached = []
+        self.outputs = {}
+        self.done = False
+        self.finished = None
+        self._current = None
+        self._current_start = None
+        self._last_notify = 0.0
+
+    def _node_info(self, node_id):
+        node = self.prompt.get(node_id, {})
+        meta = node.get('_meta') or {}
+        return node.get('class_type'), meta.get('title')
+
+    def _finish_current(self, now):
+        if self._current is None:
+            return
+        class_type, title = self._node_info(self._current)
+        self.nodes.append({
+            "node": self._current,
+            "class_type": class_type,
+            "title": title,
+            "seconds": round(now - self._current_start, 3),
+        })
+        self._current = None
+
+    def _emit(self, payload, force=False):
+        if self.notify is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_notify < self.min_interval:
+            return
+        self._last_notify = now
+        try:
+            self.notify(payload)
+        except Exception as e:
+            logger.warning(f"Progress update failed: {e}")
+
+    def handle(self, message):
+        """Consume one decoded WebSocket message; returns True once the prompt has finished"""
+        msg_type = message.get('type')
+        data = message.get('data') or {}
+        if data.get('prompt_id') not in (None, self.prompt_id):
+            return False
+        now = time.monotonic()
+
+        if msg_type == 'execution_start':
+            self.started = now
+        elif msg_type == 'execution_cached':
+            self.cached.extend(str(n) for n in data.get('nodes', []))
+        elif msg_type == 'executing':
+            self._finish_current(now)
+            node_id = data.get('node')
+            if node_id is None:
+                self.done = True
+                self.finished = now
+                self._emit({"status": "finished", "elapsed": round(now - self.started, 3)}, force=True)
+                return True
+            self._current = str(node_id)
+            self._current_start = now
+            class_type, title = self._node_info(self._current)
+            self._emit({
+                "status": "executing", "node": self._current, "class_type": class_type, "title": title,
+                "nodes_done": len(self.nodes), "nodes_total": len(self.prompt) - len(self.cached),
+            }, force=True)
+        elif msg_type == 'progress':
+            node_id = str(data.get('node') or self._current)
+            class_type, title = self._node_info(node_id)
+            value, maximum = data.get('value', 0), data.get('max', 0)
+            self._emit({
+                "status": "progress", "node": node_id, "class_type": class_type, "title": title,
+                "step": value, "steps": maximum,
+            }, force=bool(maximum) and value >= maximum)
+        elif msg_type == 'execution_error':
+            self._finish_current(now)
+            node_id = data.get('node_id')
+            node_type = data.get('node_type')
+            raise ExecutionError(
+                f"Node {node_id} ({node_type}) failed: {data.get('exception_type', '')} {data.get('exception_message', '')}".strip(),
+                node_id, node_type)
+        elif msg_type == 'execution_interrupted':
+            self._finish_current(now)
+            raise ExecutionError(f"Execution interrupted at node {data.get('node_id')}", data.get('node_id'), data.get('node_type'))
+        return False
+
+    def summary(self):
+        """Per-node timing breakdown plus totals grouped by node class"""
+        by_class = {}
+        for entry in self.nodes:
+            key = entry['class_type'] or 'unknown'
+            by_class[key] = round(by_class.get(key, 0.0) + entry['seconds'], 3)
+        return {
+            "total_seconds": round((self.finished or time.monotonic()) - self.started, 3),
+            "nodes": list(self.nodes),
+            "by_class": by_class,
+            "cached_nodes": list(self.cached),
+        }
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import mimetypes
+
+logger = logging.getLogger(__name__)
+
+# Local cache of finished videos; RESULT_CACHE_MB=0 disables result caching
+RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR', '/tmp/result_cache')
+RESULT_CACHE_MB = float(os.getenv('RESULT_CACHE_MB', '10240'))
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', str(7 * 24 * 3600)))
+# Optional cache shared by all workers: a directory (e.g. on the network volume) or s3://bucket/prefix
+RESULT_CACHE_SHARED = os.getenv('RESULT_CACHE_SHARED') or None
+RESULT_CACHE_SHARED_MB = float(os.getenv('RESULT_CACHE_SHARED_MB', '51200'))
+
+# Container extensions a cached video may have (VP9/AV1 outputs are WebM); stored with the entry
+VIDEO_EXTENSIONS = (".mp4", ".webm", ".mkv", ".mov", ".gif")
+
+
+def _extension(path):
+    ext = os.path.splitext(path)[1].lower()
+    return ext if ext in VIDEO_EXTENSIONS else ".mp4"
+
+
+def result_key(prompt, image_filename, image_sha256, extra=None):
+    """Hash of the patched API graph with the input image identified by content rather than file name.
+
+    ``extra`` covers processing outside the graph (e.g. re-encoding) that changes the delivered file.
+    """
+    canonical = {}
+    for node_id, node in prompt.items():
+        inputs = {name: f"sha256:{image_sha256}" if value == image_filename else value
+                  for name, value in node['inputs'].items()}
+        # Titles and other _meta do not affect the output
+        canonical[node_id] = {"class_type": node['class_type'], "inputs": inputs}
+    if extra:
+        canonical = {"graph": canonical, "extra": extra}
+    payload = json.dumps(canonical, sort_keys=True, separators=(',', ':'), default=list)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _place(source, target, move=False):
+    """Atomically put ``source`` at ``target`` by rename, hardlink or copy"""
+    tmp_target = f"{target}.{os.getpid()}.tmp"
+    if move:
+        try:
+            os.replace(source, target)
+            return
+        except OSError:
+            pass
+    try:
+        os.link(source, tmp_target)
+    except OSError:
+        shutil.copyfile(source, tmp_target)
+    os.replace(tmp_target, target)
+
+
+class DiskResultCache:
+    """Videos and their metadata in one directory, evicted by TTL and then least recent use"""
+
+    transient = False
+
+    def __init__(self, directory, max_bytes=None, ttl=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _video_path(self, key, ext):
+        return os.path.join(self.directory, f"{key}{ext}")
+
+    def _remove(self, key):
+        for path in [self._meta_path(key)] + [self._video_path(key, ext) for ext in VIDEO_EXTENSIONS]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, key):
+        """Return (video path, metadata) or None"""
+        try:
+            with open(self._meta_path(key)) as f:
+                meta = json.load(f)
+            if self.ttl is not None and time.time() - meta.get("created", 0) > self.ttl:
+                self._remove(key)
+                return None
+            video_path = self._video_path(key, meta.get("ext", ".mp4"))
+            # The video's mtime records last use for LRU eviction
+            os.utime(video_path)
+        except (FileNotFoundError, ValueError):
+            return None
+        return video_path, meta
+
+    def put(self, key, source, meta, move=False):
+        os.makedirs(self.directory, exist_ok=True)
+        meta_path = self._meta_path(key)
+        meta = dict(meta, created=meta.get("created", time.time()), ext=_extension(source))
+        video_path = self._video_path(key, meta["ext"])
+        # Metadata first: eviction treats a video without metadata as garbage
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+        _place(source, video_path, move=move)
+        self.evict()
+        return video_path
+
+    def evict(self, now=None):
+        """Drop expired entries, then the least recently used until under ``max_bytes``"""
+        now = time.time() if now is None else now
+        videos, created = [], {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                key, ext = os.path.splitext(entry.name)
+                if ext in VIDEO_EXTENSIONS:
+                    stat = entry.stat()
+                    videos.append((stat.st_mtime, stat.st_size, key))
+                elif ext == ".json":
+                    # Metadata is written once, so its mtime is the creation time
+                    created[key] = entry.stat().st_mtime
+        total = sum(size for _, size, _ in videos)
+        for _, size, key in sorted(videos):
+            expired = key not in created or (self.ttl is not None and now - created[key] > self.ttl)
+            if expired or (self.max_bytes is not None and total > self.max_bytes):
+                self._remove(key)
+                total -= size
+
+
+class S3ResultCache:
+    """Videos stored as s3://bucket/prefix/<key>.<ext> with metadata on the object.
+
+    Age is checked against LastModified; a bucket lifecycle rule should delete
+    objects past the TTL. Hits are downloaded into ``scratch_dir``.
+    """
+
+    # get() returns a temporary download that the caller may move
+    transient = True
+
+    def __init__(self, bucket, prefix="", ttl=None, scratch_dir=None, client=None):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.ttl = ttl
+        self.scratch_dir = scratch_dir or tempfile.gettempdir()
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from runpod.serverless.utils import rp_upload
+            self._client, _ = rp_upload.get_boto_client()
+            if self._client is None:
+                raise RuntimeError("No bucket configured for the shared result cache")
+        return self._client
+
+    def _object_key(self, key, ext=""):
+        return f"{self.prefix}/{key}{ext}" if self.prefix else f"{key}{ext}"
+
+    def get(self, key):
+        """Download a cached video; returns (path, metadata) or None"""
+        from botocore.exceptions import ClientError
+
+        # Keys are fixed-length hashes, so "<key>." only matches this entry, whatever its extension
+        listing = self.client.list_objects_v2(Bucket=self.bucket, Prefix=self._object_key(key, "."), MaxKeys=1)
+        if not listing.get("Contents"):
+            return None
+        object_key = listing["Contents"][0]["Key"]
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=object_key)
+        except ClientError:
+            return None
+        created = head["LastModified"].timestamp()
+        if self.ttl is not None and time.time() - created > self.ttl:
+            return None
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=self.scratch_dir, suffix=_extension(object_key))
+        os.close(fd)
+        self.client.download_file(self.bucket, object_key, path)
+        meta = json.loads(head.get("Metadata", {}).get("result", "{}"))
+        return path, dict(meta, created=created)
+
+    def put(self, key, source, meta):
+        ext = _extension(source)
+        self.client.upload_file(source, self.bucket, self._object_key(key, ext), ExtraArgs={
+            "ContentType": mimetypes.guess_type(f"video{ext}")[0] or "application/octet-stream",
+            "Metadata": {"result": json.dumps(meta)}})
+
+
+class ResultCache:
+    """Local result cache with an optional shared backend behind it"""
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key):
+        """Return (video path, metadata) or None; shared hits are copied into the local cache"""
+        hit = self.local.get(key)
+        if hit is not None or self.shared is None:
+            return hit
+        try:
+            hit = self.shared.get(key)
+            if hit is not None:
+                path, meta = hit
+                return self.local.put(key, path, meta, move=self.shared.transient), meta
+        except Exception as e:
+            logger.warning(f"Shared result cache lookup failed: {e}")
+        return None
+
+    def put(self, key, source, meta):
+        meta = dict(meta, created=time.time())
+        try:
+            self.local.put(key, source, meta)
+        except OSError as e:
+            logger.warning(f"Could not store result in local cache: {e}")
+        if self.shared is not None:
+            try:
+                self.shared.put(key, source, meta)
+            except Exception as e:
+                logger.warning(f"Could not store result in shared cache: {e}")
+
+
+def result_cache_from_env():
+    """Build the result cache from RESULT_CACHE_* variables; None when disabled"""
+    if RESULT_CACHE_MB <= 0:
+        return None
+    local = DiskResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MB * 1024 * 1024, RESULT_CACHE_TTL)
+    shared = None
+    if RESULT_CACHE_SHARED and RESULT_CACHE_SHARED.startswith("s3://"):
+        bucket, _, prefix = RESULT_CACHE_SHARED[len("s3://"):].partition('/')
+        shared = S3ResultCache(bucket, prefix, RESULT_CACHE_TTL, scratch_dir=RESULT_CACHE_DIR)
+    elif RESULT_CACHE_SHARED:
+        shared = DiskResultCache(RESULT_CACHE_SHARED, RESULT_CACHE_SHARED_MB * 1024 * 1024, RESULT_CACHE_TTL)
+    return ResultCache(local, shared)
@@ -0,0 +1,78 @@
+import os
+import json
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Last /object_info response, so jobs can be validated before ComfyUI answers again
+OBJECT_INFO_CACHE = os.getenv('OBJECT_INFO_CACHE', '/tmp/object_info.json')
+
+TYPES = {"INT": (int,), "FLOAT": (int, float), "STRING": (str,), "BOOLEAN": (bool,)}
+
+
+def load_object_info(client=None, path=OBJECT_INFO_CACHE):
+    """ComfyUI's node schema: fetched from the server when a client is given, else read from the disk cache.
+
+    Returns None when neither is available.
+    """
+    if client is not None:
+        try:
+            info = client.get_object_info()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not fetch /object_info: {e}")
+        else:
+            if info:
+                try:
+                    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix=".tmp")
+                    with os.fdopen(fd, 'w') as f:
+                        json.dump(info, f)
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    logger.warning(f"⚠️ Could not cache /object_info at {path}: {e}")
+                return info
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def input_spec(object_info, class_type, name):
+    """(type, options) of a node input from /object_info; None when the class or input is unknown"""
+    node = object_info.get(class_type)
+    if node is None:
+        return None
+    for section in ("required", "optional"):
+        spec = (node.get("input") or {}).get(section, {}).get(name)
+        if spec is not None:
+            kind = spec[0]
+            options = spec[1] if len(spec) > 1 and isinstance(spec[1], dict) else {}
+            # Combo inputs list their choices in place of a type name (or under "options" in newer servers)
+            if isinstance(kind, list):
+                return "COMBO", dict(options, options=kind)
+            return kind, options
+    return None
+
+
+def check_value(spec, value):
+    """Why ``value`` is not accepted by an input spec, or None when it is"""
+    kind, options = spec
+    if kind == "COMBO":
+        choices = options.get("options")
+        if choices and value not in choices:
+            shown = ", ".join(map(str, choices[:10]))
+            return f"'{value}' is not one of {shown}{', ...' if len(choices) > 10 else ''}"
+        return None
+    types = TYPES.get(kind)
+    if types is None:
+        return None
+    if not isinstance(value, types) or (kind != "BOOLEAN" and isinstance(value, bool)):
+        return f"expected {kind.lower()}, got {type(value).__name__}"
+    if kind in ("INT", "FLOAT"):
+        if options.get("min") is not None and value < options["min"]:
+            return f"{value} is below the minimum {options['min']}"
+        if options.get("max") is not None and value > options["max"]:
+            return f"{value} is above the maximum {options['max']}"
+    return None
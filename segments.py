@@ -0,0 +1,59 @@
+import os
+import math
+import logging
+import tempfile
+import subprocess
+
+from encoding import TRANSCODE_TIMEOUT, find_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+# Frames per segment of a long video (4k+1); each segment is one ComfyUI prompt
+SEGMENT_LENGTH = int(os.getenv('SEGMENT_LENGTH', '81'))
+# Most segments one job may chain
+MAX_SEGMENTS = int(os.getenv('MAX_SEGMENTS', '8'))
+# Shortest segment worth a sampling pass
+MIN_SEGMENT_LENGTH = 5
+
+
+class SegmentError(Exception):
+    """A long-video request cannot be split into segments (bad duration or segment length, too many segments)"""
+
+
+def plan_segments(frames, segment_length=SEGMENT_LENGTH, max_segments=MAX_SEGMENTS):
+    """Split ``frames`` into the fewest equal segments of at most ``segment_length`` frames.
+
+    Every segment has 4k+1 frames and the plan covers at least ``frames``.
+    Each segment starts on the last frame of the one before it.
+    """
+    if isinstance(segment_length, bool) or not isinstance(segment_length, int) or segment_length < MIN_SEGMENT_LENGTH \
+            or segment_length % 4 != 1:
+        raise SegmentError(f"segment_length must be 4k+1 and at least {MIN_SEGMENT_LENGTH}, got {segment_length}")
+    if isinstance(frames, bool) or not isinstance(frames, int) or frames <= 0:
+        raise SegmentError(f"Invalid frame count {frames}")
+    count = math.ceil(frames / segment_length)
+    if count > max_segments:
+        raise SegmentError(f"{frames} frames need {count} segments of {segment_length}, more than the {max_segments} allowed")
+    length = max(MIN_SEGMENT_LENGTH, math.ceil((math.ceil(frames / count) - 1) / 4) * 4 + 1)
+    return [length] * count
+
+
+def stitch(paths, target, ffmpeg=None):
+    """Join segment videos into ``target`` with ffmpeg's concat demuxer and stream copy (no re-encode)"""
+    ffmpeg = ffmpeg or find_ffmpeg()
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg not found; set FFMPEG_PATH to stitch segments")
+    fd, list_path = tempfile.mkstemp(suffix=".txt", prefix="concat_")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            for path in paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        command = [ffmpeg, "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy"]
+        if target.endswith(".mp4"):
+            command += ["-movflags", "+faststart"]
+        subprocess.run(command + [target], check=True, capture_output=True, timeout=TRANSCODE_TIMEOUT)
+    finally:
+        os.remove(list_path)
+    logger.info(f"🧵 Stitched {len(paths)} segments into {os.path.basename(target)} ({os.path.getsize(target)} bytes)")
+    return target
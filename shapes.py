@@ -0,0 +1,143 @@
+import os
+import math
+import logging
+import threading
+
+from metrics import Counter, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Resolution buckets as "WxH,WxH,..." (multiples of 16) and frame-count buckets as "33,49,81" (4k+1);
+# requested shapes snap to them so torch.compile sees few distinct shapes. Unset disables snapping.
+SHAPE_BUCKETS = os.getenv('SHAPE_BUCKETS', '')
+LENGTH_BUCKETS = os.getenv('LENGTH_BUCKETS', '')
+# Most times a waiting job may be passed over by later jobs of the running shape
+SHAPE_MAX_BYPASS = int(os.getenv('SHAPE_MAX_BYPASS', '4'))
+
+SHAPE_PARAMS = ("width", "height", "length")
+
+RECOMPILES = Counter("handler_shape_switches_total",
+                     "Admissions of a compiled graph whose shape differs from the previous compiled one "
+                     "(each costs a torch.compile recompile)", ["pipeline"])
+BUCKETS = Counter("handler_shape_buckets_total", "Requested shapes by bucket outcome (hit, snapped, unbucketed)",
+                  ["result"])
+REORDERED = Counter("handler_shape_reorders_total", "Admissions that went ahead of an older job to keep the shape")
+REGISTRY.extend([RECOMPILES, BUCKETS, REORDERED])
+
+
+class ShapeConfigError(ValueError):
+    """SHAPE_BUCKETS or LENGTH_BUCKETS is malformed or breaks Wan's size rules"""
+
+
+def parse_resolutions(text):
+    """'832x480,480x832' -> [(832, 480), (480, 832)]"""
+    buckets = []
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        try:
+            width, height = (int(v) for v in item.lower().split('x'))
+        except ValueError:
+            raise ShapeConfigError(f"Resolution bucket '{item}' is not WIDTHxHEIGHT")
+        if width <= 0 or height <= 0 or width % 16 or height % 16:
+            raise ShapeConfigError(f"Resolution bucket '{item}' must be positive multiples of 16")
+        buckets.append((width, height))
+    return buckets
+
+
+def parse_lengths(text):
+    """'33,81' -> [33, 81]"""
+    lengths = []
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        if not item.isdigit() or int(item) % 4 != 1:
+            raise ShapeConfigError(f"Length bucket '{item}' must be a frame count of the form 4k+1")
+        lengths.append(int(item))
+    return sorted(lengths)
+
+
+def snap_resolution(width, height, buckets):
+    """Bucket closest to the request in aspect ratio and area (both compared on a log scale).
+
+    Returns the request itself when there are no buckets.
+    """
+    if not buckets:
+        return width, height
+    ratio, area = math.log(width / height), math.log(width * height)
+    return min(buckets, key=lambda b: abs(math.log(b[0] / b[1]) - ratio) + abs(math.log(b[0] * b[1]) - area))
+
+
+def snap_length(length, buckets):
+    """Shortest bucket that fits the request, else the longest; the request itself when there are no buckets"""
+    if not buckets:
+        return length
+    return next((b for b in buckets if b >= length), buckets[-1])
+
+
+def snap_shape(shape, resolutions, lengths):
+    """Snap a (width, height, length) request; parts that are not ints are left alone"""
+    width, height, length = shape
+    if all(isinstance(v, int) and not isinstance(v, bool) and v > 0 for v in (width, height)):
+        width, height = snap_resolution(width, height, resolutions)
+    if isinstance(length, int) and not isinstance(length, bool) and length > 0:
+        length = snap_length(length, lengths)
+    return width, height, length
+
+
+def is_compiled(graph):
+    """True when the graph compiles its model, so a new shape costs a recompile"""
+    return any(node['class_type'].startswith("TorchCompile") for node in graph.values())
+
+
+class ShapeScheduler:
+    """Admits jobs to a fixed number of ComfyUI queue slots, preferring the shape that ran last.
+
+    Waiting jobs of the last admitted shape go first. A job is passed over at
+    most ``max_bypass`` times before it is admitted regardless of its shape.
+    Without competing shapes the order is first come, first served.
+    """
+
+    def __init__(self, slots, max_bypass=SHAPE_MAX_BYPASS):
+        self.free = slots
+        self.max_bypass = max_bypass
+        self.last_shape = None
+        self.last_compiled_shape = None
+        self._waiting = []
+        self._cond = threading.Condition()
+
+    def _next(self):
+        oldest = self._waiting[0]
+        if oldest["bypassed"] >= self.max_bypass:
+            return oldest
+        return next((w for w in self._waiting if w["shape"] == self.last_shape), oldest)
+
+    def acquire(self, shape, compiled=False, check=None, interval=1.0):
+        """Block until this job may queue a prompt; ``check`` runs every ``interval`` seconds and may raise"""
+        waiter = {"shape": shape, "bypassed": 0}
+        with self._cond:
+            self._waiting.append(waiter)
+            try:
+                while not (self.free and self._next() is waiter):
+                    self._cond.wait(interval)
+                    if check is not None:
+                        check()
+            except BaseException:
+                self._waiting.remove(waiter)
+                self._cond.notify_all()
+                raise
+            index = self._waiting.index(waiter)
+            for older in self._waiting[:index]:
+                older["bypassed"] += 1
+            if index:
+                REORDERED.inc()
+            self._waiting.remove(waiter)
+            self.free -= 1
+            # Another slot may still be free for the waiter that is next now
+            self._cond.notify_all()
+            self.last_shape = shape
+            if compiled:
+                if self.last_compiled_shape is not None and shape != self.last_compiled_shape:
+                    RECOMPILES.inc(pipeline=shape[0] if isinstance(shape, tuple) else shape)
+                self.last_compiled_shape = shape
+
+    def release(self):
+        with self._cond:
+            self.free += 1
+            self._cond.notify_all()
@@ -0,0 +1,110 @@
+import os
+import logging
+
+from pipelines import PIPELINES
+
+logger = logging.getLogger(__name__)
+
+# Preset for jobs that do not set `speed` (empty: the graph's own settings)
+SPEED_PRESET = os.getenv('SPEED_PRESET', '')
+# Sampling preset "auto" uses; auto only chooses the memory settings from the GPU
+SPEED_AUTO_PRESET = os.getenv('SPEED_AUTO_PRESET', 'balanced')
+# Models stay loaded between jobs on GPUs with at least this much VRAM, and this much of it free
+SPEED_RESIDENT_GB = float(os.getenv('SPEED_RESIDENT_GB', '40'))
+SPEED_MIN_FREE_GB = float(os.getenv('SPEED_MIN_FREE_GB', '8'))
+
+GB = 1024 ** 3
+
+# Sampling settings per preset. `cache` sets the EasyCache nodes (None bypasses them, so every step
+# is computed); `cfg_window` is the share of high-noise steps that run with CFG (two model passes each).
+# The high/low-noise handover moves with `steps` in proportion to the graph's own split.
+PRESETS = {
+    "turbo": {"steps": 6, "cfg_window": 0.2,
+              "cache": {"reuse_threshold": 0.3, "start_percent": 0.1, "end_percent": 0.95}},
+    # The values the wan22 graphs were tuned with
+    "balanced": {"steps": 10, "cfg_window": 0.33,
+                 "cache": {"reuse_threshold": 0.2, "start_percent": 0.15, "end_percent": 0.95}},
+    "quality": {"steps": 20, "cfg_window": 0.5, "cache": None},
+}
+
+# VRAM_Debug settings per memory mode: keep models resident for the next job, or free VRAM after each run
+MEMORY_MODES = {
+    "resident": {"unload_all_models": False, "empty_cache": False},
+    "offload": {"unload_all_models": True, "empty_cache": True},
+}
+
+if SPEED_AUTO_PRESET not in PRESETS:
+    logger.warning(f"⚠️ Unknown SPEED_AUTO_PRESET '{SPEED_AUTO_PRESET}' (available: {', '.join(PRESETS)}); using 'balanced'")
+    SPEED_AUTO_PRESET = "balanced"
+
+
+class SpeedError(Exception):
+    """The job's `speed` input names an unknown preset or the workflow has nothing to tune"""
+
+
+def gpu_memory(system_stats):
+    """(total, free) VRAM in bytes of the first GPU in ComfyUI's /system_stats, or None"""
+    for device in (system_stats or {}).get("devices") or []:
+        total, free = device.get("vram_total"), device.get("vram_free")
+        if device.get("type") != "cpu" and isinstance(total, (int, float)) and total > 0:
+            return total, free if isinstance(free, (int, float)) else total
+    return None
+
+
+def resolve_speed(value, system_stats=None, keep_loaded=False):
+    """Turn the `speed` job input into the preset to apply; None when absent.
+
+    "auto" takes SPEED_AUTO_PRESET for sampling and picks the memory mode from
+    the GPU: models stay resident on GPUs with SPEED_RESIDENT_GB of VRAM and
+    SPEED_MIN_FREE_GB of it free, and are unloaded after each run otherwise.
+    Without GPU stats the graph's memory settings are kept. ``keep_loaded``
+    (WARM_MODELS) makes every preset resident, so the reported mode is the one applied.
+    """
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str) or (value != "auto" and value not in PRESETS):
+        raise SpeedError(f"Unknown speed preset '{value}'. Available: {', '.join(list(PRESETS) + ['auto'])}")
+    resolved = {"requested": value, "preset": value, "memory": None}
+    if value == "auto":
+        resolved["preset"] = SPEED_AUTO_PRESET
+        memory = gpu_memory(system_stats)
+        if memory is not None:
+            total, free = memory
+            large = total >= SPEED_RESIDENT_GB * GB and free >= SPEED_MIN_FREE_GB * GB
+            resolved.update(memory="resident" if large else "offload",
+                            vram_total_gb=round(total / GB, 1), vram_free_gb=round(free / GB, 1))
+    if keep_loaded:
+        resolved["memory"] = "resident"
+    return resolved
+
+
+def check_speed(name, resolved):
+    """Reject a preset for a pipeline without the nodes it tunes"""
+    if resolved is not None and not PIPELINES[name].get("speed"):
+        raise SpeedError(f"Workflow '{name}' has no speed settings; use a 'wan22' workflow for 'speed'")
+
+
+def speed_params(resolved):
+    """Bound job parameters the preset sets unless the job gives them"""
+    return {"steps": PRESETS[resolved["preset"]]["steps"]} if resolved else {}
+
+
+def apply_speed(prompt, name, resolved):
+    """Patch the pipeline's cache, CFG window and memory nodes (steps are bound like a job's own `steps`)"""
+    if resolved is None:
+        return
+    preset = PRESETS[resolved["preset"]]
+    graph = prompt.template.graph
+    rules = PIPELINES[name]["speed"]
+    for node_id in rules["cache"].resolve(graph):
+        if preset["cache"] is None:
+            prompt.bypass(node_id, "model")
+        else:
+            for input_name, value in preset["cache"].items():
+                prompt.set_input(node_id, input_name, value)
+    for node_id in rules["cfg_window"].resolve(graph):
+        prompt.set_input(node_id, rules["cfg_window"].input, preset["cfg_window"])
+    if resolved["memory"] is not None:
+        for node_id in rules["unload"].resolve(graph):
+            for input_name, value in MEMORY_MODES[resolved["memory"]].items():
+                prompt.set_input(node_id, input_name, value)
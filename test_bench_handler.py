@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Tests for the handler load test against the fake ComfyUI server
+"""
+
+from bench_handler import compare, percentile, run_benchmark
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) is None
+
+
+def test_benchmark_reports_latency_and_stages():
+    report = run_benchmark(jobs=4, concurrency=2, execution_delay=0.0, output_size=4096, image_size=(64, 48))
+    assert report["jobs"] == 4 and report["errors"] == 0
+    assert report["throughput"] > 0 and report["peak_rss_mb"] > 0
+    assert report["latency"]["p50"] <= report["latency"]["p99"] <= report["latency"]["max"]
+    assert {"input_decode", "queue", "execution", "history_fetch", "output"} <= set(report["stages"])
+
+
+def test_compare_flags_regressions():
+    baseline = {"throughput": 10.0, "latency": {"p50": 1.0, "p95": 2.0, "p99": 3.0},
+                "stages": {"input_decode": {"mean": 0.1}, "queue": {"mean": 0.0001}}}
+    report = {"throughput": 8.0, "latency": {"p50": 1.05, "p95": 2.0, "p99": 3.0},
+              "stages": {"input_decode": {"mean": 0.2}, "queue": {"mean": 0.0005}}}
+    rows, regressions = compare(report, baseline, threshold=0.1)
+    # Slower input decoding and lower throughput count; a sub-millisecond stage does not
+    assert regressions == ["throughput", "stages.input_decode.mean"]
+    assert len(rows) == 6
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Tests for the persistent ComfyUI connection manager against the fake ComfyUI server
+"""
+
+import json
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import pytest
+
+from comfy_client import ComfyClient, ComfyAPIError, EventDispatcher, backoff_delays
+from fake_comfyui import FakeComfyUI
+
+
+@pytest.fixture
+def client(fake):
+    client = ComfyClient("127.0.0.1", fake.port, str(uuid.uuid4()))
+    yield client
+    client.close()
+
+
+def wait_for_completion(client, prompt_id):
+    while True:
+        message = json.loads(client.recv())
+        data = message.get("data", {})
+        if message["type"] == "executing" and data.get("node") is None and data.get("prompt_id") == prompt_id:
+            return
+
+
+def test_ready_once(fake, client):
+    assert client.wait_until_ready(timeout=5)
+    requests_after_boot = len(fake.requests)
+    assert client.wait_until_ready(timeout=5)
+    assert len(fake.requests) == requests_after_boot
+    assert fake.ws_connections == 1
+
+
+def test_not_ready_times_out():
+    client = ComfyClient("127.0.0.1", 1, "x")
+    assert not client.wait_until_ready(timeout=0.2, max_interval=0.05)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_ready_soon_after_delayed_start():
+    port = free_port()
+    delay = random.uniform(0.2, 0.5)
+    servers = []
+    timer = threading.Timer(delay, lambda: servers.append(FakeComfyUI(port=port).start()))
+    client = ComfyClient("127.0.0.1", port, str(uuid.uuid4()))
+    start = time.monotonic()
+    timer.start()
+    try:
+        waiters = [threading.Thread(target=client.wait_until_ready, kwargs={"timeout": 10}) for _ in range(4)]
+        for waiter in waiters:
+            waiter.start()
+        assert client.wait_until_ready(timeout=10)
+        for waiter in waiters:
+            waiter.join()
+        # Backoff is capped at one second, so readiness trails the server start by well under that
+        assert time.monotonic() - start < delay + 1.5
+        assert client.ready and client.system_stats["system"]["os"] == "fake"
+        # Concurrent callers shared one probe loop and one WebSocket
+        assert servers[0].ws_connections == 1
+    finally:
+        timer.join()
+        client.close()
+        for server in servers:
+            server.stop()
+
+
+def test_not_ready_when_process_exits():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    client = ComfyClient("127.0.0.1", free_port(), "x")
+    start = time.monotonic()
+    assert not client.wait_until_ready(timeout=30, process_id=process.pid)
+    assert time.monotonic() - start < 5
+
+
+def test_http_keep_alive_reused(fake, client):
+    client.wait_until_ready(timeout=5)
+    for _ in range(3):
+        prompt_id = client.queue_prompt(json.dumps({"1": {"class_type": "X", "inputs": {}}}))["prompt_id"]
+        wait_for_completion(client, prompt_id)
+        history = client.get_history(prompt_id)[prompt_id]
+        video = history["outputs"]["277"]["gifs"][0]
+        assert len(client.get_image(video["filename"], "", "output")) == fake.output_size
+    # One connection for the readiness probe and all API calls, one for the WebSocket
+    assert fake.connections == 2
+    assert fake.ws_connections == 1
+
+
+def test_api_error_raised(client):
+    with pytest.raises(ComfyAPIError) as excinfo:
+        client.queue_prompt("{}")
+    assert excinfo.value.status == 400
+
+
+def test_websocket_reconnects_after_drop(fake, client):
+    client.wait_until_ready(timeout=5)
+    assert json.loads(client.recv())["type"] == "status"
+    fake.drop_websockets()
+    # The first recv notices the drop and reconnects; the fresh socket greets with a status event
+    message = json.loads(client.recv())
+    assert message["type"] == "status"
+    assert fake.ws_connections == 2
+    prompt_id = client.queue_prompt(json.dumps({"1": {"class_type": "X", "inputs": {}}}))["prompt_id"]
+    wait_for_completion(client, prompt_id)
+
+
+def test_backoff_is_bounded():
+    delays = backoff_delays(base=0.1, cap=1.0)
+    values = [next(delays) for _ in range(20)]
+    assert all(0 <= d <= 1.0 for d in values)
+
+
+def test_get_videos_over_shared_connection(fake, client):
+    import os
+    from handler import get_videos
+    from workflows import get_template
+
+    client.wait_until_ready(timeout=5)
+    prompt = get_template("test_simple_workflow").overlay().materialize()
+    for _ in range(2):
+        videos = get_videos(client, prompt)
+        assert os.path.getsize(videos["277"][0]) == fake.output_size
+    assert fake.ws_connections == 1
+
+
+def test_dispatcher_routes_events_by_prompt(fake, client):
+    client.wait_until_ready(timeout=5)
+    prompt_ids = [client.queue_prompt(json.dumps({str(i): {"class_type": "X", "inputs": {}}}))["prompt_id"]
+                  for i in range(3)]
+    # Subscribe in reverse order: events that arrived earlier are buffered per prompt
+    for prompt_id in reversed(prompt_ids):
+        events = client.subscribe(prompt_id)
+        while True:
+            message = events.get(timeout=5)
+            assert message["data"]["prompt_id"] == prompt_id
+            if message["type"] == "executing" and message["data"]["node"] is None:
+                break
+        client.unsubscribe(prompt_id)
+    assert fake.ws_connections == 1
+
+
+def test_dispatcher_drops_late_and_unclaimed_events():
+    dispatcher = EventDispatcher(client=None, finished_kept=2, unclaimed_ttl=0.05)
+    q = dispatcher.subscribe("a")
+    dispatcher._deliver("a", {"type": "executing"})
+    dispatcher.unsubscribe("a")
+    # Late events of a finished prompt do not recreate its queue
+    dispatcher._deliver("a", {"type": "status"})
+    assert q.qsize() == 1 and "a" not in dispatcher._queues
+    # Events buffered before subscribe are handed over; unclaimed ones expire
+    dispatcher._deliver("b", {"type": "execution_start"})
+    assert dispatcher.subscribe("b").get_nowait()["type"] == "execution_start"
+    dispatcher._deliver("orphan", {"type": "executing"})
+    time.sleep(0.06)
+    dispatcher._deliver("b", {"type": "executing"})
+    assert set(dispatcher._queues) == {"b"}
+    for prompt_id in ("b", "c", "d"):
+        dispatcher.unsubscribe(prompt_id)
+    assert list(dispatcher._finished) == ["c", "d"] and dispatcher._queues == {}
+
+
+def test_concurrent_jobs_share_one_worker(fake, worker):
+    import asyncio
+    from warm import warmup_job
+
+    fake.node_delay = 0.01
+
+    async def run_all():
+        jobs = []
+        for seed in range(4):
+            job = warmup_job("i2v")
+            job["input"]["seed"] = seed
+            jobs.append(worker.async_handler(job))
+        return await asyncio.gather(*jobs)
+
+    results = asyncio.run(run_all())
+    assert all("error" not in r for r in results)
+    assert len({r["sha256"] for r in results}) == 4
+    # The next prompt was already queued while another executed, but never more than the admission bound
+    assert 1 < fake.max_pending <= worker.MAX_QUEUED_PROMPTS
+    assert fake.ws_connections == 1
+    assert worker.concurrency_modifier(1) == worker.MAX_CONCURRENCY
+
+
+def test_cancel_prompt_deletes_or_interrupts(fake, client):
+    fake.hang_node = "1"
+    client.wait_until_ready(timeout=5)
+    graph = json.dumps({"1": {"class_type": "X", "inputs": {}}})
+    running, waiting = (client.queue_prompt(graph)["prompt_id"] for _ in range(2))
+    deadline = time.monotonic() + 5
+    while fake.running != running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client.cancel_prompt(waiting) is False
+    assert fake.deleted == [waiting] and fake.interrupts == 0
+    assert client.cancel_prompt(running) is True
+    assert fake.interrupts == 1
+
+
+def test_stuck_job_times_out_and_frees_comfyui(fake, worker):
+    from warm import warmup_job
+
+    fake.hang_node = "57"
+    job = warmup_job("i2v")
+    job["input"]["timeout"] = 0.5
+    start = time.monotonic()
+    result = worker.handler(job)
+    assert result["aborted"] and "deadline" in result["error"]
+    assert time.monotonic() - start < 5
+    assert fake.interrupts == 1
+    # Partial timings: the nodes that ran before the stuck one, and the stages reached
+    assert result["node_timings"]["nodes"] and "execution" in result["timings"]
+
+    # The GPU is free again: the next job runs normally
+    fake.hang_node = None
+    assert "error" not in worker.handler(warmup_job("i2v"))
+
+
+def test_lost_completion_event_falls_back_to_history(fake, worker, monkeypatch):
+    from warm import warmup_job
+
+    monkeypatch.setattr(worker, "HISTORY_FALLBACK_INTERVAL", 0.2)
+    fake.drop_final_event = True
+    result = worker.handler(warmup_job("i2v"))
+    assert "error" not in result and result["size"] == fake.output_size
+
+
+def test_cancelled_job_interrupts_prompt(fake, worker):
+    from warm import warmup_job
+
+    fake.hang_node = "57"
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    result = worker.handler(warmup_job("i2v"), cancel)
+    assert result["aborted"] and "cancelled" in result["error"]
+    assert fake.interrupts == 1
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for job-level output encoding: profiles, save-node patching, size estimates and re-encoding
+"""
+
+import os
+import shutil
+
+import pytest
+
+from encoding import (EncodingError, apply_encoding, applied_encoding, estimate_size, find_ffmpeg, parse_encoding,
+                      transcode)
+from pipelines import resolve_template
+
+
+def test_parse_profiles_and_overrides():
+    assert parse_encoding(None) is None
+    assert parse_encoding("preview") == {"profile": "preview", "codec": "h264", "crf": 30, "preset": "veryfast",
+                                         "pix_fmt": "yuv420p"}
+    assert parse_encoding({"profile": "final", "crf": 23})["crf"] == 23
+    assert parse_encoding({"codec": "vp9", "crf": 40}) == {"codec": "vp9", "crf": 40}
+    for bad in ("draft", {"codec": "mpeg2"}, {"crf": 60}, {"crf": "20"}, {"fps": 0}, {"pix_fmt": "rgb24"},
+                {"preset": "instant"}, {"bitrate": 1}, 5):
+        with pytest.raises(EncodingError):
+            parse_encoding(bad)
+
+
+def test_vhs_node_encodes_everything():
+    prompt = resolve_template("wan22_nolora").overlay()
+    settings = parse_encoding({"codec": "h265", "crf": 28, "fps": 24, "preset": "fast"})
+    remaining = apply_encoding(prompt, settings)
+    graph = prompt.materialize()
+    assert remaining == {}
+    # VHS has no speed preset, so the report leaves it out
+    assert applied_encoding(settings, remaining) == {"codec": "h265", "crf": 28, "fps": 24}
+    assert graph["277"]["inputs"]["format"] == "video/h265-mp4"
+    assert graph["277"]["inputs"]["crf"] == 28 and graph["277"]["inputs"]["frame_rate"] == 24
+
+
+def test_save_video_graph_needs_ffmpeg_for_quality():
+    prompt = resolve_template("i2v").overlay()
+    assert apply_encoding(prompt, parse_encoding({"codec": "h264", "fps": 24})) == {}
+    graph = prompt.materialize()
+    assert graph["61"]["inputs"]["codec"] == "h264" and graph["109"]["inputs"]["fps"] == 24
+    remaining = apply_encoding(resolve_template("i2v").overlay(), parse_encoding("preview"))
+    assert remaining == {"codec": "h264", "crf": 30, "preset": "veryfast", "pix_fmt": "yuv420p"}
+    assert applied_encoding(parse_encoding("preview"), remaining)["preset"] == "veryfast"
+    vp9 = parse_encoding({"codec": "vp9", "preset": "slow"})
+    assert "preset" not in applied_encoding(vp9, apply_encoding(resolve_template("i2v").overlay(), vp9))
+
+
+def test_estimate_shrinks_with_crf_and_codec():
+    final = estimate_size(640, 640, 81, parse_encoding("final"))
+    assert estimate_size(640, 640, 81, parse_encoding("preview")) < final / 2
+    assert estimate_size(640, 640, 81, {"codec": "av1", "crf": 19}) < final
+    assert estimate_size(640, 640, 81) > final
+
+
+@pytest.mark.skipif(find_ffmpeg() is None, reason="ffmpeg not installed")
+def test_transcode_with_ffmpeg(tmp_path):
+    import subprocess
+    source = str(tmp_path / "in.mp4")
+    subprocess.run([find_ffmpeg(), "-v", "error", "-f", "lavfi", "-i", "testsrc=size=64x64:rate=16", "-frames:v", "17",
+                    "-c:v", "libx264", "-crf", "10", source], check=True)
+    target = transcode(source, parse_encoding("preview"))
+    assert target.endswith(".h264.mp4") and os.path.getsize(target) > 0
+
+
+def test_handler_reencodes_and_reports(fake, worker, monkeypatch):
+    from warm import warmup_job
+
+    calls = []
+
+    def fake_transcode(path, settings):
+        calls.append(settings)
+        target = path + ".h264.mp4"
+        shutil.copyfile(path, target)
+        return target
+
+    monkeypatch.setattr(worker, "transcode", fake_transcode)
+    job = warmup_job("i2v")
+    job["input"]["encoding"] = "preview"
+    result = worker.handler(job)
+    assert "error" not in result and calls == [{"codec": "h264", "crf": 30, "preset": "veryfast", "pix_fmt": "yuv420p"}]
+    assert result["encoding"]["transcoded"] and result["encoding"]["estimated_size"] > 0
+    assert result["encoding"]["preset"] == "veryfast"
+    assert "transcode" in result["timings"]
+
+    # Without ffmpeg the rendered video is still delivered
+    monkeypatch.setattr(worker, "transcode", lambda path, settings: (_ for _ in ()).throw(RuntimeError("no ffmpeg")))
+    result = worker.handler(job)
+    assert "error" not in result and "no ffmpeg" in result["encoding_warning"]
+    assert worker.handler(dict(job, input=dict(job["input"], encoding="tiny")))["error"].startswith("Unknown encoding profile")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Tests for remote image inputs: pooled downloads, retries, limits and the local content cache
+"""
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from fetch import Fetcher, FetchError
+from warm import blank_png
+
+
+class ImageServer:
+    """Local stand-in for a CDN or bucket: serves fixed bodies and scripted failures per path"""
+
+    def __init__(self):
+        self.files = {}
+        self.failures = {}
+        self.requests = []
+        self.connections = set()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                server.requests.append(path)
+                server.connections.add(self.client_address)
+                if server.failures.get(path):
+                    server.failures[path] -= 1
+                    self._reply(503, b"busy")
+                elif path == "/moved":
+                    self.send_response(302)
+                    self.send_header("Location", "/a.png")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                elif path in server.files:
+                    self._reply(200, server.files[path])
+                else:
+                    self._reply(404, b"missing")
+
+            def _reply(self, status, body):
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def images():
+    server = ImageServer()
+    server.files["/a.png"] = blank_png()
+    server.files["/b.png"] = blank_png(8, 8)
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    fetcher = Fetcher(str(tmp_path / "cache"), cache_max_bytes=1024 * 1024, max_bytes=64 * 1024, retries=2)
+    yield fetcher
+    fetcher.close()
+
+
+def test_repeated_url_served_from_cache(images, fetcher):
+    path = fetcher.fetch(f"{images.url}/a.png?sig=1")
+    assert open(path, 'rb').read() == blank_png()
+    assert fetcher.fetch(f"{images.url}/a.png?sig=1") == path
+    assert images.requests == ["/a.png"]
+    # Same content under another URL is downloaded once more but stored once
+    assert fetcher.fetch(f"{images.url}/a.png?sig=2") == path
+    assert len(os.listdir(fetcher.blob_dir)) == 1
+
+
+def test_connections_are_reused_and_fetches_run_in_parallel(images, fetcher):
+    paths = fetcher.fetch_many([f"{images.url}/a.png", f"{images.url}/b.png"])
+    assert [open(p, 'rb').read() for p in paths] == [blank_png(), blank_png(8, 8)]
+    fetcher.fetch(f"{images.url}/moved")
+    assert images.requests[-2:] == ["/moved", "/a.png"]
+    assert len(images.connections) <= 2
+
+
+def test_transient_errors_are_retried(images, fetcher):
+    images.failures["/a.png"] = 2
+    assert open(fetcher.fetch(f"{images.url}/a.png"), 'rb').read() == blank_png()
+    assert images.requests == ["/a.png"] * 3
+
+    images.failures["/b.png"] = 5
+    with pytest.raises(FetchError, match="HTTP 503 .after 3 attempts"):
+        fetcher.fetch(f"{images.url}/b.png")
+
+
+@pytest.mark.parametrize("url,fragment", [
+    ("/missing.png", "HTTP 404"),
+    ("/large.png", "byte limit"),
+    ("ftp://host/a.png", "Unsupported URL"),
+])
+def test_permanent_failures_are_not_retried(images, fetcher, url, fragment):
+    images.files["/large.png"] = b"x" * (128 * 1024)
+    with pytest.raises(FetchError, match=fragment):
+        fetcher.fetch(url if "://" in url else f"{images.url}{url}")
+    assert len(images.requests) <= 1
+    # Partial downloads are not left behind
+    assert not os.path.isdir(fetcher.blob_dir) or os.listdir(fetcher.blob_dir) == []
+
+
+def test_least_recently_used_blobs_are_evicted(images, fetcher):
+    fetcher.cache_max_bytes = len(blank_png()) + len(blank_png(8, 8)) - 1
+    first = fetcher.fetch(f"{images.url}/a.png")
+    os.utime(first, (1, 1))
+    second = fetcher.fetch(f"{images.url}/b.png")
+    assert not os.path.exists(first) and os.path.exists(second)
+    assert os.listdir(fetcher.link_dir) == [os.path.basename(fetcher._link(f"{images.url}/b.png"))]
+    fetcher.fetch(f"{images.url}/a.png")
+    assert images.requests == ["/a.png", "/b.png", "/a.png"]
+
+
+def test_handler_fetches_first_and_last_frame(images, fake, worker, tmp_path, monkeypatch):
+    from warm import warmup_job
+
+    monkeypatch.setattr(worker, "fetcher", Fetcher(str(tmp_path / "fetch_cache")))
+    job = warmup_job("wan22_nolora")
+    del job["input"]["image_base64"]
+    job["input"].update(image_url=f"{images.url}/a.png", last_image_url=f"{images.url}/b.png")
+    result = worker.handler(job)
+    assert "error" not in result and "input_fetch" in result["timings"]
+
+    prompt, = fake.prompts.values()
+    end_prep = prompt["481"]["inputs"]["end_image"][0]
+    load = prompt[end_prep]["inputs"]["image"][0]
+    assert prompt[load]["inputs"]["image"] != prompt["260"]["inputs"]["image"]
+    assert prompt[end_prep]["inputs"]["crop"] == prompt["847"]["inputs"]["crop"]
+
+    job["input"]["workflow"] = "i2v"
+    assert "no last frame input" in worker.handler(job)["error"]
+    job["input"].update(workflow="wan22_nolora", last_image_url=f"{images.url}/missing.png")
+    assert "HTTP 404" in worker.handler(job)["error"]
@@ -34,7 +34,7 @@ def create_test_job():
 
 def test_workflow_conversion():
     """Test the workflow conversion function"""
-    from handler import load_workflow
+    from workflows import load_workflow
     
     print("Testing workflow conversion...")
     
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for input image ingestion into the ComfyUI input directory
+"""
+
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from inputs import (InputImageError, collect_garbage, cover_size, ingest_bytes, ingest_path, prepare_image,
+                    sniff_extension)
+from warm import blank_png
+
+
+def encode(size, format="JPEG", mode="RGB", exif=None):
+    out = io.BytesIO()
+    image = Image.new(mode, size, (200, 100, 50, 128) if "A" in mode else (200, 100, 50))
+    image.save(out, format=format, **({"exif": exif} if exif else {}))
+    return out.getvalue()
+
+
+def test_sniff_extension():
+    assert sniff_extension(blank_png()[:16]) == "png"
+    assert sniff_extension(b"\xff\xd8\xff\xe0" + b"\0" * 12) == "jpg"
+    assert sniff_extension(b"RIFF\0\0\0\0WEBPVP8 ") == "webp"
+    assert sniff_extension(b"not an image") == "bin"
+
+
+def test_bytes_are_stored_once_by_content(tmp_path):
+    first = ingest_bytes(blank_png(), str(tmp_path))
+    second = ingest_bytes(blank_png(), str(tmp_path))
+    assert first == second and first.startswith("in_") and first.endswith(".png")
+    assert os.listdir(tmp_path) == [first]
+    assert (tmp_path / first).read_bytes() == blank_png()
+    assert ingest_bytes(blank_png(8, 8), str(tmp_path)) != first
+
+
+def test_path_is_linked_not_copied(tmp_path):
+    source = tmp_path / "volume" / "portrait.png"
+    source.parent.mkdir()
+    source.write_bytes(blank_png())
+    input_dir = tmp_path / "input"
+
+    name = ingest_path(str(source), str(input_dir))
+    assert name.startswith("ln_") and name.endswith(".png")
+    assert os.path.islink(input_dir / name)
+    assert (input_dir / name).read_bytes() == blank_png()
+    assert ingest_path(str(source), str(input_dir)) == name
+
+    # A file already in the input directory is referenced in place
+    (input_dir / "sub").mkdir()
+    (input_dir / "sub" / "a.png").write_bytes(blank_png())
+    assert ingest_path(str(input_dir / "sub" / "a.png"), str(input_dir)) == os.path.join("sub", "a.png")
+
+
+def test_missing_path_raises(tmp_path):
+    with pytest.raises(OSError):
+        ingest_path(str(tmp_path / "missing.png"), str(tmp_path / "input"))
+
+
+def test_garbage_collection_is_lru_and_capped(tmp_path):
+    names = [ingest_bytes(bytes([i]) * 100, str(tmp_path)) for i in range(4)]
+    for age, name in zip((400, 300, 200, 100), names):
+        os.utime(tmp_path / name, (1000 - age, 1000 - age))
+    (tmp_path / "user_upload.png").write_bytes(b"x" * 1000)
+
+    # Files younger than min_age survive even when over the cap
+    assert collect_garbage(str(tmp_path), max_bytes=0, min_age=250, now=1000) == 200
+    assert sorted(os.listdir(tmp_path)) == sorted(names[2:] + ["user_upload.png"])
+    assert collect_garbage(str(tmp_path), max_bytes=100, min_age=0, now=1000) == 100
+    assert sorted(os.listdir(tmp_path)) == sorted([names[3], "user_upload.png"])
+
+
+def test_cover_size_keeps_aspect_and_never_upscales():
+    assert cover_size((4000, 3000), 1024, 1024) == (1366, 1024)
+    assert cover_size((3000, 4000), 1024, 512) == (1024, 1366)
+    assert cover_size((800, 600), 1024, 1024) == (800, 600)
+
+
+def test_large_image_is_downsampled(tmp_path):
+    data, size = prepare_image(encode((3840, 2160)), 1024, 1536)
+    assert size == (2731, 1536)
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.format == "JPEG" and image.size == size
+
+    # Transparency survives as PNG
+    data, size = prepare_image(encode((2000, 1000), "PNG", "RGBA"), 200, 200)
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.format == "PNG" and image.mode == "RGBA" and image.size == (400, 200)
+
+
+def test_small_image_and_path_pass_through(tmp_path):
+    assert prepare_image(blank_png(), 128, 128) == (None, (64, 64))
+    path = tmp_path / "portrait.png"
+    path.write_bytes(blank_png())
+    assert prepare_image(str(path), 32, 32)[1] == (32, 32)
+    assert prepare_image(str(path)) == (None, (64, 64))
+
+
+def test_exif_orientation_is_applied_before_resize():
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    data, size = prepare_image(encode((2000, 1000), exif=exif.tobytes()), 100, 100)
+    assert size == (100, 200)
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.size == (100, 200)
+
+
+@pytest.mark.parametrize("payload,message", [
+    (b"definitely not an image", "not a recognized"),
+    (encode((64, 64), "TIFF"), "unsupported format"),
+    (encode((512, 512))[:300], "corrupt"),
+], ids=["garbage", "tiff", "truncated"])
+def test_bad_inputs_are_rejected(payload, message):
+    with pytest.raises(InputImageError) as excinfo:
+        prepare_image(payload, 64, 64)
+    assert message in str(excinfo.value)
+
+
+def test_handler_rejects_bad_image_before_queueing(fake, worker):
+    import base64
+
+    result = worker.handler({"input": {"image_base64": base64.b64encode(b"not an image").decode()}})
+    assert result["error"].startswith("Invalid input image")
+    assert ("POST", "/prompt") not in fake.requests
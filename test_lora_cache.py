@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Tests for per-job LoRAs: local copies from the volume or a URL, checksums, LRU eviction and prefetch
+"""
+
+import os
+import hashlib
+
+import pytest
+
+from fetch import Fetcher
+from lora_cache import LoraCache, LoraCacheError
+from test_fetch import ImageServer
+
+
+@pytest.fixture
+def volume(tmp_path):
+    directory = tmp_path / "volume"
+    directory.mkdir()
+    for name, size in (("a.safetensors", 100), ("b.safetensors", 200), ("c.safetensors", 300)):
+        (directory / name).write_bytes(name[0].encode() * size)
+    return directory
+
+
+@pytest.fixture
+def cache(tmp_path, volume):
+    fetcher = Fetcher(str(tmp_path / "fetch"), retries=0)
+    yield LoraCache(str(tmp_path / "local"), str(volume), max_bytes=550, max_file_bytes=1000, fetcher=fetcher)
+    fetcher.close()
+
+
+def test_volume_lora_copied_once_and_verified(cache, volume):
+    sha = hashlib.sha256((volume / "a.safetensors").read_bytes()).hexdigest()
+    assert cache.acquire([("a.safetensors", None, sha)]) == {"a.safetensors": "copied"}
+    assert open(os.path.join(cache.cache_dir, "a.safetensors"), 'rb').read() == b"a" * 100
+    assert cache.ensure("a.safetensors", sha256=sha) == "hit"
+    assert cache.index["a.safetensors"]["sha256"] == sha and cache.index["a.safetensors"]["uses"] == 2
+
+    (volume / "b.safetensors").write_bytes(b"tampered")
+    with pytest.raises(LoraCacheError, match="checksum mismatch"):
+        cache.ensure("b.safetensors", sha256="0" * 64)
+    assert not os.path.exists(os.path.join(cache.cache_dir, "b.safetensors"))
+    # Names found nowhere are left to ComfyUI's own model paths
+    assert cache.ensure("elsewhere.safetensors") == "passthrough"
+
+
+def test_least_recently_used_unpinned_loras_are_evicted(cache, tmp_path):
+    cache.acquire([("a.safetensors", None, None)])
+    cache.ensure("b.safetensors")
+    cache.release(["a.safetensors"])
+    # 100 + 200 + 300 > 550: 'a' is the oldest unpinned copy
+    cache.ensure("c.safetensors")
+    assert not os.path.exists(os.path.join(cache.cache_dir, "a.safetensors"))
+    assert os.path.exists(os.path.join(cache.cache_dir, "c.safetensors"))
+
+    # Pinned files stay; a volume LoRA that does not fit then loads from the volume
+    cache.pin(["b.safetensors", "c.safetensors"])
+    assert cache.ensure("a.safetensors") == "volume"
+    # The index survives a restart; evicted entries keep their use counts for prefetch ranking
+    reloaded = LoraCache(cache.cache_dir, cache.source_dir, max_bytes=550)
+    assert reloaded.index["a.safetensors"]["size"] is None and reloaded.index["a.safetensors"]["uses"] == 1
+    assert reloaded.hot(["b.safetensors"], top=3) == ["b.safetensors", "a.safetensors", "c.safetensors"]
+
+
+def test_url_lora_downloaded_with_checksum(cache):
+    server = ImageServer()
+    server.files["/remote.safetensors"] = b"r" * 150
+    try:
+        url = f"{server.url}/remote.safetensors"
+        sha = hashlib.sha256(b"r" * 150).hexdigest()
+        assert cache.ensure("remote.safetensors", url, sha) == "downloaded"
+        assert cache.ensure("remote.safetensors", url, sha) == "hit"
+        assert cache.index["remote.safetensors"]["source"] == url
+        # The same name from another URL is downloaded again rather than served from the old copy
+        server.files["/other/remote.safetensors"] = b"o" * 150
+        assert cache.ensure("remote.safetensors", f"{server.url}/other/remote.safetensors") == "downloaded"
+        assert open(os.path.join(cache.cache_dir, "remote.safetensors"), 'rb').read() == b"o" * 150
+        assert cache.ensure("remote.safetensors", url, sha) == "downloaded"
+        with pytest.raises(LoraCacheError, match="Checksum mismatch"):
+            cache.ensure("other.safetensors", url, "1" * 64)
+        assert not os.path.exists(os.path.join(cache.cache_dir, "other.safetensors"))
+        with pytest.raises(LoraCacheError, match="HTTP 404"):
+            cache.ensure("missing.safetensors", f"{server.url}/missing.safetensors")
+        # Prefetch re-downloads URL LoRAs after they were evicted
+        os.remove(os.path.join(cache.cache_dir, "remote.safetensors"))
+        assert cache.prefetch() == {"remote.safetensors": "downloaded"}
+
+        # Presigned URLs are stored without their signature and not prefetched
+        assert cache.ensure("signed.safetensors", f"{url}?X-Amz-Signature=secret", sha) == "downloaded"
+        entry = cache.index["signed.safetensors"]
+        assert entry["source"] == url and entry["signed"] is True
+        assert "secret" not in open(os.path.join(cache.cache_dir, ".lora_cache.json")).read()
+        os.remove(os.path.join(cache.cache_dir, "signed.safetensors"))
+        assert "signed.safetensors" not in cache.prefetch(["signed.safetensors"])
+    finally:
+        server.stop()
+
+
+def test_disabled_cache_reads_the_volume(volume, tmp_path):
+    cache = LoraCache(str(tmp_path / "local"), str(volume), max_bytes=0)
+    assert cache.ensure("a.safetensors") == "volume"
+    with pytest.raises(LoraCacheError, match="LORA_CACHE_MB"):
+        cache.ensure("remote.safetensors", "https://cdn/remote.safetensors")
+    assert not os.path.exists(cache.cache_dir)
+
+
+def test_handler_caches_job_loras(fake, worker):
+    from warm import warmup_job
+
+    volume = worker.lora_cache.source_dir
+    os.makedirs(volume)
+    with open(os.path.join(volume, "style.safetensors"), 'wb') as f:
+        f.write(b"s" * 64)
+    job = warmup_job("wan22")
+    job["input"]["loras"] = [{"name": "style.safetensors", "stage": "high", "strength": 0.6}]
+    result = worker.handler(job)
+    assert "error" not in result and "lora_fetch" in result["timings"]
+    assert result["workflow"] == "wan22_1lora"
+    assert os.path.exists(os.path.join(worker.lora_cache.cache_dir, "style.safetensors"))
+    assert worker.lora_cache._pins == {}
+
+    prompt, = fake.prompts.values()
+    assert prompt["282"]["inputs"]["lora_name"] == "style.safetensors"
+    # The unused low-noise loader is left out of the graph
+    assert "286" not in prompt and prompt["390"]["inputs"]["model"] == ["285", 0]
+
+    job["input"]["loras"][0]["sha256"] = "0" * 64
+    assert "checksum mismatch" in worker.handler(job)["error"]
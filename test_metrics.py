@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for stage timings, the Prometheus endpoint and redacted input logging
+"""
+
+import json
+import urllib.request
+
+from metrics import (Counter, Histogram, Timings, JOBS, STAGE_SECONDS, loggable_input, record_job, redact,
+                     start_metrics_server)
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("h_seconds", "help", ["stage"], buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, stage="queue")
+    lines = histogram.render()
+    assert 'h_seconds_bucket{stage="queue",le="0.1"} 1' in lines
+    assert 'h_seconds_bucket{stage="queue",le="1"} 2' in lines
+    assert 'h_seconds_bucket{stage="queue",le="+Inf"} 3' in lines
+    assert 'h_seconds_count{stage="queue"} 3' in lines
+    assert histogram.count(stage="queue") == 3
+
+
+def test_counter_and_job_recording():
+    counter = Counter("c_total", "help")
+    counter.inc()
+    counter.inc(2)
+    assert counter.render()[-1] == "c_total 3"
+
+    before = JOBS.value(status="error")
+    timings = Timings()
+    with timings.stage("queue"):
+        pass
+    result = record_job({"error": "boom"}, timings)
+    assert JOBS.value(status="error") == before + 1
+    assert set(result["timings"]) == {"queue", "total"}
+
+
+def test_redact_masks_secrets_and_truncates():
+    job_input = {"image_base64": "A" * 100000, "prompt": "a fox", "s3Config": {"secretKey": "x", "bucketName": "b"},
+                 "seeds": list(range(50))}
+    safe = redact(job_input)
+    assert safe["prompt"] == "a fox"
+    assert safe["s3Config"]["secretKey"] == "***" and safe["s3Config"]["bucketName"] == "b"
+    assert "(100000 chars)" in safe["image_base64"] and len(safe["image_base64"]) < 200
+    assert len(safe["seeds"]) == 21
+    assert redact("https://b.s3.amazonaws.com/a.png?X-Amz-Signature=abc") == "https://b.s3.amazonaws.com/a.png?***"
+    assert len(loggable_input({"prompts": ["p" * 150] * 20}, limit=500)) < 600
+
+
+def test_metrics_endpoint_serves_text_format():
+    assert start_metrics_server(port=0) is None
+    server = start_metrics_server(port=19090)
+    try:
+        # Only reachable from inside the container unless METRICS_HOST opts in
+        assert server.server_address[0] == "127.0.0.1"
+        STAGE_SECONDS.observe(0.2, stage="execution")
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            body = response.read().decode()
+        assert 'handler_stage_seconds_count{stage="execution"}' in body
+        assert "# TYPE handler_jobs_total counter" in body
+    finally:
+        server.shutdown()
+
+
+def test_handler_reports_stage_timings(fake, worker):
+    from warm import warmup_job
+
+    result = worker.handler(warmup_job("i2v"))
+    assert "error" not in result
+    timings = result["timings"]
+    for stage in ("workflow_load", "input_decode", "graph_patch", "readiness_wait", "queue", "execution",
+                  "history_fetch", "output"):
+        assert stage in timings
+    assert timings["total"] >= timings["execution"]
+    json.dumps(result)
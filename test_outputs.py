@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests for video delivery: chunked inline base64 and streamed uploads to an S3 stand-in
+"""
+
+import base64
+import hashlib
+import os
+import urllib.parse
+
+import pytest
+
+import outputs
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "clip.mp4"
+    # Not a multiple of the chunk size, so the last chunk carries padding
+    path.write_bytes(os.urandom(outputs.CHUNK_SIZE * 2 + 5))
+    return str(path)
+
+
+def test_encode_base64_matches_reference(video):
+    with open(video, 'rb') as f:
+        data = f.read()
+    encoded, size, sha256 = outputs.encode_base64(video)
+    assert encoded == base64.b64encode(data).decode('ascii')
+    assert size == len(data)
+    assert sha256 == hashlib.sha256(data).hexdigest()
+
+
+def test_video_files_does_not_read_outputs(tmp_path):
+    history = {"outputs": {
+        "277": {"gifs": [{"filename": "a.mp4", "subfolder": "", "type": "output", "fullpath": "/missing/a.mp4"}]},
+        "61": {"images": [{"filename": "b.png"}]},
+        "9": {"videos": [{"filename": "c.mp4", "subfolder": "sub", "type": "output"}]},
+    }}
+    files = outputs.video_files(history)
+    assert files == {"277": ["/missing/a.mp4"], "9": [os.path.join(outputs.COMFYUI_OUTPUT_DIR, "sub", "c.mp4")]}
+
+
+def test_deliver_rejects_unknown_mode(video):
+    with pytest.raises(ValueError):
+        outputs.deliver_video(video, "ftp", "job")
+
+
+def test_upload_to_s3(video, monkeypatch):
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setattr(outputs, "MULTIPART_CHUNK_SIZE", 5 * 1024 * 1024)
+    with moto.mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="videos")
+        creds = {"endpointUrl": "https://s3.us-east-1.amazonaws.com", "accessId": "test",
+                 "accessSecret": "test", "bucketName": "videos"}
+        result = outputs.deliver_video(video, "url", "job-1", creds)
+
+        with open(video, 'rb') as f:
+            data = f.read()
+        assert result["size"] == len(data)
+        assert result["sha256"] == hashlib.sha256(data).hexdigest()
+        assert urllib.parse.urlparse(result["video_url"]).path.endswith("/job-1/clip.mp4")
+        stored = s3.get_object(Bucket="videos", Key="job-1/clip.mp4")
+        assert stored["Body"].read() == data
+        assert stored["Metadata"]["sha256"] == result["sha256"]
+        assert stored["ContentType"] == "video/mp4"
+
+
+def test_default_output_mode(monkeypatch):
+    monkeypatch.delenv("OUTPUT_MODE", raising=False)
+    monkeypatch.delenv("BUCKET_ENDPOINT_URL", raising=False)
+    assert outputs.default_output_mode() == "base64"
+    monkeypatch.setenv("BUCKET_ENDPOINT_URL", "https://s3.example.com")
+    assert outputs.default_output_mode() == "url"
+    monkeypatch.setenv("OUTPUT_MODE", "base64")
+    assert outputs.default_output_mode() == "base64"
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Tests for workflow selection and declarative parameter bindings (no GPU or server needed)
+"""
+
+import json
+
+import pytest
+
+from pipelines import (PIPELINES, PipelineError, Select, parse_loras, lora_files, expand_variations, select_pipeline,
+                       resolve_template, apply_bindings, apply_loras, validate_pipelines, compile_plan, check_params,
+                       validate_job, set_object_info, draft_params, scale_step_splits)
+from workflows import WorkflowTemplate, dumps
+
+
+def test_bindings_match_templates():
+    assert validate_pipelines() == []
+
+
+@pytest.mark.parametrize("count,expected", [(1, "wan22_1lora"), (2, "wan22_2lora"), (3, "wan22_3lora")])
+def test_family_picks_smallest_graph(count, expected):
+    assert select_pipeline("wan22", count) == expected
+    assert select_pipeline(None, count) == expected
+
+
+def test_default_and_explicit_selection():
+    assert select_pipeline(None, 0) == "i2v"
+    assert select_pipeline("wan22", 0) == "wan22_nolora"
+    assert select_pipeline("wan22_3lora", 1) == "wan22_3lora"
+
+
+@pytest.mark.parametrize("workflow,count", [("wan22", 4), ("wan22_1lora", 2), ("i2v", 1), ("nope", 0)])
+def test_selection_errors(workflow, count):
+    with pytest.raises(PipelineError):
+        select_pipeline(workflow, count)
+
+
+def test_parse_loras():
+    assert parse_loras(None) == []
+    assert parse_loras([{"high": "a.safetensors", "strength": 0.5}]) == [
+        {"high": "a.safetensors", "low": None, "high_strength": 0.5, "low_strength": 0.0,
+         "high_url": None, "low_url": None, "high_sha256": None, "low_sha256": None}]
+    for loras in ([{"strength": 1}], "a.safetensors", [{"name": "../a.safetensors"}], [{"name": "a", "stage": "mid"}],
+                  [{"name": "a", "high": "b"}], [{"name": "a", "sha256": "abc"}], [{"name": "a", "strength": "1"}]):
+        with pytest.raises(PipelineError):
+            parse_loras(loras)
+
+
+def test_stage_loras_pack_into_free_loaders():
+    sha = "AB" * 32
+    loras = parse_loras([
+        {"name": "style_high.safetensors", "stage": "high", "strength": 0.7},
+        {"high": "pair_high.safetensors", "low": "pair_low.safetensors"},
+        {"name": "detail.safetensors", "stage": "low", "url": "https://cdn/detail.safetensors", "sha256": sha},
+        {"name": "both.safetensors"},
+    ])
+    assert [(l["high"], l["low"]) for l in loras] == [
+        ("style_high.safetensors", "detail.safetensors"), ("pair_high.safetensors", "pair_low.safetensors"),
+        ("both.safetensors", "both.safetensors")]
+    assert loras[0]["high_strength"] == 0.7 and loras[0]["low_sha256"] == sha.lower()
+    assert lora_files(loras)[1] == ("detail.safetensors", "https://cdn/detail.safetensors", sha.lower())
+    assert len(lora_files(loras)) == 5
+
+
+def test_expand_variations():
+    assert expand_variations({"seed": 1}, 16) is None
+    assert expand_variations({"seeds": [1, 2]}, 16) == [{"seed": 1}, {"seed": 2}]
+    assert expand_variations({"prompts": ["a", "b"], "seeds": [1, 2]}, 16) == [
+        {"prompt": "a", "seed": 1}, {"prompt": "a", "seed": 2}, {"prompt": "b", "seed": 1}, {"prompt": "b", "seed": 2}]
+    for job_input in ({"seeds": []}, {"seeds": ["1"]}, {"prompts": "a"}, {"seeds": list(range(17))}):
+        with pytest.raises(PipelineError):
+            expand_variations(job_input, 16)
+
+
+def test_batch_job_returns_every_video(fake, worker, monkeypatch):
+    from warm import warmup_job
+
+    updates = []
+    monkeypatch.setattr(worker.runpod.serverless, "progress_update", lambda job, payload: updates.append(payload))
+    job = warmup_job("i2v")
+    job["id"] = "batch-job"
+    job["input"].update(seeds=[1, 2, 3], prompts=["a fox", "a cat"])
+    result = worker.handler(job)
+    assert "error" not in result and len(result["videos"]) == 6
+    assert [(v["prompt"], v["seed"]) for v in result["videos"]][:3] == [("a fox", 1), ("a fox", 2), ("a fox", 3)]
+    assert len({v["sha256"] for v in result["videos"]}) == 6
+    # Each prompt carries its own seed; loaders are cached after the first item
+    seeds = sorted(prompt["57"]["inputs"]["noise_seed"] for prompt in fake.prompts.values())
+    assert seeds == [1, 1, 2, 2, 3, 3]
+    assert "38" in result["videos"][-1]["node_timings"]["cached_nodes"]
+    assert {u["item"] for u in updates} == set(range(6))
+
+
+@pytest.mark.parametrize("steps,split", [(4, 2), (10, 6), (30, 18), (2, 1)])
+def test_handover_follows_job_steps(worker, steps, split):
+    name = "wan22_nolora"
+    graph = worker.build_graph(resolve_template(name), name, {"steps": steps}, [], "in.png")
+    assert graph["834"]["inputs"]["steps"] == steps
+    # The low-noise sampler always keeps at least one step
+    assert graph["829"]["inputs"]["step"] == split
+
+
+@pytest.mark.parametrize("steps,handover", [(8, 4), (20, 10), (30, 15)])
+def test_i2v_samplers_follow_job_steps(worker, steps, handover):
+    name = "i2v"
+    graph = worker.build_graph(resolve_template(name), name, {"steps": steps}, [], "in.png")
+    # Each sampler pair is rescaled against its own template steps (57/58: 10 of 20, 86/85: 2 of 4)
+    for high, low in (("57", "58"), ("86", "85")):
+        assert graph[high]["inputs"]["steps"] == graph[low]["inputs"]["steps"] == steps
+        assert (graph[high]["inputs"]["start_at_step"], graph[high]["inputs"]["end_at_step"]) == (0, handover)
+        assert graph[low]["inputs"]["start_at_step"] == handover
+    # "Until the last step" stays that way
+    assert graph["58"]["inputs"]["end_at_step"] == 10000 and graph["85"]["inputs"]["end_at_step"] == steps
+
+    draft = worker.build_graph(resolve_template(name), name, {"steps": 4}, [], "in.png", full_steps=steps)
+    assert [draft[n]["inputs"]["end_at_step"] for n in ("57", "86", "85")] == [2, 2, 4]
+    assert draft["58"]["inputs"]["start_at_step"] == draft["85"]["inputs"]["start_at_step"] == 2
+
+
+def test_wan22_bindings_and_unused_lora_slots():
+    name = "wan22_3lora"
+    prompt = resolve_template(name).overlay()
+    apply_bindings(prompt, name, {"prompt": "a fox", "seed": 7, "width": 480, "negative_prompt": None, "image": "in.png"})
+    apply_loras(prompt, name, parse_loras([{"high": "h.safetensors", "low": "l.safetensors", "low_strength": 0.8}]))
+    graph = prompt.materialize()
+
+    assert graph["246"]["inputs"]["value"] == "a fox"
+    assert graph["835"]["inputs"]["noise_seed"] == 7
+    assert graph["849"]["inputs"]["value"] == 480
+    assert graph["260"]["inputs"]["image"] == "in.png"
+    # Unset parameters keep the graph's tuned values
+    assert graph["247"]["inputs"]["value"].startswith("色调艳丽")
+    assert graph["282"]["inputs"]["lora_name"] == "h.safetensors"
+    assert graph["286"]["inputs"]["strength_model"] == 0.8
+    # Unused loaders are bypassed: the compile nodes read the first slot's loaders directly
+    for node_id in ["339", "337", "340", "338"]:
+        assert node_id not in graph
+    assert graph["391"]["inputs"]["model"] == ["282", 0]
+    assert graph["390"]["inputs"]["model"] == ["286", 0]
+
+
+def test_i2v_bindings_cover_legacy_nodes():
+    prompt = resolve_template("i2v").overlay()
+    params = dict(PIPELINES["i2v"]["defaults"], image="in.png")
+    apply_bindings(prompt, "i2v", params)
+    graph = prompt.materialize()
+    for node_id in ["62", "97"]:
+        assert graph[node_id]["inputs"]["image"] == "in.png"
+    for node_id in ["6", "93"]:
+        assert graph[node_id]["inputs"]["text"] == params["prompt"]
+    for node_id in ["57", "58", "85", "86"]:
+        assert graph[node_id]["inputs"]["noise_seed"] == 42
+        assert graph[node_id]["inputs"]["steps"] == 20
+
+
+def test_select_follows_links_and_titles():
+    graph = resolve_template("i2v").graph
+    assert Select("text", class_type="CLIPTextEncode", feeds=("WanImageToVideo", "negative")).resolve(graph) == ["7", "89"]
+    assert Select("value", class_type="INTConstant", title="LENGTH").resolve(resolve_template("wan22_nolora").graph) == ["846"]
+
+
+def test_plan_reports_renamed_nodes():
+    graph = json.loads(dumps(resolve_template("wan22_nolora").graph))
+    graph["849"]["_meta"]["title"] = "Breite"
+    plan = compile_plan("wan22_nolora", WorkflowTemplate("wan22_nolora", None, graph))
+    assert plan.targets["width"] == ()
+    assert any("'width' matches no node" in p for p in plan.problems)
+    with pytest.raises(PipelineError):
+        validate_job(plan, {"width": 512})
+
+
+@pytest.mark.parametrize("params,fragment", [
+    ({"width": 500}, "not a multiple of 16"),
+    ({"length": 80}, "4k+1 (nearest: 81)"),
+    ({"steps": 0}, "must be positive"),
+    ({"seed": "7"}, "'seed' must be int"),
+    ({"cfg": True}, "'cfg' must be a number"),
+])
+def test_check_params_rejects_bad_values(params, fragment):
+    plan = compile_plan("i2v", resolve_template("i2v"))
+    problems = check_params(plan, params)
+    assert len(problems) == 1 and fragment in problems[0]
+    assert check_params(plan, PIPELINES["i2v"]["defaults"]) == []
+
+
+def test_object_info_ranges_and_missing_classes():
+    template = resolve_template("wan22_nolora")
+    object_info = {cls: {"input": {"required": {}}} for cls in {n["class_type"] for n in template.graph.values()}}
+    object_info["INTConstant"]["input"]["required"]["value"] = ["INT", {"min": 0, "max": 1024}]
+    object_info["RandomNoise"]["input"]["required"]["noise_seed"] = ["INT", {"min": 0, "max": 2 ** 64 - 1}]
+    object_info["LoadImage"]["input"]["required"]["image"] = [["a.png"], {}]
+    for cls, name in [("PrimitiveStringMultiline", "value"), ("BetaSamplingScheduler", "steps"),
+                      ("ScheduledCFGGuidance", "cfg")]:
+        object_info[cls]["input"]["required"][name] = ["INT" if name == "steps" else "FLOAT" if name == "cfg" else "STRING", {}]
+    try:
+        set_object_info(object_info)
+        plan = compile_plan("wan22_nolora", template)
+        assert plan.problems == []
+        assert check_params(plan, {"width": 2048}) == ["'width': 2048 is above the maximum 1024 (node 849 input 'value')"]
+        assert check_params(plan, {"seed": -1})[0].startswith("'seed': -1 is below the minimum 0")
+
+        del object_info["BetaSamplingScheduler"]
+        set_object_info(object_info)
+        assert any("BetaSamplingScheduler is not installed" in p for p in compile_plan("wan22_nolora", template).problems)
+    finally:
+        set_object_info(None)
+
+
+def test_invalid_job_rejected_before_queueing(fake, worker):
+    from warm import warmup_job
+
+    job = warmup_job("i2v")
+    job["input"]["width"] = 100
+    result = worker.handler(job)
+    assert "not a multiple of 16" in result["error"]
+    assert fake.prompts == {}
+
+
+def test_draft_keeps_shape_rules_and_moves_step_split():
+    name = "wan22_nolora"
+    prompt = resolve_template(name).overlay()
+    apply_bindings(prompt, name, {"width": 520 // 16 * 16, "seed": 7})
+    draft = draft_params(prompt, name, 0.5, 17, 4)
+    assert draft == {"width": 256, "height": 384, "length": 17, "steps": 4}
+    apply_bindings(prompt, name, draft)
+    scale_step_splits(prompt, name, 10, 4)
+    graph = prompt.materialize()
+    # The high/low-noise handover stays at the same fraction of the schedule (6 of 10 -> 2 of 4)
+    assert graph["829"]["inputs"]["step"] == 2
+    assert graph["835"]["inputs"]["noise_seed"] == 7
+    assert check_params(compile_plan(name, resolve_template(name)), draft) == []
+
+
+def test_progressive_job_delivers_preview_first(fake, worker, monkeypatch):
+    from warm import warmup_job
+
+    updates = []
+    monkeypatch.setattr(worker.runpod.serverless, "progress_update", lambda job, payload: updates.append(payload))
+    job = warmup_job("i2v")
+    job["id"] = "progressive-job"
+    job["input"].update(progressive=True, seed=5)
+    result = worker.handler(job)
+    assert "error" not in result
+    previews = [u for u in updates if u.get("status") == "preview"]
+    assert len(previews) == 1 and previews[0]["video"]
+    assert result["preview"]["steps"] == 4
+
+    draft, full = list(fake.prompts.values())
+    assert draft["57"]["inputs"]["noise_seed"] == full["57"]["inputs"]["noise_seed"] == 5
+    assert draft["6"]["inputs"]["text"] == full["6"]["inputs"]["text"]
+    assert (draft["57"]["inputs"]["steps"], full["57"]["inputs"]["steps"]) == (4, 20)
+    assert draft["63"]["inputs"]["width"] == max(16, full["63"]["inputs"]["width"] // 2 // 16 * 16)
+
+    job["input"].update(seeds=[1, 2])
+    assert "cannot be combined" in worker.handler(job)["error"]
+    # Rejected before any input is fetched
+    for key in ("image_path", "image_base64"):
+        job["input"].pop(key, None)
+    job["input"]["image_url"] = "http://127.0.0.1:9/never-fetched.png"
+    fetched = []
+    monkeypatch.setattr(worker.fetcher, "fetch_many", lambda urls: fetched.extend(urls) or [])
+    assert "cannot be combined" in worker.handler(job)["error"] and fetched == []
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for boot-time model prefetch with dummy model files
+"""
+
+import hashlib
+import json
+import os
+
+import pytest
+
+from prefetch import model_references, prefetch as run_prefetch, rewrite_model_paths, search_paths
+
+CONFIG = """comfyui:
+    base_path: {base}/
+    is_default: true
+    diffusion_models: |
+        {volume}/diffusion_models/
+        models/diffusion_models/
+    vae: |
+        {volume}/vae/
+    text_encoders: |
+        {volume}/text_encoders/
+    loras: |
+        {volume}/loras/
+"""
+
+
+@pytest.fixture
+def volume(tmp_path):
+    """A fake network volume holding every model of the test_simple_workflow graph"""
+    files = {}
+    for folder, name in model_references(["test_simple_workflow"]):
+        path = tmp_path / "volume" / folder / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = os.urandom(64 * 1024) + name.encode()
+        path.write_bytes(data)
+        files[(folder, name)] = hashlib.sha256(data).hexdigest()
+    config = tmp_path / "extra_model_paths.yaml"
+    config.write_text(CONFIG.format(base=tmp_path / "ComfyUI", volume=tmp_path / "volume"))
+    return tmp_path, str(config), files
+
+
+def test_references_skip_per_job_lora_slots():
+    refs = model_references(["wan22_3lora"])
+    assert ("diffusion_models", "wan2.2_i2v_high_noise_14B_fp8_scaled.safetensors") in refs
+    assert ("text_encoders", "umt5_xxl_fp8_e4m3fn_scaled.safetensors") in refs
+    assert not any(name.startswith("lora1_") for _, name in refs)
+    assert ("loras", "Wan21_CausVid_14B_T2V_lora_rank32.safetensors") in refs
+
+
+def test_warm_reads_every_file(volume):
+    tmp_path, config, files = volume
+    manifest = run_prefetch("warm", config, str(tmp_path / "local"), ["test_simple_workflow"], threads=2)
+    assert {(e["folder"], e["name"]): e["sha256"] for e in manifest["files"]} == files
+    assert all(e["status"] == "warmed" for e in manifest["files"])
+    assert not os.path.exists(tmp_path / "local")
+
+
+def test_copy_writes_manifest_and_rewrites_paths(volume):
+    tmp_path, config, files = volume
+    local = str(tmp_path / "local")
+    manifest = run_prefetch("copy", config, local, ["test_simple_workflow"], threads=2)
+    for entry in manifest["files"]:
+        assert entry["status"] == "copied"
+        with open(entry["local"], 'rb') as f:
+            assert hashlib.sha256(f.read()).hexdigest() == files[(entry["folder"], entry["name"])]
+    with open(os.path.join(local, "manifest.json")) as f:
+        assert json.load(f)["bytes"] == manifest["bytes"]
+    # Local copies come first; unrelated folders are untouched
+    paths = search_paths(config)
+    assert paths["vae"][0] == os.path.join(local, "vae") + "/"
+    assert len(paths["loras"]) == 1
+
+    # A second boot reuses the copies and leaves the config as it is
+    before = open(config).read()
+    again = run_prefetch("copy", config, local, ["test_simple_workflow"], threads=2)
+    assert {e["status"] for e in again["files"]} == {"unchanged"}
+    assert open(config).read() == before
+
+
+def test_missing_files_are_reported(volume):
+    tmp_path, config, _ = volume
+    manifest = run_prefetch("warm", config, str(tmp_path / "local"), ["wan22_nolora"], threads=2)
+    assert {e["status"] for e in manifest["files"]} == {"warmed", "missing"}
+
+
+def test_rewrite_is_idempotent(tmp_path):
+    config = tmp_path / "paths.yaml"
+    config.write_text(CONFIG.format(base="/ComfyUI", volume="/vol"))
+    rewrite_model_paths(str(config), "/local", {"vae"})
+    rewrite_model_paths(str(config), "/local", {"vae"})
+    assert search_paths(str(config))["vae"] == ["/local/vae/", "/vol/vae/"]
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for WebSocket progress tracking and per-node timing
+"""
+
+import uuid
+
+import pytest
+
+from comfy_client import ComfyClient
+from fake_comfyui import FakeComfyUI
+from progress import ExecutionTracker, ExecutionError
+from workflows import get_template
+
+PROMPT = {
+    "230": {"class_type": "UNETLoader", "inputs": {}, "_meta": {"title": "Load"}},
+    "6": {"class_type": "CLIPTextEncode", "inputs": {}},
+    "836": {"class_type": "SamplerCustomAdvanced", "inputs": {}, "_meta": {"title": "HighNoiseSampler"}},
+}
+
+
+def test_tracker_timings_and_progress():
+    updates = []
+    tracker = ExecutionTracker(PROMPT, notify=updates.append, min_interval=3600, prompt_id="p1")
+    messages = [
+        {"type": "execution_start", "data": {"prompt_id": "p1"}},
+        {"type": "execution_cached", "data": {"nodes": ["230"], "prompt_id": "p1"}},
+        {"type": "executing", "data": {"node": "6", "prompt_id": "p1"}},
+        {"type": "executing", "data": {"node": "836", "prompt_id": "p1"}},
+        {"type": "progress", "data": {"value": 1, "max": 2, "node": "836", "prompt_id": "p1"}},
+        {"type": "progress", "data": {"value": 2, "max": 2, "node": "836", "prompt_id": "p1"}},
+        {"type": "executing", "data": {"node": None, "prompt_id": "other"}},
+    ]
+    assert not any(tracker.handle(m) for m in messages)
+    assert tracker.handle({"type": "executing", "data": {"node": None, "prompt_id": "p1"}})
+
+    summary = tracker.summary()
+    assert [n["node"] for n in summary["nodes"]] == ["6", "836"]
+    assert summary["nodes"][1]["title"] == "HighNoiseSampler"
+    assert set(summary["by_class"]) == {"CLIPTextEncode", "SamplerCustomAdvanced"}
+    assert summary["cached_nodes"] == ["230"]
+    # Node starts and the final step are always sent; the intermediate step is throttled
+    statuses = [(u["status"], u.get("step")) for u in updates]
+    assert statuses == [("executing", None), ("executing", None), ("progress", 2), ("finished", None)]
+
+
+def test_tracker_raises_on_execution_error():
+    tracker = ExecutionTracker(PROMPT, prompt_id="p1")
+    tracker.handle({"type": "executing", "data": {"node": "836", "prompt_id": "p1"}})
+    with pytest.raises(ExecutionError) as excinfo:
+        tracker.handle({"type": "execution_error", "data": {
+            "prompt_id": "p1", "node_id": "836", "node_type": "SamplerCustomAdvanced",
+            "exception_type": "torch.OutOfMemoryError", "exception_message": "CUDA out of memory"}})
+    assert excinfo.value.node_id == "836"
+    assert "CUDA out of memory" in str(excinfo.value)
+    assert tracker.summary()["nodes"][0]["node"] == "836"
+
+
+@pytest.mark.parametrize("fail_node", [None, "57"])
+def test_get_videos_reports_progress(fail_node):
+    from handler import get_videos
+
+    fake = FakeComfyUI(progress_steps=3, fail_node=fail_node).start()
+    client = ComfyClient("127.0.0.1", fake.port, str(uuid.uuid4()))
+    try:
+        client.wait_until_ready(timeout=5)
+        prompt = get_template("test_simple_workflow").overlay().materialize()
+        updates = []
+        tracker = ExecutionTracker(prompt, notify=updates.append, min_interval=0)
+        if fail_node:
+            with pytest.raises(ExecutionError):
+                get_videos(client, prompt, tracker)
+            assert tracker.summary()["nodes"][-1]["class_type"] == "KSamplerAdvanced"
+        else:
+            assert "277" in get_videos(client, prompt, tracker)
+            assert len(tracker.summary()["nodes"]) == len(prompt)
+            assert sum(u["status"] == "progress" for u in updates) == 3 * len(prompt)
+    finally:
+        client.close()
+        fake.stop()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for the result cache: graph keys, local LRU/TTL eviction and shared backends
+"""
+
+import os
+
+import pytest
+
+from result_cache import DiskResultCache, ResultCache, S3ResultCache, result_key
+from warm import warmup_job
+from workflows import get_template
+
+
+def video(tmp_path, name, size=100):
+    path = tmp_path / name
+    path.write_bytes(os.urandom(size))
+    return str(path)
+
+
+def test_key_uses_image_content_not_name():
+    prompt = get_template("test_simple_workflow").overlay()
+    prompt.set_input("62", "image", "ln_a.png")
+    first = prompt.materialize()
+    prompt.set_input("62", "image", "in_b.png")
+    second = prompt.materialize()
+    assert result_key(first, "ln_a.png", "abc") == result_key(second, "in_b.png", "abc")
+    assert result_key(first, "ln_a.png", "abc") != result_key(first, "ln_a.png", "def")
+    prompt.set_input("63", "length", 33)
+    assert result_key(prompt.materialize(), "in_b.png", "abc") != result_key(second, "in_b.png", "abc")
+
+
+def test_disk_cache_lru_and_ttl(tmp_path):
+    cache = DiskResultCache(str(tmp_path / "cache"), max_bytes=250, ttl=60)
+    for key in ("a", "b"):
+        cache.put(key, video(tmp_path, f"{key}.mp4"), {"sha256": key})
+    assert cache.get("a")[1]["sha256"] == "a"
+    os.utime(cache.get("b")[0], (0, 0))
+    # "b" is least recently used, so it makes room for "c"
+    cache.put("c", video(tmp_path, "c.mp4"), {"sha256": "c"})
+    assert cache.get("b") is None and cache.get("a") and cache.get("c")
+
+    cache.put("old", video(tmp_path, "old.mp4", 10), {"created": 0})
+    assert cache.get("old") is None
+    assert not os.path.exists(tmp_path / "cache" / "old.mp4")
+
+
+def test_shared_disk_hit_populates_local(tmp_path):
+    shared = DiskResultCache(str(tmp_path / "volume"))
+    ResultCache(DiskResultCache(str(tmp_path / "worker1")), shared).put("k", video(tmp_path, "v.mp4"), {"sha256": "x"})
+    local = DiskResultCache(str(tmp_path / "worker2"))
+    path, meta = ResultCache(local, shared).get("k")
+    assert meta["sha256"] == "x"
+    assert path == os.path.join(local.directory, "k.mp4") and local.get("k")
+
+    # WebM outputs (VP9/AV1) keep their container extension through both tiers
+    ResultCache(DiskResultCache(str(tmp_path / "worker1")), shared).put("w", video(tmp_path, "v.webm"), {})
+    path, meta = ResultCache(local, shared).get("w")
+    assert path == os.path.join(local.directory, "w.webm") and meta["ext"] == ".webm"
+    local.evict()
+    assert local.get("w")[0] == path
+    local._remove("w")
+    assert not os.path.exists(path)
+
+
+def test_shared_s3_backend(tmp_path, monkeypatch):
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="results")
+        shared = S3ResultCache("results", "cache/", ttl=3600, scratch_dir=str(tmp_path / "scratch"), client=s3)
+        source = video(tmp_path, "v.mp4")
+        ResultCache(DiskResultCache(str(tmp_path / "w1")), shared).put("k", source, {"sha256": "x"})
+        assert s3.head_object(Bucket="results", Key="cache/k.mp4")["ContentLength"] == 100
+
+        path, meta = ResultCache(DiskResultCache(str(tmp_path / "w2")), shared).get("k")
+        assert meta["sha256"] == "x"
+        assert open(path, 'rb').read() == open(source, 'rb').read()
+        assert os.listdir(tmp_path / "scratch") == []
+        assert shared.get("missing") is None
+
+
+def test_handler_serves_repeated_job_from_cache(fake, worker, tmp_path, monkeypatch):
+    monkeypatch.setattr(worker, "result_cache", ResultCache(DiskResultCache(str(tmp_path / "results"))))
+    job = warmup_job("i2v")
+    first = worker.handler(job)
+    second = worker.handler(job)
+    assert first["cached"] is False and second["cached"] is True
+    assert second["sha256"] == first["sha256"]
+    assert len(fake.prompts) == 1
+
+    job["input"]["cache"] = False
+    assert worker.handler(job)["cached"] is False
+    job["input"]["seed"] = 1234
+    assert worker.handler(dict(job, input=dict(job["input"], cache=True)))["cached"] is False
+    assert len(fake.prompts) == 3
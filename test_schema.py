@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Tests for the /object_info schema cache and input value checks
+"""
+
+from comfy_client import ComfyClient
+from fake_comfyui import FakeComfyUI
+from schema import check_value, input_spec, load_object_info
+
+OBJECT_INFO = {
+    "WanImageToVideo": {"input": {"required": {"width": ["INT", {"min": 16, "max": 16384, "step": 16}]},
+                                  "optional": {"clip_vision_output": ["CLIP_VISION_OUTPUT"]}}},
+    "KSamplerSelect": {"input": {"required": {"sampler_name": [["euler", "dpmpp_2m"]]}}},
+    "Combo": {"input": {"required": {"mode": ["COMBO", {"options": ["a", "b"]}]}}},
+}
+
+
+def test_input_spec_and_checks():
+    assert input_spec(OBJECT_INFO, "WanImageToVideo", "width") == ("INT", {"min": 16, "max": 16384, "step": 16})
+    assert input_spec(OBJECT_INFO, "WanImageToVideo", "clip_vision_output") == ("CLIP_VISION_OUTPUT", {})
+    assert input_spec(OBJECT_INFO, "Missing", "width") is None
+    width = input_spec(OBJECT_INFO, "WanImageToVideo", "width")
+    assert check_value(width, 640) is None
+    assert check_value(width, 8) == "8 is below the minimum 16"
+    assert check_value(width, 640.0) == "expected int, got float"
+    assert check_value(input_spec(OBJECT_INFO, "KSamplerSelect", "sampler_name"), "euler") is None
+    assert "is not one of" in check_value(input_spec(OBJECT_INFO, "Combo", "mode"), "c")
+
+
+def test_object_info_cached_on_disk(tmp_path):
+    server = FakeComfyUI(object_info=OBJECT_INFO).start()
+    client = ComfyClient("127.0.0.1", server.port, "schema-test")
+    path = str(tmp_path / "object_info.json")
+    try:
+        assert load_object_info(client, path) == OBJECT_INFO
+    finally:
+        client.close()
+        server.stop()
+    # With the server gone the cached copy is used
+    assert load_object_info(client, path) == OBJECT_INFO
+    assert load_object_info(None, str(tmp_path / "missing.json")) is None
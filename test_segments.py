@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for long videos rendered as chained segments: planning, stitching and the handler flow
+"""
+
+import os
+import re
+import subprocess
+
+import pytest
+
+from encoding import find_ffmpeg
+from segments import SegmentError, plan_segments, stitch
+
+
+@pytest.mark.parametrize("frames,segment_length,expected", [
+    (81, 81, [81]),
+    (82, 81, [41, 41]),
+    (200, 81, [69, 69, 69]),
+    (3, 81, [5]),
+    (161, 33, [33] * 5),
+])
+def test_plan_covers_frames_with_equal_segments(frames, segment_length, expected):
+    plan = plan_segments(frames, segment_length)
+    assert plan == expected
+    assert sum(plan) >= frames and all(length % 4 == 1 for length in plan)
+
+
+@pytest.mark.parametrize("frames,segment_length,fragment", [
+    (100, 80, r"4k\+1"),
+    (100, 1, "at least 5"),
+    (0, 81, "Invalid frame count"),
+    (81 * 9, 81, "more than the 8 allowed"),
+])
+def test_plan_rejects_bad_requests(frames, segment_length, fragment):
+    with pytest.raises(SegmentError, match=fragment):
+        plan_segments(frames, segment_length, max_segments=8)
+
+
+def synthetic_video(ffmpeg, path, frames):
+    subprocess.run([ffmpeg, "-y", "-v", "error", "-f", "lavfi", "-i", f"testsrc=size=64x64:rate=16",
+                    "-frames:v", str(frames), "-c:v", "libx264", "-pix_fmt", "yuv420p", str(path)], check=True)
+    return str(path)
+
+
+def count_frames(ffmpeg, path):
+    output = subprocess.run([ffmpeg, "-v", "info", "-i", path, "-map", "0:v", "-c", "copy", "-f", "null", "-"],
+                            capture_output=True, text=True).stderr
+    return int(re.findall(r"frame=\s*(\d+)", output)[-1])
+
+
+@pytest.mark.skipif(find_ffmpeg() is None, reason="ffmpeg not installed")
+def test_stitch_joins_segments_without_reencoding(tmp_path):
+    ffmpeg = find_ffmpeg()
+    paths = [synthetic_video(ffmpeg, tmp_path / f"segment{i}.mp4", 17) for i in range(3)]
+    target = stitch(paths, str(tmp_path / "long.mp4"))
+    assert count_frames(ffmpeg, target) == 51
+    # Stream copy keeps the encoded frames, so the result is about the size of its parts
+    assert os.path.getsize(target) < sum(os.path.getsize(p) for p in paths) * 1.1
+
+
+def test_handler_chains_segments_on_last_frames(fake, worker, monkeypatch):
+    from warm import warmup_job
+
+    updates = []
+    monkeypatch.setattr(worker.runpod.serverless, "progress_update", lambda job, payload: updates.append(payload))
+
+    def concat(paths, target):
+        with open(target, 'wb') as out:
+            for path in paths:
+                out.write(open(path, 'rb').read())
+        return target
+
+    # The fake server's videos are random bytes, which ffmpeg cannot parse
+    monkeypatch.setattr(worker, "stitch", concat)
+    job = warmup_job("wan22_nolora")
+    job["id"] = "long-job"
+    job["input"].update(duration=6, segment_length=33, seed=10)
+    result = worker.handler(job)
+    assert "error" not in result, result.get("error")
+    assert [s["length"] for s in result["segments"]] == [33, 33, 33] and result["length"] == 99
+    assert result["size"] == sum(s["size"] for s in result["segments"])
+    assert "video" not in result["segments"][0] and "stitch" in result["timings"]
+
+    prompts = list(fake.prompts.values())
+    assert [p["835"]["inputs"]["noise_seed"] for p in prompts] == [10, 11, 12]
+    starts = [p["260"]["inputs"]["image"] for p in prompts]
+    assert len(set(starts)) == 3 and all(name.endswith(".png") for name in starts[1:])
+    # Only segments that feed another one save their last frame
+    assert ["277_last_frame" in p for p in prompts] == [True, True, False]
+    assert [u["index"] for u in updates if u.get("status") == "segment"] == [0, 1, 2]
+
+    job["input"].update(duration=60)
+    assert "more than the 8 allowed" in worker.handler(job)["error"]
+    job["input"].update(duration=6, seeds=[1, 2])
+    assert "cannot be combined" in worker.handler(job)["error"]
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Tests for shape buckets and same-shape admission order (pure Python, no server needed)
+"""
+
+import time
+import threading
+
+import pytest
+
+from shapes import (RECOMPILES, ShapeConfigError, ShapeScheduler, is_compiled, parse_lengths, parse_resolutions,
+                    snap_shape)
+
+RESOLUTIONS = parse_resolutions("832x480, 480x832, 640x640, 1280x720")
+LENGTHS = parse_lengths("81,33,49")
+
+
+@pytest.mark.parametrize("requested,expected", [
+    ((832, 480, 81), (832, 480, 81)),
+    ((848, 464, 40), (832, 480, 49)),
+    ((500, 900, 100), (480, 832, 81)),
+    ((704, 688, 17), (640, 640, 33)),
+    ((1920, 1088, 81), (1280, 720, 81)),
+    ((None, 640, None), (None, 640, None)),
+])
+def test_snap_to_nearest_bucket(requested, expected):
+    assert snap_shape(requested, RESOLUTIONS, LENGTHS) == expected
+    assert snap_shape(requested, [], []) == requested
+
+
+@pytest.mark.parametrize("parse,text", [(parse_resolutions, "832x470"), (parse_resolutions, "wide"),
+                                        (parse_lengths, "80")])
+def test_bucket_config_follows_wan_rules(parse, text):
+    with pytest.raises(ShapeConfigError):
+        parse(text)
+
+
+def test_compiled_graphs_detected():
+    from pipelines import resolve_template
+
+    assert is_compiled(resolve_template("wan22_nolora").graph)
+    assert not is_compiled(resolve_template("i2v").graph)
+
+
+def admit_in_order(scheduler, shapes, compiled=True):
+    """Queue one waiter per shape while the only slot is taken, then report the admission order"""
+    order = []
+    lock = threading.Lock()
+
+    def job(index, shape):
+        scheduler.acquire(shape, compiled, interval=0.01)
+        with lock:
+            order.append(index)
+        scheduler.release()
+
+    scheduler.acquire(shapes[0], compiled)
+    threads = []
+    for index, shape in enumerate(shapes[1:], 1):
+        threads.append(threading.Thread(target=job, args=(index, shape)))
+        threads[-1].start()
+        # Deterministic arrival order
+        while len(scheduler._waiting) < index:
+            time.sleep(0.001)
+    scheduler.release()
+    for thread in threads:
+        thread.join(5)
+    return order
+
+
+def test_same_shape_jobs_run_back_to_back():
+    before = RECOMPILES.value(pipeline="wan22")
+    a, b = ("wan22", 832, 480, 81), ("wan22", 480, 832, 81)
+    order = admit_in_order(ShapeScheduler(1, max_bypass=10), [a, b, a, b, a])
+    assert order == [2, 4, 1, 3]
+    # a -> a -> a -> b -> b: one switch instead of four
+    assert RECOMPILES.value(pipeline="wan22") - before == 1
+
+
+def test_bypass_bound_keeps_order_fair():
+    a, b = ("wan22", 832, 480, 81), ("wan22", 480, 832, 81)
+    order = admit_in_order(ShapeScheduler(1, max_bypass=2), [a, b, a, a, a, a])
+    # The b job waits for at most two later a jobs
+    assert order.index(1) == 2
+
+
+def test_aborted_waiter_leaves_the_queue():
+    scheduler = ShapeScheduler(1)
+    scheduler.acquire("a")
+
+    def check():
+        raise TimeoutError
+
+    with pytest.raises(TimeoutError):
+        scheduler.acquire("b", check=check, interval=0.01)
+    assert scheduler._waiting == []
+    scheduler.release()
+    scheduler.acquire("b")
+
+
+def test_handler_snaps_job_to_bucket(fake, worker, monkeypatch):
+    from warm import warmup_job
+
+    monkeypatch.setattr(worker, "RESOLUTION_BUCKETS", [(64, 64), (96, 48)])
+    monkeypatch.setattr(worker, "FRAME_BUCKETS", [9, 17])
+    job = warmup_job("wan22_nolora")
+    job["input"].update(width=96, height=64)
+    result = worker.handler(job)
+    assert "error" not in result
+    assert result["bucket"] == {"requested": {"width": 96, "height": 64, "length": 5},
+                                "used": {"width": 96, "height": 48, "length": 9}}
+    prompt, = fake.prompts.values()
+    assert (prompt["849"]["inputs"]["value"], prompt["846"]["inputs"]["value"]) == (96, 9)
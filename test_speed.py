@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests for speed presets: named presets, GPU-sized "auto" mode and their graph patches
+"""
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+from pipelines import resolve_template, apply_bindings, fit_step_splits
+from speed import GB, SpeedError, resolve_speed, check_speed, speed_params, apply_speed
+
+
+def stats(total_gb, free_gb):
+    return {"system": {"os": "posix"}, "devices": [
+        {"name": "cuda:0 NVIDIA", "type": "cuda", "vram_total": total_gb * GB, "vram_free": free_gb * GB}]}
+
+
+@pytest.mark.parametrize("system_stats,memory", [
+    (stats(80, 70), "resident"),
+    (stats(80, 4), "offload"),
+    (stats(24, 20), "offload"),
+    ({"devices": [{"type": "cpu", "vram_total": 0}]}, None),
+    (None, None),
+])
+def test_auto_sizes_memory_settings_to_the_gpu(system_stats, memory):
+    resolved = resolve_speed("auto", system_stats)
+    assert resolved["requested"] == "auto" and resolved["preset"] == "balanced"
+    assert resolved["memory"] == memory
+    if memory:
+        assert resolved["vram_total_gb"] == system_stats["devices"][0]["vram_total"] / GB
+
+
+def test_kept_models_override_the_memory_mode():
+    # WARM_MODELS keeps models loaded, so every preset reports the resident mode it gets
+    assert resolve_speed("auto", stats(24, 20), keep_loaded=True)["memory"] == "resident"
+    assert resolve_speed("quality", keep_loaded=True)["memory"] == "resident"
+
+
+def test_unknown_auto_preset_falls_back_to_balanced():
+    env = dict(os.environ, SPEED_AUTO_PRESET="fastest")
+    out = subprocess.run([sys.executable, "-c", "import speed; print(speed.resolve_speed('auto')['preset'])"],
+                         env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "balanced" and "SPEED_AUTO_PRESET" in out.stderr
+
+
+def test_unknown_presets_and_workflows_are_rejected():
+    assert resolve_speed(None) is None
+    assert resolve_speed("turbo") == {"requested": "turbo", "preset": "turbo", "memory": None}
+    for value in ("fastest", 3, ["turbo"]):
+        with pytest.raises(SpeedError):
+            resolve_speed(value)
+    with pytest.raises(SpeedError, match="no speed settings"):
+        check_speed("i2v", resolve_speed("turbo"))
+    check_speed("i2v", None)
+
+
+def test_presets_patch_cache_cfg_split_and_memory_nodes():
+    name = "wan22_nolora"
+    template = resolve_template(name)
+
+    turbo = resolve_speed("auto", stats(80, 70))
+    turbo["preset"] = "turbo"
+    prompt = template.overlay()
+    apply_bindings(prompt, name, speed_params(turbo))
+    fit_step_splits(prompt, name, speed_params(turbo)["steps"])
+    apply_speed(prompt, name, turbo)
+    graph = prompt.materialize()
+    assert graph["834"]["inputs"]["steps"] == 6
+    # The handover stays at the graph's 6/10 share of the steps
+    assert graph["829"]["inputs"]["step"] == 4
+    assert graph["593"]["inputs"]["reuse_threshold"] == 0.3 and graph["830"]["inputs"]["end_percent"] == 0.2
+    assert graph["377"]["inputs"]["unload_all_models"] is False
+
+    quality = resolve_speed("quality")
+    prompt = template.overlay()
+    apply_bindings(prompt, name, speed_params(quality))
+    fit_step_splits(prompt, name, 20)
+    apply_speed(prompt, name, quality)
+    graph = prompt.materialize()
+    # EasyCache is bypassed; the pass-through nodes read the attention patch directly
+    assert "593" not in graph and "594" not in graph
+    assert graph["290"]["inputs"]["model"] == ["392", 0] and graph["288"]["inputs"]["model"] == ["393", 0]
+    assert graph["829"]["inputs"]["step"] == 12
+    # Memory settings stay as the graph has them unless "auto" chose them
+    assert graph["377"] is template.graph["377"]
+
+
+def test_handler_reports_applied_preset(fake, worker, monkeypatch):
+    from warm import warmup_job
+
+    fake.system_stats = stats(80, 70)
+    job = warmup_job("wan22_nolora")
+    job["input"]["speed"] = "auto"
+    result = worker.handler(job)
+    assert "error" not in result
+    assert result["speed"] == {"requested": "auto", "preset": "balanced", "memory": "resident",
+                               "vram_total_gb": 80.0, "vram_free_gb": 70.0}
+    prompt, = fake.prompts.values()
+    assert prompt["377"]["inputs"]["unload_all_models"] is False
+
+    # With WARM_MODELS an offloading GPU still keeps models loaded, and the response says so
+    monkeypatch.setattr(worker, "WARM_MODELS", True)
+    fake.system_stats = stats(24, 20)
+    fake.prompts.clear()
+    result = worker.handler(job)
+    assert result["speed"]["memory"] == "resident"
+    prompt, = fake.prompts.values()
+    assert prompt["377"]["inputs"]["unload_all_models"] is False and prompt["377"]["inputs"]["empty_cache"] is False
+    monkeypatch.setattr(worker, "WARM_MODELS", False)
+
+    job["input"]["workflow"] = "i2v"
+    assert "no speed settings" in worker.handler(job)["error"]
+    job["input"].update(workflow="wan22_nolora", speed="warp")
+    assert "Unknown speed preset" in worker.handler(job)["error"]
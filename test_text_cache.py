@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tests for the text-encoder conditioning cache and its graph injection
+"""
+
+import sys
+import types
+
+import pytest
+
+from custom_nodes.wan_text_cache import CachedCLIPTextEncode
+from custom_nodes.wan_text_cache import embedding_cache
+from custom_nodes.wan_text_cache.embedding_cache import EmbeddingCache, cache_key, nbytes
+from pipelines import resolve_template
+from text_cache import CACHED_ENCODER, inject_text_cache, text_cache_stats
+
+
+class FakeTensor:
+    """Stand-in exposing the size API of a CPU tensor"""
+
+    def __init__(self, n, fill=0):
+        self.data = [fill] * n
+
+    def element_size(self):
+        return 2
+
+    def nelement(self):
+        return len(self.data)
+
+
+def conditioning(n, fill=0):
+    return [[FakeTensor(n, fill), {"pooled_output": None}]]
+
+
+def test_nbytes_counts_nested_tensors():
+    assert nbytes(conditioning(100)) == 200
+    torch = pytest.importorskip("torch")
+    assert nbytes([[torch.zeros(4, 8, dtype=torch.float16), {}]]) == 64
+
+
+def test_lru_byte_budget_and_spill(tmp_path):
+    cache = EmbeddingCache(max_bytes=500, spill_dir=str(tmp_path))
+    keys = [cache_key("umt5.safetensors", f"prompt {i}") for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, conditioning(100, fill=i))
+    # Budget fits two 200-byte entries; the oldest one was spilled to disk
+    assert cache.stats()["entries"] == 2
+    assert (tmp_path / f"{keys[0]}.pt").exists()
+
+    value, source = cache.get(keys[0])
+    assert source == "disk" and value[0][0].data[0] == 0
+    value, source = cache.get(keys[2])
+    assert source == "memory"
+    assert cache.get(cache_key("umt5.safetensors", "unseen")) == (None, None)
+    stats = cache.stats()
+    assert (stats["hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_key_depends_on_encoder_and_text():
+    assert cache_key("a", "x") != cache_key("b", "x")
+    assert cache_key("a", "x") != cache_key("a", "y")
+
+
+def test_node_skips_encoder_on_hit(monkeypatch):
+    calls = []
+
+    class CLIPTextEncode:
+        def encode(self, clip, text):
+            calls.append(text)
+            return (conditioning(10),)
+
+    monkeypatch.setitem(sys.modules, "nodes", types.SimpleNamespace(CLIPTextEncode=CLIPTextEncode))
+    monkeypatch.setattr(sys.modules["custom_nodes.wan_text_cache"], "CACHE", EmbeddingCache(max_bytes=10 ** 6))
+
+    first = CachedCLIPTextEncode()
+    assert first.check_lazy_status("a fox", "umt5") == ["clip"]
+    # ComfyUI checks again after evaluating `clip`; the miss is still counted once
+    assert first.check_lazy_status("a fox", "umt5", clip=object()) == ["clip"]
+    out = first.encode("a fox", "umt5", clip=object())
+    assert out["ui"]["text_cache"][0]["source"] == "miss" and out["ui"]["text_cache"][0]["misses"] == 1
+
+    second = CachedCLIPTextEncode()
+    assert second.check_lazy_status("a fox", "umt5") == []
+    out = second.encode("a fox", "umt5")
+    assert out["ui"]["text_cache"][0]["source"] == "memory"
+    assert out["ui"]["text_cache"][0]["misses"] == 1 and out["ui"]["text_cache"][0]["hits"] == 1
+    assert calls == ["a fox"]
+
+
+@pytest.mark.parametrize("pipeline,nodes", [("wan22_nolora", {"6", "7"}), ("i2v", {"6", "7", "93", "89"})])
+def test_inject_swaps_text_encoders(pipeline, nodes):
+    prompt = resolve_template(pipeline).overlay()
+    assert set(inject_text_cache(prompt)) == nodes
+    graph = prompt.materialize()
+    for node_id in nodes:
+        assert graph[node_id]["class_type"] == CACHED_ENCODER
+        assert graph[node_id]["inputs"]["encoder"] == "umt5_xxl_fp8_e4m3fn_scaled.safetensors"
+    assert resolve_template(pipeline).graph["6"]["class_type"] == "CLIPTextEncode"
+
+
+def test_stats_from_history_outputs():
+    prompt = resolve_template("wan22_nolora").overlay()
+    inject_text_cache(prompt)
+    graph = prompt.materialize()
+    outputs = {"6": {"text_cache": [{"source": "miss", "entries": 1, "bytes": 4, "hits": 3, "disk_hits": 0, "misses": 1}]}}
+    stats = text_cache_stats(graph, outputs, cached_nodes=["7"])
+    assert stats["nodes"] == {"6": "miss", "7": "comfy_cache"}
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert stats["cache"]["hits"] == 3
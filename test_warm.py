@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for warm model mode: canonical loader inputs and loader cache reporting
+"""
+
+import base64
+
+from pipelines import resolve_template
+from warm import canonicalize_loaders, loader_cache_report, blank_png, warmup_job
+
+
+def test_canonical_loaders_are_identical():
+    graphs = []
+    for strength in (1, 1.0, 1.0000000000000002):
+        prompt = resolve_template("wan22_1lora").overlay()
+        prompt.set_input("282", "strength_model", strength)
+        prompt.set_input("282", "lora_name", " style_high.safetensors ")
+        canonicalize_loaders(prompt)
+        graphs.append(prompt.materialize())
+    assert graphs[0]["282"]["inputs"] == graphs[1]["282"]["inputs"] == graphs[2]["282"]["inputs"]
+    assert graphs[0]["282"]["inputs"]["lora_name"] == "style_high.safetensors"
+    assert graphs[0]["377"]["inputs"]["unload_all_models"] is False
+
+
+def test_loader_cache_report():
+    graph = resolve_template("wan22_nolora").overlay().materialize()
+    report = loader_cache_report(graph, ["230", "226"])
+    assert report["230"] == {"class_type": "UNETLoader", "model": "wan2.2_i2v_high_noise_14B_fp8_scaled.safetensors", "cached": True}
+    assert report["235"]["cached"] is False
+    assert set(report) == {"226", "228", "230", "235", "283", "284", "285"}
+
+
+def test_warmup_job_is_tiny():
+    job = warmup_job("wan22")
+    assert job["input"]["workflow"] == "wan22"
+    assert base64.b64decode(job["input"]["image_base64"]) == blank_png()
+    assert blank_png().startswith(b"\x89PNG")
+
+
+def test_loaders_stay_cached_across_jobs(worker, monkeypatch):
+    monkeypatch.setattr(worker, "WARM_MODELS", True)
+    worker.warm_up()
+    results = []
+    for strength in (1, 1.0):
+        job = warmup_job("wan22_1lora")
+        job["input"].update(seed=len(results), loras=[{"high": "a_high.safetensors", "low": "a_low.safetensors", "strength": strength}])
+        results.append(worker.handler(job))
+    assert all("error" not in r for r in results)
+    # The second job differs only in seed, so every loader and LoRA node is served from cache
+    assert all(entry["cached"] for entry in results[1]["loader_cache"].values())
+    assert results[1]["loader_cache"]["230"]["model"].startswith("wan2.2_i2v_high_noise")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for the compiled workflow template registry
+"""
+
+import json
+
+import pytest
+
+from workflows import WorkflowTemplate, convert_workflow, get_template, dumps, TEMPLATES
+
+
+def test_all_templates_compiled():
+    for name in ["video_wan2_2_14B_i2v", "test_simple_workflow", "wan22_nolora", "wan22_1lora", "wan22_2lora", "wan22_3lora"]:
+        assert name in TEMPLATES, f"{name} failed to compile"
+
+
+def test_export_links_resolved():
+    graph = get_template("video_wan2_2_14B_i2v").graph
+    # CLIPTextEncode 6 takes its clip from CLIPLoader 38 via link 74
+    assert tuple(graph["6"]["inputs"]["clip"]) == ("38", 0)
+    assert graph["62"]["inputs"]["image"] == "input-18.jpg"
+
+
+def test_template_is_frozen():
+    template = get_template("test_simple_workflow")
+    with pytest.raises(TypeError):
+        template.graph["6"]["inputs"]["text"] = "changed"
+
+
+def test_overlay_copy_on_write():
+    template = get_template("test_simple_workflow")
+    prompt = template.overlay()
+    prompt.set_input("6", "text", "a cat")
+    graph = prompt.materialize()
+
+    assert graph["6"]["inputs"]["text"] == "a cat"
+    assert graph["6"]["inputs"]["clip"] == ("38", 0)
+    assert template.graph["6"]["inputs"]["text"] == "A beautiful scene with natural motion"
+    # Untouched nodes are shared with the template rather than copied
+    assert graph["57"] is template.graph["57"]
+    assert json.loads(dumps(graph))["6"]["inputs"]["clip"] == ["38", 0]
+
+
+def test_dumps_matches_plain_json():
+    template = get_template("wan22_3lora")
+    prompt = template.overlay()
+    prompt.set_input("835", "noise_seed", 7)
+    graph = prompt.materialize()
+    expected = json.loads(json.dumps({k: json.loads(dumps(v)) for k, v in graph.items()}))
+    assert json.loads(dumps(graph)) == expected
+    assert json.loads(dumps(graph))["835"]["inputs"]["noise_seed"] == 7
+
+
+def test_overlay_adds_nodes():
+    template = get_template("test_simple_workflow")
+    prompt = template.overlay()
+    prompt.add_node("extra_load", "LoadImage", {"image": "a.png"})
+    prompt.set_input("extra_load", "image", "b.png")
+    graph = prompt.materialize()
+    assert graph["extra_load"] == {"inputs": {"image": "b.png"}, "class_type": "LoadImage", "_meta": {"title": "LoadImage"}}
+    assert json.loads(dumps(graph))["extra_load"]["inputs"]["image"] == "b.png"
+    assert "extra_load" not in template.graph and len(prompt) == len(template) + 1
+    with pytest.raises(KeyError):
+        prompt.add_node("6", "LoadImage", {})
+
+
+def test_overlay_bypasses_chained_nodes():
+    template = get_template("wan22_3lora")
+    prompt = template.overlay()
+    for node_id in ("339", "340"):
+        prompt.bypass(node_id, "model")
+    prompt.set_input("340", "strength_model", 0.5)
+    graph = prompt.materialize()
+    # The compile node that read the last loader of the chain now reads its first one
+    assert "339" not in graph and "340" not in graph
+    assert graph["391"]["inputs"]["model"] == ["282", 0]
+    assert graph["390"] is template.graph["390"]
+    assert json.loads(dumps(graph))["391"]["inputs"]["model"] == ["282", 0]
+    with pytest.raises(KeyError):
+        prompt.bypass("999", "model")
+
+
+def test_overlay_rejects_unknown_node():
+    prompt = get_template("test_simple_workflow").overlay()
+    with pytest.raises(KeyError):
+        prompt.set_input("999", "text", "x")
+
+
+def test_convert_api_format_passthrough():
+    graph = {"1": {"class_type": "LoadImage", "inputs": {"image": "a.png"}}}
+    assert convert_workflow(graph) is graph
+    assert len(WorkflowTemplate("t", None, graph)) == 1
@@ -0,0 +1,57 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Custom node shipped in custom_nodes/wan_text_cache
+CACHED_ENCODER = "CachedCLIPTextEncode"
+
+
+def encoder_name(prompt, node_id):
+    """File name of the CLIPLoader feeding a text-encode node, or None if it is not directly linked"""
+    clip = prompt.get_input(node_id, "clip")
+    if not isinstance(clip, (list, tuple)) or clip[0] not in prompt:
+        return None
+    source = str(clip[0])
+    if prompt.get_class_type(source) != "CLIPLoader":
+        return None
+    return prompt.get_input(source, "clip_name")
+
+
+def inject_text_cache(prompt):
+    """Route every CLIPTextEncode through the cached encoder keyed by (encoder file, prompt text)"""
+    swapped = []
+    for node_id, node in prompt.template.graph.items():
+        if prompt.get_class_type(node_id) != "CLIPTextEncode":
+            continue
+        encoder = encoder_name(prompt, node_id)
+        if encoder is None:
+            continue
+        prompt.set_class_type(node_id, CACHED_ENCODER)
+        prompt.set_input(node_id, "encoder", encoder)
+        swapped.append(node_id)
+    return swapped
+
+
+def text_cache_stats(prompt, outputs, cached_nodes):
+    """Summarize hit/miss counters reported by the cached encoder nodes of one run"""
+    stats = {"hits": 0, "misses": 0, "nodes": {}}
+    cached = set(cached_nodes)
+    for node_id, node in prompt.items():
+        if node['class_type'] != CACHED_ENCODER:
+            continue
+        if node_id in cached:
+            # ComfyUI reused the node's output from the previous prompt
+            source = "comfy_cache"
+        else:
+            reports = (outputs.get(node_id) or {}).get("text_cache") or []
+            if not reports:
+                continue
+            report = reports[-1]
+            source = report.get("source")
+            stats["cache"] = {k: report[k] for k in ("entries", "bytes", "hits", "disk_hits", "misses") if k in report}
+        stats["nodes"][node_id] = source
+        if source == "miss":
+            stats["misses"] += 1
+        else:
+            stats["hits"] += 1
+    return stats
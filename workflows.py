@@ -0,0 +1,274 @@
+import os
+import json
+import logging
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+WORKFLOW_DIR = os.getenv('WORKFLOW_DIR', os.path.dirname(os.path.abspath(__file__)))
+
+# Workflow files compiled once at import time, keyed by file stem
+TEMPLATE_FILES = [
+    "video_wan2_2_14B_i2v.json",
+    "test_simple_workflow.json",
+    "wan22_nolora.json",
+    "wan22_1lora.json",
+    "wan22_2lora.json",
+    "wan22_3lora.json",
+]
+
+
+def convert_workflow(workflow_data):
+    """Convert ComfyUI export format to API format (API graphs are returned unchanged)"""
+    if 'nodes' not in workflow_data:
+        # Already in API format
+        return workflow_data
+
+    # Index links once so every linked input is resolved in O(1)
+    links_by_id = {link[0]: link for link in workflow_data.get('links', [])}
+
+    api_workflow = {}
+    for node in workflow_data['nodes']:
+        node_id = str(node['id'])
+        api_workflow[node_id] = {
+            'class_type': node['type'],
+            'inputs': {}
+        }
+        inputs = api_workflow[node_id]['inputs']
+
+        # Convert inputs
+        if 'inputs' in node:
+            for input_item in node['inputs']:
+                link_id = input_item.get('link')
+                if link_id is not None and link_id in links_by_id:
+                    # This input is connected to another node
+                    link = links_by_id[link_id]
+                    inputs[input_item['name']] = [str(link[1]), link[2]]
+
+        # Add widget values as inputs
+        if 'widgets_values' in node:
+            values = node['widgets_values']
+            # Map widget values to input names based on node type
+            if node['type'] == 'CLIPTextEncode' and len(values) > 0:
+                inputs['text'] = values[0]
+            elif node['type'] == 'LoadImage' and len(values) > 0:
+                inputs['image'] = values[0]
+            elif node['type'] == 'WanImageToVideo' and len(values) >= 4:
+                inputs['width'] = values[0]
+                inputs['height'] = values[1]
+                inputs['length'] = values[2]
+                inputs['batch_size'] = values[3]
+            elif node['type'] == 'KSamplerAdvanced' and len(values) >= 10:
+                inputs['add_noise'] = values[0]
+                inputs['noise_seed'] = values[1]
+                inputs['steps'] = values[3]
+                inputs['cfg'] = values[4]
+                inputs['sampler_name'] = values[5]
+                inputs['scheduler'] = values[6]
+                inputs['start_at_step'] = values[7]
+                inputs['end_at_step'] = values[8]
+                inputs['return_with_leftover_noise'] = values[9]
+            elif node['type'] == 'UNETLoader' and len(values) > 0:
+                inputs['unet_name'] = values[0]
+                if len(values) > 1:
+                    inputs['weight_dtype'] = values[1]
+            elif node['type'] == 'VAELoader' and len(values) > 0:
+                inputs['vae_name'] = values[0]
+            elif node['type'] == 'CLIPLoader' and len(values) > 0:
+                inputs['clip_name'] = values[0]
+                if len(values) > 1:
+                    inputs['type'] = values[1]
+                if len(values) > 2:
+                    inputs['device'] = values[2]
+            elif node['type'] == 'LoraLoaderModelOnly' and len(values) >= 2:
+                inputs['lora_name'] = values[0]
+                inputs['strength_model'] = values[1]
+            elif node['type'] == 'ModelSamplingSD3' and len(values) > 0:
+                inputs['shift'] = values[0]
+            elif node['type'] == 'CreateVideo' and len(values) > 0:
+                inputs['fps'] = values[0]
+            elif node['type'] == 'SaveVideo' and len(values) >= 3:
+                inputs['filename_prefix'] = values[0]
+                inputs['format'] = values[1]
+                inputs['codec'] = values[2]
+
+    return api_workflow
+
+
+def load_workflow(workflow_path):
+    """Load and convert ComfyUI workflow to API format"""
+    with open(workflow_path, 'r') as file:
+        workflow_data = json.load(file)
+    return convert_workflow(workflow_data)
+
+
+def freeze(value):
+    """Recursively turn dicts into read-only mappings and lists into tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, MappingProxyType):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(graph, **kwargs):
+    """Serialize a (possibly partly frozen) API graph to JSON"""
+    if isinstance(graph, PatchedGraph) and not kwargs:
+        # Reuse the template's pre-encoded JSON for every node the job left untouched
+        fragments = graph.template.fragments
+        base = graph.template.graph
+        parts = []
+        for node_id, node in graph.items():
+            if base.get(node_id) is node:
+                encoded = fragments[node_id]
+            else:
+                encoded = json.dumps(node, default=_thaw)
+            parts.append(f"{json.dumps(node_id)}: {encoded}")
+        return "{" + ", ".join(parts) + "}"
+    return json.dumps(graph, default=_thaw, **kwargs)
+
+
+class PatchedGraph(dict):
+    """API graph produced by an overlay; remembers its template for fast serialization"""
+
+    def __init__(self, template, nodes):
+        super().__init__(nodes)
+        self.template = template
+
+
+class WorkflowTemplate:
+    """A workflow converted to API format once and kept read-only"""
+
+    def __init__(self, name, path, graph):
+        self.name = name
+        self.path = path
+        self.fragments = {node_id: json.dumps(node) for node_id, node in graph.items()}
+        self.graph = freeze(graph)
+
+    def __contains__(self, node_id):
+        return node_id in self.graph
+
+    def __len__(self):
+        return len(self.graph)
+
+    def overlay(self):
+        return WorkflowOverlay(self)
+
+
+class WorkflowOverlay:
+    """Per-job copy-on-write view over a template that only records changed inputs"""
+
+    def __init__(self, template):
+        self.template = template
+        self.changes = {}
+        self.class_changes = {}
+        # Nodes the job adds on top of the template (e.g. a second LoadImage)
+        self.added = {}
+        # Pass-through nodes dropped from the job's graph -> the input their consumers read instead
+        self.bypassed = {}
+
+    def __contains__(self, node_id):
+        return node_id in self.template.graph or node_id in self.added
+
+    def __len__(self):
+        return len(self.template.graph) + len(self.added)
+
+    def _node(self, node_id):
+        return self.added[node_id] if node_id in self.added else self.template.graph[node_id]
+
+    def get_input(self, node_id, name, default=None):
+        if name in self.changes.get(node_id, {}):
+            return self.changes[node_id][name]
+        return self._node(node_id)['inputs'].get(name, default)
+
+    def get_inputs(self, node_id):
+        """All inputs of a node with the job's changes applied"""
+        return {**self._node(node_id)['inputs'], **self.changes.get(node_id, {})}
+
+    def has_input(self, node_id, name):
+        return name in self.changes.get(node_id, {}) or name in self._node(node_id)['inputs']
+
+    def set_input(self, node_id, name, value):
+        if node_id not in self:
+            raise KeyError(f"Node {node_id} not in workflow '{self.template.name}'")
+        self.changes.setdefault(node_id, {})[name] = value
+
+    def add_node(self, node_id, class_type, inputs, title=None):
+        """Add a node that is not in the template; its ID must not clash with a template node"""
+        if node_id in self:
+            raise KeyError(f"Node {node_id} already in workflow '{self.template.name}'")
+        self.added[node_id] = {"inputs": dict(inputs), "class_type": class_type, "_meta": {"title": title or class_type}}
+
+    def bypass(self, node_id, input_name):
+        """Leave a pass-through node (e.g. an unused LoRA loader) out of the job's graph.
+
+        Nodes fed by it are rewired to whatever feeds its ``input_name`` input.
+        """
+        if node_id not in self.template.graph:
+            raise KeyError(f"Node {node_id} not in workflow '{self.template.name}'")
+        self.bypassed[node_id] = input_name
+
+    def get_class_type(self, node_id):
+        return self.class_changes.get(node_id, self._node(node_id)['class_type'])
+
+    def set_class_type(self, node_id, class_type):
+        """Swap a node's implementation while keeping its ID and inputs"""
+        if node_id not in self.template.graph:
+            raise KeyError(f"Node {node_id} not in workflow '{self.template.name}'")
+        self.class_changes[node_id] = class_type
+
+    def materialize(self):
+        """Build the API graph to submit; untouched nodes are shared with the template"""
+        graph = PatchedGraph(self.template, self.template.graph)
+        graph.update(self.added)
+        for node_id in set(self.changes) | set(self.class_changes):
+            base = graph[node_id]
+            node = dict(base)
+            node['inputs'] = {**base['inputs'], **self.changes.get(node_id, {})}
+            if node_id in self.class_changes:
+                node['class_type'] = self.class_changes[node_id]
+            graph[node_id] = node
+        if self.bypassed:
+            sources = {node_id: graph.pop(node_id)['inputs'][name] for node_id, name in self.bypassed.items()}
+
+            def resolve(link):
+                while isinstance(link, (list, tuple)) and len(link) == 2 and link[0] in sources:
+                    link = sources[link[0]]
+                return list(link)
+
+            for node_id, node in graph.items():
+                rewired = {name: resolve(value) for name, value in node['inputs'].items()
+                           if isinstance(value, (list, tuple)) and len(value) == 2 and value[0] in sources}
+                if rewired:
+                    graph[node_id] = dict(node, inputs={**node['inputs'], **rewired})
+        return graph
+
+
+def load_templates(workflow_dir=WORKFLOW_DIR, files=TEMPLATE_FILES):
+    """Load and convert every known workflow file, returning (templates, errors)"""
+    templates = {}
+    errors = {}
+    for filename in files:
+        name = os.path.splitext(filename)[0]
+        path = os.path.join(workflow_dir, filename)
+        try:
+            templates[name] = WorkflowTemplate(name, path, load_workflow(path))
+            logger.info(f"✅ Compiled workflow '{name}' with {len(templates[name])} nodes")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not compile workflow '{name}' from {path}: {e}")
+            errors[name] = str(e)
+    return templates, errors
+
+
+TEMPLATES, TEMPLATE_ERRORS = load_templates()
+
+
+def get_template(name):
+    """Return a compiled template by name, or None if it failed to load"""
+    return TEMPLATES.get(name)